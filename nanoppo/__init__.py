@@ -1,10 +1,51 @@
 import gym
-from .envs.point_mass1d import PointMass1DEnv
-from .envs.point_mass2d import PointMass2DEnv
 
 __version__ = "0.15.0"
 
-gym.register("PointMass1D-v0", entry_point=PointMass1DEnv, max_episode_steps=200)
-gym.register("PointMass2D-v0", entry_point=PointMass2DEnv, max_episode_steps=200)
+# Entry points are given as strings so that gym only imports the env modules
+# when an env is made.
+gym.register(
+    "PointMass1D-v0",
+    entry_point="nanoppo.envs.point_mass1d:PointMass1DEnv",
+    max_episode_steps=200,
+)
+gym.register(
+    "PointMass2D-v0",
+    entry_point="nanoppo.envs.point_mass2d:PointMass2DEnv",
+    max_episode_steps=200,
+)
+# Natively vectorized variants: gym.make("PointMass1DVector-v0", num_envs=1024).
+# Episode limits and auto-reset are handled by the vector envs themselves, so
+# gym's single-env wrappers are disabled.
+gym.register(
+    "PointMass1DVector-v0",
+    entry_point="nanoppo.envs.point_mass1d:PointMass1DVectorEnv",
+    order_enforce=False,
+    disable_env_checker=True,
+)
+gym.register(
+    "PointMass2DVector-v0",
+    entry_point="nanoppo.envs.point_mass2d:PointMass2DVectorEnv",
+    order_enforce=False,
+    disable_env_checker=True,
+)
 
 
+def __getattr__(name):
+    if name == "PointMass1DEnv":
+        from .envs.point_mass1d import PointMass1DEnv
+
+        return PointMass1DEnv
+    if name == "PointMass2DEnv":
+        from .envs.point_mass2d import PointMass2DEnv
+
+        return PointMass2DEnv
+    if name == "PointMass1DVectorEnv":
+        from .envs.point_mass1d import PointMass1DVectorEnv
+
+        return PointMass1DVectorEnv
+    if name == "PointMass2DVectorEnv":
+        from .envs.point_mass2d import PointMass2DVectorEnv
+
+        return PointMass2DVectorEnv
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
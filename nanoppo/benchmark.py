@@ -0,0 +1,435 @@
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime, timezone
+from functools import partial
+import click
+import numpy as np
+import torch
+import nanoppo
+
+# name -> setup function. A setup function builds its inputs and returns the
+# zero-argument callable that is timed.
+BENCHMARKS = {}
+# name -> setup function of a small warm-up call, for the benchmarks whose
+# peak memory is measured with --memory
+MEMORY_BENCHMARKS = {}
+
+BATCH_SIZES = (1, 64, 1024)
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def make_policy(state_dim=2, action_dim=2, n_latent_var=128):
+    from nanoppo.policy.actor_critic import ActorCritic
+
+    low = torch.full((action_dim,), -1.0)
+    high = torch.full((action_dim,), 1.0)
+    return ActorCritic(state_dim, action_dim, n_latent_var, low, high)
+
+
+@benchmark("compute_gae")
+def setup_compute_gae(length=2048):
+    from nanoppo.ppo_utils import compute_gae
+
+    # Same input types as train_agent: reward tensors, float values and masks
+    rewards = [torch.tensor(r) for r in np.random.randn(length).astype(np.float32)]
+    masks = [1.0] * length
+    values = np.random.randn(length).tolist()
+    return partial(compute_gae, 0.0, rewards, masks, values, 0.99, 0.95)
+
+
+@benchmark("rollout_buffer_push")
+def setup_rollout_buffer_push(capacity=2048):
+    from nanoppo.rollout_buffer import RolloutBuffer
+
+    buffer = RolloutBuffer(capacity)
+    state = np.random.randn(2).astype(np.float32)
+    action = np.random.randn(2).astype(np.float32)
+    return partial(buffer.push, state, action, np.float32(0.0), 1.0, state, False)
+
+
+@benchmark("rollout_buffer_sample")
+def setup_rollout_buffer_sample(capacity=2048, batch_size=256):
+    from nanoppo.rollout_buffer import RolloutBuffer
+
+    buffer = RolloutBuffer(capacity)
+    for _ in range(capacity):
+        state = np.random.randn(2).astype(np.float32)
+        action = np.random.randn(2).astype(np.float32)
+        buffer.push(state, action, np.float32(0.0), 1.0, state, False)
+    return partial(buffer.sample, batch_size, torch.device("cpu"))
+
+
+@benchmark("ppo_memory_append")
+def setup_ppo_memory_append(capacity=2048):
+    from nanoppo.train_ppo_agent import PPOMemory
+
+    memory = PPOMemory(device=torch.device("cpu"))
+    state = torch.randn(2)
+    action = torch.randn(2)
+    logprob = torch.tensor(0.0)
+
+    def run():
+        if len(memory.states) >= capacity:
+            memory.clear()
+        memory.append(state, action, logprob, state, 1.0, False)
+
+    return run
+
+
+@benchmark("ppo_memory_get")
+def setup_ppo_memory_get(length=200):
+    from nanoppo.train_ppo_agent import PPOMemory
+
+    memory = PPOMemory(device=torch.device("cpu"))
+    for _ in range(length):
+        memory.append(
+            torch.randn(2),
+            torch.randn(2),
+            torch.tensor(0.0),
+            torch.randn(2),
+            1.0,
+            False,
+        )
+    return memory.get
+
+
+def setup_actor_critic_act(batch_size):
+    policy = make_policy()
+    state = torch.randn(batch_size, 2)
+
+    def run():
+        with torch.no_grad():
+            policy.act(state)
+
+    return run
+
+
+def setup_actor_critic_evaluate(batch_size):
+    policy = make_policy()
+    state = torch.randn(batch_size, 2)
+    action = torch.randn(batch_size, 2)
+    return partial(policy.evaluate, state, action)
+
+
+for _batch_size in BATCH_SIZES:
+    BENCHMARKS[f"actor_critic_act_b{_batch_size}"] = partial(
+        setup_actor_critic_act, _batch_size
+    )
+    BENCHMARKS[f"actor_critic_evaluate_b{_batch_size}"] = partial(
+        setup_actor_critic_evaluate, _batch_size
+    )
+
+
+def make_attention_policy(state_dim=4, action_dim=2, nhead=2):
+    from nanoppo.policy.actor_critic_causal_attention import ActorCriticCausalAttention
+
+    low = torch.full((action_dim,), -1.0)
+    high = torch.full((action_dim,), 1.0)
+    return ActorCriticCausalAttention(state_dim, action_dim, nhead, low, high, "cpu")
+
+
+def setup_attention_act(length, cached, num_envs=8):
+    # One acting step with an episode history of `length` states
+    policy = make_attention_policy()
+    states = torch.randn(num_envs, length, 4)
+    if not cached:
+
+        def run():
+            with torch.no_grad():
+                policy.act(states)
+
+        return run
+
+    with torch.no_grad():
+        for t in range(length - 1):
+            policy.cached_step(states[:, t])
+
+    def run():
+        with torch.no_grad():
+            policy.act_cached(states[:, -1])
+        # Stay at the same history length
+        policy.kv_cache.lengths -= 1
+
+    return run
+
+
+def setup_attention_forward(length):
+    # Causal attention over every position, as in the update
+    policy = make_attention_policy()
+    states = torch.randn(1, length, 4)
+    return partial(policy, states)
+
+
+BENCHMARKS["attention_forward_L1024"] = partial(setup_attention_forward, 1024)
+BENCHMARKS["attention_forward_L4096"] = partial(setup_attention_forward, 4096)
+
+
+def setup_attention_update(
+    length, checkpoint_attention, num_windows=16, state_dim=64, nhead=8
+):
+    # Forward and backward of evaluate_windows, as in a windowed update
+    policy = make_attention_policy(state_dim, 2, nhead)
+    policy.checkpoint_attention = checkpoint_attention
+    states = torch.randn(num_windows, length, state_dim)
+    actions = torch.randn(num_windows, length, 2)
+
+    def run():
+        logprobs, values = policy.evaluate_windows(states, actions)
+        (logprobs.sum() + values.sum()).backward()
+
+    return run
+
+
+for _checkpoint in (False, True):
+    _name = "attention_update_L1024" + ("_checkpoint" if _checkpoint else "")
+    BENCHMARKS[_name] = partial(setup_attention_update, 1024, _checkpoint)
+    MEMORY_BENCHMARKS[_name] = partial(
+        setup_attention_update, 8, _checkpoint, num_windows=1
+    )
+
+
+for _length in (128, 1024):
+    BENCHMARKS[f"attention_act_full_L{_length}"] = partial(
+        setup_attention_act, _length, False
+    )
+    BENCHMARKS[f"attention_act_cached_L{_length}"] = partial(
+        setup_attention_act, _length, True
+    )
+
+
+@benchmark("normalizer_observe")
+def setup_normalizer_observe():
+    from nanoppo.normalizer import Normalizer
+
+    normalizer = Normalizer(2)
+    state = np.random.randn(2).astype(np.float32)
+    return partial(normalizer.observe, state)
+
+
+def setup_state_scaler(scale_type):
+    import gym
+    from nanoppo.state_scaler import StateScaler
+
+    env = gym.make("PointMass2D-v0")
+    scaler = StateScaler(env, scale_type, sample_size=1000)
+    state = env.observation_space.sample()
+    return partial(scaler.scale_state, state)
+
+
+for _scale_type in ("env", "standard"):
+    BENCHMARKS[f"state_scaler_scale_state_{_scale_type}"] = partial(
+        setup_state_scaler, _scale_type
+    )
+
+
+@benchmark("ppo_agent_update")
+def setup_ppo_agent_update(update_timestep=200, n_latent_var=128, bf16=False):
+    from nanoppo.continuous_action_ppo import PPOAgent
+    from nanoppo.normalizer import Normalizer
+
+    ppo = PPOAgent(
+        state_dim=2,
+        action_dim=2,
+        n_latent_var=n_latent_var,
+        policy_class=None,
+        policy_lr=0.0005,
+        value_lr=0.0005,
+        betas=(0.9, 0.999),
+        gamma=0.99,
+        K_epochs=4,
+        eps_clip=0.2,
+        state_normalizer=Normalizer(2),
+        action_low=np.array([-1.0, -1.0]),
+        action_high=np.array([1.0, 1.0]),
+        bf16=bf16,
+    )
+    states = torch.randn(update_timestep, 2)
+    actions = torch.randn(update_timestep, 2)
+    returns = torch.randn(update_timestep)
+    dones = torch.zeros(update_timestep)
+    return partial(ppo.update, states, actions, returns, states, dones)
+
+
+# Compute-bound update of a large network, in float32 and under bfloat16 autocast
+BENCHMARKS["ppo_agent_update_h512"] = partial(
+    setup_ppo_agent_update, update_timestep=2048, n_latent_var=512
+)
+BENCHMARKS["ppo_agent_update_h512_bf16"] = partial(
+    setup_ppo_agent_update, update_timestep=2048, n_latent_var=512, bf16=True
+)
+
+
+def time_callable(fn, repeat=5, min_time=0.2):
+    """
+    Time fn with timeit: the number of calls per measurement is chosen so that a
+    measurement takes at least min_time seconds.
+
+    Returns:
+    - dict with the median and min seconds per call.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median": float(np.median(times)),
+        "min": float(np.min(times)),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def _peak_rss():
+    # VmHWM belongs to the address space of this process, ru_maxrss survives
+    # exec on Linux and would include the parent's peak
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    import resource
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _peak_memory_worker(name):
+    # Lazy initialization in the first call is not part of the measurement
+    MEMORY_BENCHMARKS[name]()()
+    fn = BENCHMARKS[name]()
+    before = _peak_rss()
+    fn()
+    return _peak_rss() - before
+
+
+def measure_peak_memory(name):
+    """
+    Increase of the peak resident memory of the process during one call of
+    benchmark `name`, measured in a fresh process after a warm-up call.
+
+    Returns:
+    - bytes
+    """
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(_peak_memory_worker, (name,))
+
+
+def get_metadata():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "nanoppo": nanoppo.__version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch_num_threads": torch.get_num_threads(),
+    }
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2, verbose=True, memory=False):
+    """
+    Run the registered benchmarks.
+
+    Parameters:
+    - names (list): Benchmarks to run, all registered benchmarks if None.
+    - repeat (int): Number of measurements per benchmark.
+    - min_time (float): Minimum duration of one measurement in seconds.
+    - memory (bool): Also measure the peak memory of the MEMORY_BENCHMARKS,
+      see measure_peak_memory.
+
+    Returns:
+    - dict with "metadata" and "results" (name -> timing dict, with
+      "peak_memory" in bytes when measured).
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = {}
+    for name in names:
+        fn = BENCHMARKS[name]()
+        results[name] = time_callable(fn, repeat=repeat, min_time=min_time)
+        line = f"{name:40s} {results[name]['median'] * 1e6:12.2f} us"
+        if memory and name in MEMORY_BENCHMARKS:
+            results[name]["peak_memory"] = measure_peak_memory(name)
+            line += f" {results[name]['peak_memory'] / 2**20:10.1f} MB peak"
+        if verbose:
+            print(line)
+    return {"metadata": get_metadata(), "results": results}
+
+
+def compare_results(current, baseline, tolerance=0.2):
+    """
+    Compare median timings of two run_benchmarks outputs.
+
+    Returns:
+    - list of (name, baseline median, current median, ratio) for benchmarks that
+      are slower than the baseline by more than tolerance.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        base = baseline["results"][name]["median"]
+        ratio = result["median"] / base
+        if ratio > 1 + tolerance:
+            regressions.append((name, base, result["median"], ratio))
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--filter",
+    "name_filter",
+    default=None,
+    help="Only run benchmarks whose name contains this string.",
+)
+@click.option("--repeat", default=5, help="Number of measurements per benchmark.")
+@click.option("--min_time", default=0.2, help="Minimum seconds per measurement.")
+@click.option("--output", default=None, help="Write results as JSON to this file.")
+@click.option(
+    "--baseline",
+    default=None,
+    help="Compare against a JSON file written with --output.",
+)
+@click.option(
+    "--tolerance", default=0.2, help="Allowed relative slowdown against the baseline."
+)
+@click.option(
+    "--memory",
+    is_flag=True,
+    default=False,
+    help="Also measure the peak memory of the memory benchmarks.",
+)
+def cli(name_filter, repeat, min_time, output, baseline, tolerance, memory):
+    names = [name for name in BENCHMARKS if name_filter is None or name_filter in name]
+    current = run_benchmarks(names, repeat=repeat, min_time=min_time, memory=memory)
+    if output:
+        with open(output, "w") as f:
+            json.dump(current, f, indent=2)
+        print("Saved results to", output)
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare_results(current, json.load(f), tolerance)
+        for name, base, now, ratio in regressions:
+            print(
+                f"REGRESSION {name}: {base * 1e6:.2f} us -> {now * 1e6:.2f} us ({ratio:.2f}x)"
+            )
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", baseline)
+
+
+if __name__ == "__main__":
+    cli()
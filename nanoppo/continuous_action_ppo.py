@@ -6,7 +6,9 @@ import torch.optim as optim
 import torch.nn as nn
 import torch.nn.functional as F
 from nanoppo.policy.actor_critic import ActorCritic
-import wandb
+from nanoppo.numpy_policy import export_policy
+from nanoppo.ppo_utils import approx_kl, autocast, episode_windows
+from nanoppo.wandb_logger import WandBLogger
 
 
 # PPO Agent
@@ -31,7 +33,11 @@ class PPOAgent:
         lr_scheduler=None,  # Add lr_scheduler as an optional argument
         device="cpu",
         wandb_log=False,
-        debug = False
+        debug = False,
+        bf16=False,
+        target_kl=None,
+        context_length=None,
+        checkpoint_attention=False,
     ):
         self.gamma = gamma
         self.eps_clip = eps_clip
@@ -43,6 +49,11 @@ class PPOAgent:
         self.el_coef = el_coef
         self.device = device
         self.debug = debug
+        # bfloat16 autocast for the forward/backward passes of update()
+        self.bf16 = bf16
+        # Stop the K_epochs loop early once the policy moved this far, None to disable
+        self.target_kl = target_kl
+        self.update_stats = {"epochs": 0, "approx_kl": 0.0}
 
         # Initialize optimizer with a placeholder
         self.optimizer = None
@@ -67,6 +78,16 @@ class PPOAgent:
             ).float().to(device)
             self.policy_old.load_state_dict(self.policy.state_dict())
 
+        # Sequence policies (with act_cached and evaluate_windows) act and are
+        # trained on episode-aligned windows of context_length steps
+        if context_length is not None:
+            self.policy.context_length = context_length
+            self.policy_old.context_length = context_length
+        self.context_length = getattr(self.policy, "context_length", None)
+        if checkpoint_attention:
+            # Recompute the attention activations in backward, see ActorCriticCausalAttention
+            self.policy.checkpoint_attention = True
+
         # Separate the parameters of the actor and critic networks
         actor_params = list(self.policy.action_mu.parameters()) + list(
             self.policy.action_log_std.parameters()
@@ -136,10 +157,65 @@ class PPOAgent:
                     print(f"Stopping early due to NaN at layer {i}")
                     break
 
-    def update(self, states, actions, returns, next_states, dones):
+    def act(self, state):
+        """Sample an action, sequence policies attend to the current context."""
+        if self.context_length is not None:
+            return self.policy.act_cached(state)
+        return self.policy.act(state)
+
+    def start_episode(self, done=None):
+        """Clear the acting context of sequence policies, of every env or of those where done is True."""
+        if self.context_length is not None:
+            self.policy.reset_cache(done)
+
+    @torch.no_grad()
+    def get_context_values(self, states, episode_ends, next_state):
+        """
+        State values of a rollout with the context each state had while
+        acting, and the value of next_state, which starts a new context after
+        the update.
+
+        Returns:
+        - ([num_steps] tensor, float)
+        """
+        index, valid = episode_windows(episode_ends, self.context_length)
+        window_values = self.policy.get_value_windows(states[index.clamp(min=0)])
+        values = torch.empty(len(states), device=states.device)
+        values[index[valid]] = window_values[valid]
+        next_value = self.policy.get_value(next_state).item()
+        return values, next_value
+
+    def evaluate(self, policy, states, actions, valid=None):
+        """policy.evaluate(), or evaluate_windows() on windowed states and actions."""
+        if valid is None:
+            return policy.evaluate(states, actions)
+        logprobs, state_values = policy.evaluate_windows(states, actions)
+        return logprobs[valid], state_values[valid]
+
+    def update(self, states, actions, returns, next_states, dones, episode_ends=None):
+        """
+        Parameters:
+        - episode_ends (tensor): Steps where an episode ended by termination,
+          truncation or the step limit, dones if None. Sequence policies are
+          trained on context windows aligned to them.
+        """
         # Before backpropagation: Check for NaN
         self.check_weights(self.policy.action_mu)
 
+        valid = None
+        if self.context_length is not None:
+            index, valid = episode_windows(
+                dones if episode_ends is None else episode_ends, self.context_length
+            )
+            # Returns in the order of the valid window positions
+            returns = returns[index[valid]]
+            gather = index.clamp(min=0)
+            states = states[gather]
+            # [num_steps, 1, action_dim] when acting on single states
+            actions = actions.reshape(len(returns), -1)[gather]
+
+        epochs = 0
+        kl = 0.0
         for _ in range(self.K_epochs):
             if self.debug:
                 # Check the actions for invalid values
@@ -148,7 +224,10 @@ class PPOAgent:
                     breakpoint()  # Insert your handling here
      
             # Getting predicted values and log probs for given states and actions
-            logprobs, state_values = self.policy.evaluate(states, actions)
+            with autocast(self.device, enabled=self.bf16):
+                logprobs, state_values = self.evaluate(
+                    self.policy, states, actions, valid
+                )
 
             # NEW: Check for NaNs in state_values returned from the policy
             if self.debug:
@@ -168,7 +247,8 @@ class PPOAgent:
                     breakpoint()  # Insert your handling here
 
             # Compute ratio for PPO
-            old_logprobs, _ = self.policy_old.evaluate(states, actions)
+            with autocast(self.device, enabled=self.bf16):
+                old_logprobs, _ = self.evaluate(self.policy_old, states, actions, valid)
             
             if self.debug:
                 # Before calculating the ratio, add these checks
@@ -185,6 +265,12 @@ class PPOAgent:
             log_diff_clamped = torch.clamp(log_diff, -clamp_value, clamp_value)  # clamp_value could be a large number like 50 or 100
             ratio = torch.exp(log_diff_clamped)
 
+            # KL of the policy entering this epoch, before its gradient step
+            kl = approx_kl(log_diff_clamped.detach(), ratio.detach()).item()
+            if self.target_kl is not None and kl > 1.5 * self.target_kl:
+                break
+            epochs += 1
+
             if self.debug:
                 # Checking critical tensors for NaNs
                 if torch.isnan(ratio).any():
@@ -256,7 +342,7 @@ class PPOAgent:
             self.check_weights(self.policy.action_mu)
 
             if self.wandb_log:
-                wandb.log(
+                WandBLogger.log(
                     {
                         "policy_loss": policy_loss.item(),
                         "value_loss": value_loss.item(),
@@ -274,6 +360,12 @@ class PPOAgent:
 
         # Copy new weights into old policy
         self.policy_old.load_state_dict(self.policy.state_dict())
+        # Cached keys and values are from the old weights
+        self.start_episode()
+
+        self.update_stats = {"epochs": epochs, "approx_kl": kl}
+        if self.wandb_log:
+            WandBLogger.log({"update_epochs": epochs, "approx_kl": kl})
         
         # Update learning rates using the lr_scheduler if provided
         self.iterations += 1
@@ -284,7 +376,8 @@ class PPOAgent:
         if self.wandb_log:
             for i, param_group in enumerate(self.optimizer.param_groups):
                 learning_rate = param_group['lr']
-                wandb.log({f"learning_rate_group_{i}": learning_rate})
+                WandBLogger.log({f"learning_rate_group_{i}": learning_rate})
+        return self.update_stats
 
     def save(self, path):
         # Saving
@@ -303,3 +396,7 @@ class PPOAgent:
         self.policy_old.load_state_dict(self.policy.state_dict())
         self.optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
         self.state_normalizer.set_state(checkpoint["state_normalizer_state"])
+
+    def export(self, path):
+        # Torch-free inference file, see nanoppo.numpy_policy.NumpyPolicy
+        export_policy(self.policy, path, normalizer=self.state_normalizer)
@@ -1,8 +1,12 @@
+import os
+import click
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 import numpy as np
+from nanoppo.phase_timer import PhaseTimer
+from nanoppo.ppo_utils import approx_kl, compute_gae_batched
 
 
 class PolicyNetwork(nn.Module):
@@ -15,6 +19,11 @@ class PolicyNetwork(nn.Module):
         x = F.relu(self.fc1(x))
         return F.softmax(self.fc2(x), dim=-1)
 
+    def log_probs(self, x):
+        """Log of forward(x), computed with log_softmax for stability."""
+        x = F.relu(self.fc1(x))
+        return F.log_softmax(self.fc2(x), dim=-1)
+
 
 class ValueNetwork(nn.Module):
     def __init__(self, input_dim, hidden_dim):
@@ -88,3 +97,332 @@ class PPO:
         self.policy_optimizer.zero_grad()
         policy_loss.backward()
         self.policy_optimizer.step()
+
+
+class DiscretePPOAgent:
+    """
+    PPO for discrete actions, trained on batches from vectorized environments:
+    actions are sampled for all environments at once without building a graph,
+    returns use GAE and every update runs K_epochs of shuffled minibatches with
+    the ratio taken against the stored log-probs.
+    """
+
+    def __init__(
+        self,
+        state_dim,
+        action_dim,
+        hidden_dim=64,
+        lr=0.001,
+        gamma=0.99,
+        tau=0.95,
+        epsilon=0.2,
+        K_epochs=4,
+        minibatch_size=256,
+        vf_coef=0.5,
+        entropy_coef=0.01,
+        max_grad_norm=0.5,
+        target_kl=None,
+        device="cpu",
+    ):
+        self.device = torch.device(device)
+        self.policy = PolicyNetwork(state_dim, hidden_dim, action_dim).to(self.device)
+        self.value = ValueNetwork(state_dim, hidden_dim).to(self.device)
+        self.parameters = list(self.policy.parameters()) + list(self.value.parameters())
+        self.optimizer = optim.Adam(self.parameters, lr=lr)
+        self.gamma = gamma
+        self.tau = tau
+        self.epsilon = epsilon
+        self.K_epochs = K_epochs
+        self.minibatch_size = minibatch_size
+        self.vf_coef = vf_coef
+        self.entropy_coef = entropy_coef
+        self.max_grad_norm = max_grad_norm
+        self.target_kl = target_kl
+
+    @torch.no_grad()
+    def act(self, states):
+        """
+        Sample actions for a [num_envs, state_dim] batch.
+
+        Returns:
+        - actions, log_probs and values as [num_envs] tensors.
+        """
+        log_probs = self.policy.log_probs(states)
+        actions = torch.multinomial(log_probs.exp(), 1).squeeze(-1)
+        return (
+            actions,
+            log_probs.gather(-1, actions.unsqueeze(-1)).squeeze(-1),
+            self.value(states).squeeze(-1),
+        )
+
+    @torch.no_grad()
+    def get_value(self, states):
+        return self.value(states).squeeze(-1)
+
+    def update(self, states, actions, old_log_probs, returns, advantages):
+        """
+        K_epochs of minibatch updates on a flattened rollout.
+
+        Returns:
+        - dict with the last policy, value and entropy losses, the epochs run
+          and the approximate KL reached.
+        """
+        batch_size = states.shape[0]
+        minibatch_size = min(self.minibatch_size, batch_size)
+        epochs = 0
+        kl = 0.0
+        for _ in range(self.K_epochs):
+            permutation = torch.randperm(batch_size, device=self.device)
+            epoch_kl = 0.0
+            num_minibatches = 0
+            for start in range(0, batch_size, minibatch_size):
+                idx = permutation[start : start + minibatch_size]
+                all_log_probs = self.policy.log_probs(states[idx])
+                new_log_probs = all_log_probs.gather(
+                    -1, actions[idx].unsqueeze(-1)
+                ).squeeze(-1)
+                entropy = -(all_log_probs.exp() * all_log_probs).sum(-1).mean()
+
+                advs = advantages[idx]
+                advs = (advs - advs.mean()) / (advs.std() + 1e-8)
+                log_ratio = new_log_probs - old_log_probs[idx]
+                ratio = torch.exp(log_ratio)
+                epoch_kl += approx_kl(log_ratio.detach(), ratio.detach()).item()
+                num_minibatches += 1
+                surr1 = ratio * advs
+                surr2 = torch.clamp(ratio, 1 - self.epsilon, 1 + self.epsilon) * advs
+                policy_loss = -torch.min(surr1, surr2).mean()
+                value_loss = F.mse_loss(
+                    self.value(states[idx]).squeeze(-1), returns[idx]
+                )
+                loss = (
+                    policy_loss
+                    + self.vf_coef * value_loss
+                    - self.entropy_coef * entropy
+                )
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                nn.utils.clip_grad_norm_(self.parameters, self.max_grad_norm)
+                self.optimizer.step()
+            epochs += 1
+            # Mean over the epoch's minibatches, each taken before its own step
+            kl = epoch_kl / num_minibatches
+            if self.target_kl is not None and kl > 1.5 * self.target_kl:
+                break
+        return {
+            "policy_loss": policy_loss.item(),
+            "value_loss": value_loss.item(),
+            "entropy": entropy.item(),
+            "epochs": epochs,
+            "approx_kl": kl,
+        }
+
+    def save(self, path):
+        torch.save(
+            {
+                "policy_state_dict": self.policy.state_dict(),
+                "value_state_dict": self.value.state_dict(),
+                "optimizer_state_dict": self.optimizer.state_dict(),
+            },
+            path,
+        )
+
+    def load(self, path):
+        checkpoint = torch.load(path, map_location=self.device)
+        self.policy.load_state_dict(checkpoint["policy_state_dict"])
+        self.value.load_state_dict(checkpoint["value_state_dict"])
+        self.optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+
+
+def train_discrete_agent(
+    env_name="CartPole-v1",
+    num_envs=8,
+    num_steps=128,
+    total_timesteps=100000,
+    hidden_dim=64,
+    lr=0.001,
+    gamma=0.99,
+    tau=0.95,
+    epsilon=0.2,
+    K_epochs=4,
+    minibatch_size=256,
+    entropy_coef=0.01,
+    target_kl=None,
+    stop_reward=None,
+    checkpoint_dir="checkpoints",
+    log_interval=10,
+    seed=None,
+    device="cpu",
+    phase_timer=None,
+):
+    """
+    Train a DiscretePPOAgent on num_envs copies of env_name stepped by a gym
+    SyncVectorEnv, num_steps steps per environment between updates.
+
+    The best weights by the average reward of the last 20 episodes are saved
+    to checkpoint_dir/env_name/discrete_models.pth and loaded when training
+    starts again.
+
+    Returns:
+    - (DiscretePPOAgent, list of episode rewards, model file)
+    """
+    import gym
+
+    envs = gym.vector.SyncVectorEnv([lambda: gym.make(env_name)] * num_envs)
+    state_dim = envs.single_observation_space.shape[0]
+    action_dim = envs.single_action_space.n
+    ppo = DiscretePPOAgent(
+        state_dim,
+        action_dim,
+        hidden_dim=hidden_dim,
+        lr=lr,
+        gamma=gamma,
+        tau=tau,
+        epsilon=epsilon,
+        K_epochs=K_epochs,
+        minibatch_size=minibatch_size,
+        entropy_coef=entropy_coef,
+        target_kl=target_kl,
+        device=device,
+    )
+    checkpoint_path = os.path.join(checkpoint_dir, env_name)
+    os.makedirs(checkpoint_path, exist_ok=True)
+    model_file = os.path.join(checkpoint_path, "discrete_models.pth")
+    if os.path.exists(model_file):
+        ppo.load(model_file)
+        print("Loaded best weights!", model_file)
+
+    if phase_timer is None:
+        phase_timer = PhaseTimer()
+    act_phase = phase_timer.phase("act")
+    env_phase = phase_timer.phase("env")
+    gae_phase = phase_timer.phase("gae")
+    update_phase = phase_timer.phase("update")
+
+    T, N = num_steps, num_envs
+    states = torch.zeros(T, N, state_dim, device=ppo.device)
+    actions = torch.zeros(T, N, dtype=torch.long, device=ppo.device)
+    log_probs = torch.zeros(T, N, device=ppo.device)
+    rewards = torch.zeros(T, N, device=ppo.device)
+    masks = torch.zeros(T, N, device=ppo.device)
+    values = torch.zeros(T, N, device=ppo.device)
+
+    obs, _ = envs.reset(seed=seed)
+    running_rewards = np.zeros(N)
+    episode_rewards = []
+    best_reward = float("-inf")
+    iterations = max(1, total_timesteps // (T * N))
+    for iteration in range(1, iterations + 1):
+        for t in range(T):
+            with act_phase:
+                state = torch.as_tensor(obs, dtype=torch.float32, device=ppo.device)
+                action, log_prob, value = ppo.act(state)
+            with env_phase:
+                obs, reward, terminated, truncated, info = envs.step(
+                    action.cpu().numpy()
+                )
+            running_rewards += reward
+            for i in np.flatnonzero(terminated | truncated):
+                episode_rewards.append(running_rewards[i])
+                running_rewards[i] = 0.0
+            # Bootstrap time-limit truncations from the final observation, an
+            # env that also terminated on that step has no value to add
+            bootstrap = truncated & ~terminated
+            if bootstrap.any():
+                final = np.stack(
+                    [info["final_observation"][i] for i in np.flatnonzero(bootstrap)]
+                )
+                reward = reward.astype(np.float32)
+                reward[bootstrap] += (
+                    gamma
+                    * ppo.get_value(
+                        torch.as_tensor(final, dtype=torch.float32, device=ppo.device)
+                    )
+                    .cpu()
+                    .numpy()
+                )
+            states[t] = state
+            actions[t] = action
+            log_probs[t] = log_prob
+            values[t] = value
+            rewards[t] = torch.as_tensor(reward, dtype=torch.float32)
+            masks[t] = torch.as_tensor(
+                1.0 - (terminated | truncated), dtype=torch.float32
+            )
+
+        with gae_phase:
+            next_value = ppo.get_value(
+                torch.as_tensor(obs, dtype=torch.float32, device=ppo.device)
+            )
+            returns = compute_gae_batched(
+                next_value, rewards, masks, values, gamma, tau
+            )
+            advantages = returns - values
+        with update_phase:
+            stats = ppo.update(
+                states.flatten(0, 1),
+                actions.flatten(),
+                log_probs.flatten(),
+                returns.flatten(),
+                advantages.flatten(),
+            )
+
+        avg_reward = np.mean(episode_rewards[-20:]) if episode_rewards else float("nan")
+        if len(episode_rewards) >= 20 and avg_reward > best_reward:
+            best_reward = avg_reward
+            ppo.save(model_file)
+        if log_interval > 0 and iteration % log_interval == 0:
+            steps_per_sec = iteration * T * N / phase_timer.elapsed()
+            print(
+                "Iteration {} \t episodes: {} \t avg reward: {:.2f} \t best reward: {:.2f} \t"
+                " epochs: {} \t approx_kl: {:.4f} \t steps/s: {:.1f}".format(
+                    iteration,
+                    len(episode_rewards),
+                    avg_reward,
+                    best_reward,
+                    stats["epochs"],
+                    stats["approx_kl"],
+                    steps_per_sec,
+                )
+            )
+            print("Phase times", phase_timer.format())
+        if stop_reward is not None and avg_reward > stop_reward:
+            print("avg_reward", avg_reward, "> stop_reward", stop_reward)
+            break
+    envs.close()
+    return ppo, episode_rewards, model_file
+
+
+@click.command()
+@click.option("--env_name", default="CartPole-v1", help="Gym environment id.")
+@click.option("--num_envs", default=8, help="Number of environments.")
+@click.option("--num_steps", default=128, help="Steps per environment per update.")
+@click.option("--total_timesteps", default=100000, help="Total environment steps.")
+@click.option(
+    "--stop_reward", default=None, type=float, help="Stop at this average reward."
+)
+@click.option("--checkpoint_dir", default="checkpoints", help="Path to checkpoint.")
+@click.option("--log_interval", default=10, help="Logging interval.")
+def cli(
+    env_name,
+    num_envs,
+    num_steps,
+    total_timesteps,
+    stop_reward,
+    checkpoint_dir,
+    log_interval,
+):
+    train_discrete_agent(
+        env_name=env_name,
+        num_envs=num_envs,
+        num_steps=num_steps,
+        total_timesteps=total_timesteps,
+        stop_reward=stop_reward,
+        checkpoint_dir=checkpoint_dir,
+        log_interval=log_interval,
+    )
+
+
+if __name__ == "__main__":
+    cli()
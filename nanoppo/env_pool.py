@@ -0,0 +1,348 @@
+import multiprocessing as mp
+import os
+import traceback
+from multiprocessing.connection import wait
+from time import perf_counter
+
+import numpy as np
+
+# Bounds on bringing up a replacement worker after a step timeout
+_START_TIMEOUT = 60.0
+_RESTART_ATTEMPTS = 3
+
+
+def _shared_array(ctx, shape, dtype):
+    dtype = np.dtype(dtype)
+    raw = ctx.RawArray("b", int(np.prod(shape)) * dtype.itemsize)
+    return raw, shape, dtype
+
+
+def _view(buffer):
+    raw, shape, dtype = buffer
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _worker(index, env_fn, pipe, parent_pipe, buffers, cores):
+    parent_pipe.close()
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    observations, final_observations, rewards, terminated, truncated = (
+        _view(buffer) for buffer in buffers
+    )
+    env = None
+    try:
+        env = env_fn()
+        # Ready
+        pipe.send((None, None))
+        while True:
+            command, data = pipe.recv()
+            if command == "reset":
+                # Unseeded resets also work for envs whose reset() takes no seed
+                kwargs = {} if data is None else {"seed": data}
+                observation, info = env.reset(**kwargs)
+                observations[index] = observation
+                pipe.send((info, None))
+            elif command == "step":
+                observation, reward, done, trunc, info = env.step(data)
+                if done or trunc:
+                    # Auto-reset, the last observation of the episode is kept apart
+                    final_observations[index] = observation
+                    observation, _ = env.reset()
+                observations[index] = observation
+                rewards[index] = reward
+                terminated[index] = done
+                truncated[index] = trunc
+                pipe.send((info, None))
+            elif command == "close":
+                break
+            else:
+                raise ValueError(f"Unknown command: {command}")
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        pipe.send((None, traceback.format_exc()))
+    finally:
+        if env is not None:
+            env.close()
+        pipe.close()
+
+
+class SubprocEnvPool:
+    """
+    Runs each env in its own worker process so slow env steps overlap across
+    cores. Commands and actions go to the workers over pipes; the workers
+    write observations, rewards and episode ends into preallocated shared
+    arrays, which are read without pickling. An env whose episode ended is
+    reset by its worker within the same step.
+
+    step() waits for every env. For envs with heavy-tailed step times,
+    step_async() followed by step_any(k) returns as soon as k envs finished,
+    so throughput follows the typical rather than the slowest step; actions
+    are then sent only to the envs that were returned. With step_timeout, a
+    worker whose step takes longer is restarted and its env is returned as
+    truncated.
+
+    Parameters:
+    - env_fns (list): Picklable callables that create one env each.
+    - seed (int): Worker i resets with seed + i on the first reset, unseeded
+      if None.
+    - cores (list): CPU affinity of the workers, worker i is pinned to
+      cores[i % len(cores)]. Unchanged if None.
+    - observation_space, action_space: Spaces of one env. If None, one env is
+      created in this process to read them.
+    - step_timeout (float): Seconds after which step_any() restarts a worker.
+      The reset of the restarted worker has the same limit.
+
+    Usage:
+        with SubprocEnvPool([partial(gym.make, "Pendulum-v1")] * 8, seed=0) as pool:
+            observations, infos = pool.reset()
+            observations, rewards, terminated, truncated, infos = pool.step(actions)
+    """
+
+    def __init__(
+        self,
+        env_fns,
+        seed=None,
+        cores=None,
+        observation_space=None,
+        action_space=None,
+        step_timeout=None,
+    ):
+        self.env_fns = list(env_fns)
+        self.num_envs = len(self.env_fns)
+        self.seed = seed
+        self.step_timeout = step_timeout
+        self.cores = None if cores is None else list(cores)
+        if observation_space is None or action_space is None:
+            env = self.env_fns[0]()
+            observation_space, action_space = env.observation_space, env.action_space
+            env.close()
+        self.observation_space = observation_space
+        self.action_space = action_space
+
+        self.ctx = mp.get_context("spawn")
+        n = self.num_envs
+        obs_shape = (n,) + tuple(observation_space.shape)
+        self.buffers = [
+            _shared_array(self.ctx, obs_shape, observation_space.dtype),
+            _shared_array(self.ctx, obs_shape, observation_space.dtype),
+            _shared_array(self.ctx, (n,), np.float64),
+            _shared_array(self.ctx, (n,), np.bool_),
+            _shared_array(self.ctx, (n,), np.bool_),
+        ]
+        (
+            self.observations,
+            self.final_observations,
+            self.rewards,
+            self.terminated,
+            self.truncated,
+        ) = (_view(buffer) for buffer in self.buffers)
+
+        # Envs with a step in flight and when it was sent
+        self.pending = np.zeros(n, dtype=bool)
+        self.sent_at = np.zeros(n)
+        self.restarts = 0
+        self.pipes = [None] * n
+        self.processes = [None] * n
+        for index in range(n):
+            self._start_worker(index)
+        self._receive_all()
+        self.closed = False
+
+    def _start_worker(self, index):
+        parent_pipe, child_pipe = self.ctx.Pipe()
+        cores = None
+        if self.cores:
+            cores = [self.cores[index % len(self.cores)]]
+        process = self.ctx.Process(
+            target=_worker,
+            args=(
+                index,
+                self.env_fns[index],
+                child_pipe,
+                parent_pipe,
+                self.buffers,
+                cores,
+            ),
+            daemon=True,
+        )
+        process.start()
+        child_pipe.close()
+        self.pipes[index] = parent_pipe
+        self.processes[index] = process
+
+    def _receive_all(self, env_ids=None):
+        # Read every reply before raising so the pipes stay in step
+        if env_ids is None:
+            env_ids = range(self.num_envs)
+        replies = [self.pipes[index].recv() for index in env_ids]
+        self.pending[list(env_ids)] = False
+        for index, (_, error) in zip(env_ids, replies):
+            if error is not None:
+                raise RuntimeError(f"Env worker {index} failed:\n{error}")
+        return [info for info, _ in replies]
+
+    def _stop_worker(self, index):
+        self.processes[index].terminate()
+        self.processes[index].join()
+        self.pipes[index].close()
+
+    def _restart(self, index):
+        """
+        Replace a hung worker with a new one and reset its env. The reset is
+        bounded by step_timeout too, a worker that does not reset in time is
+        replaced again.
+        """
+        final_observation = self.observations[index].copy()
+        for _ in range(_RESTART_ATTEMPTS):
+            self._stop_worker(index)
+            self._start_worker(index)
+            pipe = self.pipes[index]
+            if not pipe.poll(_START_TIMEOUT):
+                continue
+            self._receive_all([index])
+            pipe.send(("reset", None))
+            if pipe.poll(self.step_timeout):
+                self._receive_all([index])
+                break
+        else:
+            raise RuntimeError(
+                f"Env worker {index} did not reset within {self.step_timeout}s "
+                f"in {_RESTART_ATTEMPTS} restarts"
+            )
+        self.final_observations[index] = final_observation
+        self.rewards[index] = 0.0
+        self.terminated[index] = False
+        self.truncated[index] = True
+        self.restarts += 1
+        return {"timeout": True, "final_observation": final_observation}
+
+    def _seed(self, index, seed):
+        return None if seed is None else seed + index
+
+    def reset(self, seed=None):
+        """
+        Reset every env.
+
+        Parameters:
+        - seed (int): Seeds env i with seed + i, the pool's seed on the first
+          reset if None.
+
+        Returns:
+        - [num_envs, *obs_shape] observations and the list of infos.
+        """
+        if seed is None:
+            seed, self.seed = self.seed, None
+        for index, pipe in enumerate(self.pipes):
+            pipe.send(("reset", self._seed(index, seed)))
+        infos = self._receive_all()
+        return self.observations.copy(), infos
+
+    def step_async(self, actions, env_ids=None):
+        """
+        Send actions without waiting for the results.
+
+        Parameters:
+        - actions: One action per env of env_ids.
+        - env_ids (array): Envs to step, all envs if None.
+        """
+        if env_ids is None:
+            env_ids = range(self.num_envs)
+        now = perf_counter()
+        for index, action in zip(env_ids, actions):
+            self.pipes[index].send(("step", action))
+            self.pending[index] = True
+            self.sent_at[index] = now
+
+    def step_wait(self):
+        """
+        Wait for the steps sent with step_async.
+
+        Returns:
+        - observations, rewards, terminated, truncated ([num_envs] arrays) and
+          the list of infos. The info of an env whose episode ended holds its
+          last observation under "final_observation", observations already
+          holds the first observation of its next episode.
+        """
+        infos = self._receive_all()
+        for index in np.flatnonzero(self.terminated | self.truncated):
+            infos[index] = {
+                **infos[index],
+                "final_observation": self.final_observations[index].copy(),
+            }
+        return (
+            self.observations.copy(),
+            self.rewards.copy(),
+            self.terminated.copy(),
+            self.truncated.copy(),
+            infos,
+        )
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_any(self, min_results=1):
+        """
+        Wait until at least min_results of the steps in flight finished, or
+        timed out, and return all of those.
+
+        Returns:
+        - env_ids ([k] array) and the observations, rewards, terminated,
+          truncated arrays and infos of those envs, as in step_wait(). Envs
+          restarted after step_timeout are truncated, with info["timeout"].
+        """
+        done_ids, infos = [], []
+        while self.pending.any() and len(done_ids) < min_results:
+            pending = np.flatnonzero(self.pending)
+            timeout = None
+            if self.step_timeout is not None:
+                deadline = self.sent_at[pending].min() + self.step_timeout
+                timeout = max(deadline - perf_counter(), 0.0)
+            connections = {self.pipes[index]: index for index in pending}
+            ready = sorted(connections[c] for c in wait(list(connections), timeout))
+            for index, info in zip(ready, self._receive_all(ready)):
+                if self.terminated[index] or self.truncated[index]:
+                    info = {
+                        **info,
+                        "final_observation": self.final_observations[index].copy(),
+                    }
+                done_ids.append(index)
+                infos.append(info)
+            if self.step_timeout is not None:
+                late = perf_counter() - self.sent_at > self.step_timeout
+                for index in np.flatnonzero(self.pending & late):
+                    done_ids.append(index)
+                    infos.append(self._restart(index))
+        env_ids = np.array(done_ids, dtype=np.int64)
+        return (
+            env_ids,
+            self.observations[env_ids],
+            self.rewards[env_ids],
+            self.terminated[env_ids],
+            self.truncated[env_ids],
+            infos,
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self.pipes:
+            pipe.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
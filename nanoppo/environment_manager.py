@@ -1,4 +1,14 @@
 import gym
+from functools import partial
+
+
+def make_env(env_name, env_config=None, max_episode_steps=None):
+    kwargs = {}
+    if env_config:
+        kwargs["config"] = env_config
+    if max_episode_steps is not None:
+        kwargs["max_episode_steps"] = max_episode_steps
+    return gym.make(env_name, **kwargs)
 
 
 class EnvironmentManager:
@@ -7,8 +17,27 @@ class EnvironmentManager:
         self.env_config = env_config
 
     def setup_env(self):
-        if self.env_config:
-            env = gym.make(self.env_name, config=self.env_config)
-        else:
-            env = gym.make(self.env_name)
-        return env
+        return make_env(self.env_name, self.env_config)
+
+    def setup_env_pool(
+        self, num_envs, seed=None, cores=None, max_episode_steps=None, **pool_kwargs
+    ):
+        """
+        Run num_envs copies of the env in worker processes.
+
+        Parameters:
+        - seed (int): Env i is first reset with seed + i.
+        - cores (list): CPU cores of the workers, e.g. ResourceConfig.env_cores.
+        - max_episode_steps (int): Episode limit of the envs, the registered
+          one if None.
+        - pool_kwargs: Other SubprocEnvPool arguments, e.g. step_timeout.
+
+        Returns:
+        - SubprocEnvPool, to be closed after use.
+        """
+        from nanoppo.env_pool import SubprocEnvPool
+
+        env_fn = partial(make_env, self.env_name, self.env_config, max_episode_steps)
+        return SubprocEnvPool(
+            [env_fn] * num_envs, seed=seed, cores=cores, **pool_kwargs
+        )
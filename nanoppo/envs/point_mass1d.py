@@ -1,5 +1,6 @@
 import gym
 from gym import spaces
+from gym.vector import VectorEnv
 import numpy as np
 
 class PointMass1DEnv(gym.Env):
@@ -11,27 +12,31 @@ class PointMass1DEnv(gym.Env):
         
         # State space: Position and Velocity
         self.observation_space = spaces.Box(low=-float(position_limit), high=float(position_limit), shape=(2,), dtype=float)
+        self.position_limit = float(position_limit)
         
         # Parameters
         self.max_steps = max_episode_steps
         self.current_step = 0
         self.damping_factor = damping_factor
+        # Global NumPy RNG until reset() is given a seed
+        self.rng = np.random
 
-    def reset(self):
-        self.state = np.array([0.5 * (2 * np.random.rand() - 1), 0.0], dtype=np.float32)  # random initial position, zero velocity
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.RandomState(seed)
+        self.state = np.array([0.5 * (2 * self.rng.rand() - 1), 0.0], dtype=np.float32)  # random initial position, zero velocity
         self.current_step = 0
         return self.state, {}
 
     def step(self, action):
         position, velocity = self.state
 
-        # Update velocity and position based on the force (action)
         # Update velocity and position based on the force (action)
         velocity = self.damping_factor * (velocity + action[0])  # Introducing damping
         position += velocity
         
-        # Clamp position to bounds
-        position = np.clip(position, self.observation_space.low[0], self.observation_space.high[0])
+        # Clamp position to bounds (scalar min/max, np.clip is slow on scalars)
+        position = min(max(position, -self.position_limit), self.position_limit)
 
         self.state = np.array([position, velocity], dtype=np.float32)
 
@@ -48,4 +53,62 @@ class PointMass1DEnv(gym.Env):
             print(f"Position: {self.state[0]}, Velocity: {self.state[1]}")
 
     def close(self):
-        pass
\ No newline at end of file
+        pass
+
+
+class PointMass1DVectorEnv(VectorEnv):
+    """
+    PointMass1DEnv dynamics for `num_envs` instances held in one [num_envs, 2]
+    state array and stepped with vectorized NumPy arithmetic.
+
+    Finished instances are reset automatically; as in gym's vector envs their
+    last observation is returned in infos["final_observation"].
+    """
+
+    def __init__(self, num_envs=8, action_range=1.0, position_limit=10.0, damping_factor=0.9, max_episode_steps=200):
+        single_action_space = spaces.Box(low=-action_range, high=action_range, shape=(1,), dtype=float)
+        single_observation_space = spaces.Box(low=-float(position_limit), high=float(position_limit), shape=(2,), dtype=float)
+        super(PointMass1DVectorEnv, self).__init__(num_envs, single_observation_space, single_action_space)
+        self.action_range = action_range
+        self.position_limit = float(position_limit)
+        self.max_steps = max_episode_steps
+        self.damping_factor = damping_factor
+        self.states = np.zeros((num_envs, 2), dtype=np.float32)
+        self.current_steps = np.zeros(num_envs, dtype=np.int64)
+        self._actions = None
+
+    def _reset_envs(self, mask):
+        # random initial position, zero velocity
+        self.states[mask, 0] = 0.5 * (2 * np.random.rand(int(mask.sum())) - 1)
+        self.states[mask, 1] = 0.0
+        self.current_steps[mask] = 0
+
+    def reset_wait(self, seed=None, options=None):
+        # Same global RNG as PointMass1DEnv so that random_utils.set_seed applies
+        if seed is not None:
+            np.random.seed(seed)
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.states.copy(), {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, -1)
+
+    def step_wait(self):
+        states = self.states
+        states[:, 1] = self.damping_factor * (states[:, 1] + self._actions[:, 0])
+        states[:, 0] += states[:, 1]
+        np.clip(states[:, 0], -self.position_limit, self.position_limit, out=states[:, 0])
+        rewards = 0.5 - np.abs(states[:, 0]).astype(np.float64)
+
+        self.current_steps += 1
+        terminateds = self.current_steps >= self.max_steps
+        truncateds = np.zeros(self.num_envs, dtype=bool)
+        infos = {}
+        if terminateds.any():
+            final_observations = np.empty(self.num_envs, dtype=object)
+            for i in np.flatnonzero(terminateds):
+                final_observations[i] = states[i].copy()
+            infos["final_observation"] = final_observations
+            infos["_final_observation"] = terminateds.copy()
+            self._reset_envs(terminateds)
+        return states.copy(), rewards, terminateds, truncateds, infos
@@ -1,6 +1,8 @@
+import math
 import numpy as np
 import gym
 from gym import spaces
+from gym.vector import VectorEnv
 
 class PointMass2DEnv(gym.Env):
     """
@@ -15,9 +17,13 @@ class PointMass2DEnv(gym.Env):
         self.observation_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
         self.action_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
         self.state = None
+        # Global NumPy RNG until reset() is given a seed
+        self.rng = np.random
 
-    def reset(self):
-        self.state = np.array([np.random.uniform(-self.range, self.range), np.random.uniform(-self.range, self.range)], dtype=np.float32)
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.RandomState(seed)
+        self.state = np.array([self.rng.uniform(-self.range, self.range), self.rng.uniform(-self.range, self.range)], dtype=np.float32)
         self.current_step = 0
         return self._normalize_state(self.state), {}
 
@@ -26,7 +32,8 @@ class PointMass2DEnv(gym.Env):
         
         # Apply action
         self.state = self.state + action * self.range * 0.1
-        reward = 0.5 -np.linalg.norm(self.state) / self.range
+        # math.hypot avoids the np.linalg.norm overhead on a length-2 array
+        reward = 0.5 - math.hypot(self.state[0], self.state[1]) / self.range
         
         # Check boundaries and apply penalty if needed
         if np.any(self.state < -self.range) or np.any(self.state > self.range):
@@ -45,3 +52,59 @@ class PointMass2DEnv(gym.Env):
     def close(self):
         pass
 
+
+class PointMass2DVectorEnv(VectorEnv):
+    """
+    PointMass2DEnv dynamics for `num_envs` instances held in one [num_envs, 2]
+    state array and stepped with vectorized NumPy arithmetic.
+
+    Finished instances are reset automatically; as in gym's vector envs their
+    last observation is returned in infos["final_observation"].
+    """
+    def __init__(self, num_envs=8, range=10, max_episode_steps=200, boundary_penalty=5.0):
+        single_observation_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
+        single_action_space = spaces.Box(low=-1, high=1, shape=(2,), dtype=np.float32)
+        super(PointMass2DVectorEnv, self).__init__(num_envs, single_observation_space, single_action_space)
+        self.range = range
+        self.max_episode_steps = max_episode_steps
+        self.boundary_penalty = boundary_penalty
+        self.states = np.zeros((num_envs, 2), dtype=np.float32)
+        self.current_steps = np.zeros(num_envs, dtype=np.int64)
+        self._actions = None
+
+    def _reset_envs(self, mask):
+        self.states[mask] = np.random.uniform(-self.range, self.range, size=(int(mask.sum()), 2))
+        self.current_steps[mask] = 0
+
+    def reset_wait(self, seed=None, options=None):
+        # Same global RNG as PointMass2DEnv so that random_utils.set_seed applies
+        if seed is not None:
+            np.random.seed(seed)
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self.states / self.range, {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, 2)
+
+    def step_wait(self):
+        states = self.states
+        states += self._actions * (self.range * 0.1)
+        rewards = 0.5 - np.sqrt(np.einsum("ij,ij->i", states, states)).astype(np.float64) / self.range
+
+        # Apply the boundary penalty before clipping back into the range
+        out_of_bounds = (np.abs(states) > self.range).any(axis=1)
+        rewards[out_of_bounds] -= self.boundary_penalty
+        np.clip(states, -self.range, self.range, out=states)
+
+        self.current_steps += 1
+        terminateds = self.current_steps >= self.max_episode_steps
+        truncateds = np.zeros(self.num_envs, dtype=bool)
+        infos = {}
+        if terminateds.any():
+            final_observations = np.empty(self.num_envs, dtype=object)
+            for i in np.flatnonzero(terminateds):
+                final_observations[i] = states[i] / self.range
+            infos["final_observation"] = final_observations
+            infos["_final_observation"] = terminateds.copy()
+            self._reset_envs(terminateds)
+        return states / self.range, rewards, terminateds, truncateds, infos
@@ -0,0 +1,143 @@
+import torch
+
+
+def point_mass1d_dynamics(states, actions, damping_factor, position_limit):
+    """PointMass1DEnv.step for a [N, 2] batch of (position, velocity) states."""
+    velocity = damping_factor * (states[:, 1] + actions[:, 0])
+    position = torch.clamp(states[:, 0] + velocity, -position_limit, position_limit)
+    rewards = 0.5 - position.abs()
+    return torch.stack([position, velocity], dim=1), rewards
+
+
+def point_mass2d_dynamics(states, actions, range, boundary_penalty):
+    """PointMass2DEnv.step for a [N, 2] batch of unnormalized positions."""
+    states = states + actions * (range * 0.1)
+    rewards = 0.5 - torch.linalg.vector_norm(states, dim=1) / range
+    out_of_bounds = (states.abs() > range).any(dim=1)
+    rewards = rewards - boundary_penalty * out_of_bounds.to(rewards.dtype)
+    return torch.clamp(states, -range, range), rewards
+
+
+class TorchPointMassEnv:
+    """
+    Batched PointMass dynamics on torch tensors, so that a rollout never leaves
+    the device. Finished instances are reset automatically.
+
+    step() returns (observations, rewards, terminateds, truncateds,
+    final_observations) where final_observations are the observations before
+    the automatic reset.
+    """
+
+    state_dim = 2
+    action_dim = None
+
+    def __init__(
+        self, num_envs, max_episode_steps=200, device="cpu", compile_step=False
+    ):
+        self.num_envs = num_envs
+        self.max_episode_steps = max_episode_steps
+        self.device = torch.device(device)
+        self.states = torch.zeros(num_envs, self.state_dim, device=self.device)
+        self.current_steps = torch.zeros(num_envs, dtype=torch.long, device=self.device)
+        self.action_low = -torch.ones(self.action_dim, device=self.device)
+        self.action_high = torch.ones(self.action_dim, device=self.device)
+        self.dynamics = self._dynamics
+        if compile_step:
+            self.dynamics = torch.compile(self._dynamics)
+
+    def _dynamics(self, states, actions):
+        raise NotImplementedError
+
+    def _initial_states(self, n):
+        raise NotImplementedError
+
+    def _observe(self, states):
+        return states
+
+    def reset(self):
+        self.states = self._initial_states(self.num_envs)
+        self.current_steps.zero_()
+        return self._observe(self.states)
+
+    def step(self, actions):
+        self.states, rewards = self.dynamics(self.states, actions)
+        self.current_steps += 1
+        terminateds = self.current_steps >= self.max_episode_steps
+        truncateds = torch.zeros_like(terminateds)
+        final_observations = self._observe(self.states)
+        # Reset without a host sync on terminateds.any()
+        reset_states = self._initial_states(self.num_envs)
+        self.states = torch.where(terminateds.unsqueeze(1), reset_states, self.states)
+        self.current_steps = torch.where(
+            terminateds, torch.zeros_like(self.current_steps), self.current_steps
+        )
+        return (
+            self._observe(self.states),
+            rewards,
+            terminateds,
+            truncateds,
+            final_observations,
+        )
+
+
+class TorchPointMass1DEnv(TorchPointMassEnv):
+    action_dim = 1
+
+    def __init__(
+        self,
+        num_envs,
+        position_limit=10.0,
+        damping_factor=0.9,
+        max_episode_steps=200,
+        device="cpu",
+        compile_step=False,
+    ):
+        self.position_limit = float(position_limit)
+        self.damping_factor = damping_factor
+        super(TorchPointMass1DEnv, self).__init__(
+            num_envs, max_episode_steps, device, compile_step
+        )
+
+    def _dynamics(self, states, actions):
+        return point_mass1d_dynamics(
+            states, actions, self.damping_factor, self.position_limit
+        )
+
+    def _initial_states(self, n):
+        # random initial position, zero velocity
+        position = 0.5 * (2 * torch.rand(n, device=self.device) - 1)
+        return torch.stack([position, torch.zeros_like(position)], dim=1)
+
+
+class TorchPointMass2DEnv(TorchPointMassEnv):
+    action_dim = 2
+
+    def __init__(
+        self,
+        num_envs,
+        range=10,
+        boundary_penalty=5.0,
+        max_episode_steps=200,
+        device="cpu",
+        compile_step=False,
+    ):
+        self.range = range
+        self.boundary_penalty = boundary_penalty
+        super(TorchPointMass2DEnv, self).__init__(
+            num_envs, max_episode_steps, device, compile_step
+        )
+
+    def _dynamics(self, states, actions):
+        return point_mass2d_dynamics(states, actions, self.range, self.boundary_penalty)
+
+    def _initial_states(self, n):
+        return (2 * torch.rand(n, 2, device=self.device) - 1) * self.range
+
+    def _observe(self, states):
+        return states / self.range
+
+
+TORCH_ENVS = {
+    "PointMass1D-v0": TorchPointMass1DEnv,
+    "PointMass2D-v0": TorchPointMass2DEnv,
+}
@@ -0,0 +1,355 @@
+import csv
+import json
+import multiprocessing as mp
+import os
+import random
+import traceback
+from time import time
+import click
+import numpy as np
+
+# Per worker process: (env_name, env_config, scale_states) -> (env, state_scaler)
+_WORKER_CACHE = {}
+
+
+class TrialPruned(Exception):
+    """Raised from report_func to stop a trial that fell behind at a rung."""
+
+
+class ASHAScheduler:
+    """
+    Asynchronous successive halving (ASHA, Li et al. 2018).
+
+    A trial's resource is the number of report_func calls it made so far. At
+    rung k (min_resource * reduction_factor**k reports) the reported reward is
+    compared with the rewards of all trials that already reached the rung, and
+    the trial is stopped unless it is in the top 1 / reduction_factor. Trials
+    are never waiting on each other, so the process pool stays busy.
+
+    Parameters:
+    - min_resource (int): Reports before the first rung.
+    - reduction_factor (int): Fraction of trials kept at each rung is 1 / reduction_factor.
+    - max_resource (int): No rungs at or beyond this many reports.
+    - rung_results (dict): rung -> list of rewards, a Manager dict when the
+      trials run in several processes.
+    - lock: Lock protecting rung_results.
+    """
+
+    def __init__(
+        self,
+        min_resource=1,
+        reduction_factor=3,
+        max_resource=None,
+        rung_results=None,
+        lock=None,
+    ):
+        self.min_resource = min_resource
+        self.reduction_factor = reduction_factor
+        self.max_resource = max_resource
+        self.rung_results = {} if rung_results is None else rung_results
+        self.lock = lock
+
+    def rung_of(self, resource):
+        """Returns the rung index reached at `resource` reports, or None."""
+        if self.max_resource is not None and resource >= self.max_resource:
+            return None
+        rung, milestone = 0, self.min_resource
+        while milestone < resource:
+            rung += 1
+            milestone *= self.reduction_factor
+        return rung if milestone == resource else None
+
+    def on_report(self, resource, reward):
+        """Record a report and return False if the trial should stop."""
+        rung = self.rung_of(resource)
+        if rung is None:
+            return True
+        if self.lock is not None:
+            with self.lock:
+                return self._record(rung, reward)
+        return self._record(rung, reward)
+
+    def _record(self, rung, reward):
+        # Read-modify-write so that Manager dicts see the update
+        rewards = list(self.rung_results.get(rung, []))
+        rewards.append(reward)
+        self.rung_results[rung] = rewards
+        if len(rewards) < self.reduction_factor:
+            return True
+        cutoff = np.percentile(rewards, 100 * (1 - 1 / self.reduction_factor))
+        return bool(reward >= cutoff)
+
+
+def sample_trials(param_space, num_trials, seed=None):
+    """
+    Draw num_trials configurations.
+
+    Parameters:
+    - param_space (dict): Config or optimizer config key -> list of values, one
+      of which is chosen uniformly for each trial.
+
+    Returns:
+    - list of dicts that can be passed to utils.update_config.
+    """
+    rng = random.Random(seed)
+    return [
+        {key: rng.choice(values) for key, values in param_space.items()}
+        for _ in range(num_trials)
+    ]
+
+
+def _get_env_and_scaler(config):
+    from nanoppo.environment_manager import EnvironmentManager
+    from nanoppo.state_scaler import StateScaler
+
+    key = (
+        config["env_name"],
+        json.dumps(config["env_config"], sort_keys=True, default=str),
+        config["scale_states"],
+    )
+    if key not in _WORKER_CACHE:
+        env = EnvironmentManager(config["env_name"], config["env_config"]).setup_env()
+        state_scaler = None
+        if config["scale_states"] != "default":
+            state_scaler = StateScaler(
+                env, sample_size=10000, scale_type=config["scale_states"]
+            )
+        _WORKER_CACHE[key] = (env, state_scaler)
+    return _WORKER_CACHE[key]
+
+
+def _init_worker(num_threads):
+    import torch
+
+    torch.set_num_threads(num_threads)
+
+
+def run_trial(trial_id, params, config, optimizer_config, epochs, scheduler, seed=None):
+    """
+    Train one trial with ppo_agent.PPOAgent, reporting to the scheduler.
+
+    Returns:
+    - dict with the trial id, params, status ("completed", "pruned" or "error"),
+      number of reports, last and best reported reward, run time and the
+      traceback of an error.
+    """
+    from nanoppo.ppo_agent import PPOAgent
+    from nanoppo.random_utils import set_seed
+    from nanoppo.utils import update_config
+
+    set_seed(seed)
+    trial_config = update_config(config, optimizer_config, params)
+    trial_config["checkpoint_dir"] = os.path.join(
+        config["checkpoint_dir"], f"trial_{trial_id}"
+    )
+    rewards = []
+
+    def report_func(mean_reward):
+        rewards.append(mean_reward)
+        if not scheduler.on_report(len(rewards), mean_reward):
+            raise TrialPruned()
+
+    trial_config["report_func"] = report_func
+    env, state_scaler = _get_env_and_scaler(trial_config)
+    if seed is not None:
+        # The env is reused across trials, seed its generator for this one
+        env.reset(seed=seed)
+    start = time()
+    status = "completed"
+    error = None
+    try:
+        agent = PPOAgent(
+            trial_config,
+            trial_config["optimizer_config"],
+            force_cpu=True,
+            env=env,
+            state_scaler=state_scaler,
+        )
+        agent.train(epochs)
+    except TrialPruned:
+        status = "pruned"
+    except Exception:
+        # The training loops clean up after themselves, so the worker can run the next trial
+        error = traceback.format_exc()
+        print("Trial", trial_id, "failed:", error)
+        status = "error"
+    return {
+        "trial_id": trial_id,
+        "params": params,
+        "status": status,
+        "reports": len(rewards),
+        "last_reward": rewards[-1] if rewards else float("nan"),
+        "best_reward": max(rewards) if rewards else float("nan"),
+        "seconds": time() - start,
+        "error": error,
+    }
+
+
+def write_results(results, path):
+    """Write one row per trial, best last_reward first."""
+    keys = sorted({key for result in results for key in result["params"]})
+    rows = sorted(
+        results,
+        key=lambda r: -np.inf if np.isnan(r["last_reward"]) else r["last_reward"],
+        reverse=True,
+    )
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            [
+                "trial_id",
+                *keys,
+                "status",
+                "reports",
+                "last_reward",
+                "best_reward",
+                "seconds",
+                "error",
+            ]
+        )
+        for r in rows:
+            writer.writerow(
+                [
+                    r["trial_id"],
+                    *[r["params"].get(key) for key in keys],
+                    r["status"],
+                    r["reports"],
+                    r["last_reward"],
+                    r["best_reward"],
+                    round(r["seconds"], 2),
+                    r["error"] or "",
+                ]
+            )
+    return rows
+
+
+def asha_search(
+    config,
+    optimizer_config,
+    param_space,
+    num_trials=16,
+    epochs=200,
+    num_workers=None,
+    min_resource=1,
+    reduction_factor=3,
+    max_resource=None,
+    results_path="asha_results.csv",
+    seed=None,
+    num_threads=1,
+):
+    """
+    Run an ASHA hyperparameter search over ppo_agent.PPOAgent.
+
+    Trials run in a process pool; each worker keeps its environment and fitted
+    state scaler between trials. Trials are promoted or stopped through
+    report_func, which PPOAgent.train_with_epoch calls every log_interval
+    epochs.
+
+    Parameters:
+    - config, optimizer_config (dict): Base configs, see ppo_agent.PPOAgent.
+    - param_space (dict): Key -> list of values, see sample_trials.
+    - num_trials (int): Number of sampled configurations.
+    - epochs (int): Maximum epochs per trial.
+    - num_workers (int): Pool size, os.cpu_count() if None.
+    - results_path (str): CSV file with one row per trial.
+
+    Returns:
+    - list of trial result dicts, best first.
+    """
+    trials = sample_trials(param_space, num_trials, seed)
+    config = dict(config, report_func=None, wandb_log=False)
+    num_workers = num_workers or os.cpu_count()
+    ctx = mp.get_context("spawn")
+    with ctx.Manager() as manager:
+        scheduler = ASHAScheduler(
+            min_resource,
+            reduction_factor,
+            max_resource,
+            rung_results=manager.dict(),
+            lock=manager.Lock(),
+        )
+        with ctx.Pool(
+            num_workers, initializer=_init_worker, initargs=(num_threads,)
+        ) as pool:
+            results = pool.starmap(
+                run_trial,
+                [
+                    (
+                        i,
+                        params,
+                        config,
+                        optimizer_config,
+                        epochs,
+                        scheduler,
+                        None if seed is None else seed + i,
+                    )
+                    for i, params in enumerate(trials)
+                ],
+                chunksize=1,
+            )
+    rows = write_results(results, results_path)
+    for r in rows:
+        print(
+            "trial",
+            r["trial_id"],
+            r["status"],
+            "reports",
+            r["reports"],
+            "last reward",
+            round(r["last_reward"], 2),
+            r["params"],
+        )
+    print("Saved results to", results_path)
+    return rows
+
+
+@click.command()
+@click.option(
+    "--config",
+    "config_file",
+    required=True,
+    help="JSON file with config and optimizer_config.",
+)
+@click.option(
+    "--space", "space_file", required=True, help="JSON file with key -> list of values."
+)
+@click.option("--num_trials", default=16, help="Number of sampled configurations.")
+@click.option("--epochs", default=200, help="Maximum epochs per trial.")
+@click.option("--num_workers", default=None, type=int, help="Pool size.")
+@click.option("--min_resource", default=1, help="Reports before the first rung.")
+@click.option(
+    "--reduction_factor", default=3, help="Keep 1/reduction_factor of trials per rung."
+)
+@click.option("--output", default="asha_results.csv", help="Results CSV.")
+@click.option("--seed", default=None, type=int, help="Seed for sampling and trials.")
+def cli(
+    config_file,
+    space_file,
+    num_trials,
+    epochs,
+    num_workers,
+    min_resource,
+    reduction_factor,
+    output,
+    seed,
+):
+    with open(config_file) as f:
+        configs = json.load(f)
+    with open(space_file) as f:
+        param_space = json.load(f)
+    asha_search(
+        configs["config"],
+        configs["optimizer_config"],
+        param_space,
+        num_trials=num_trials,
+        epochs=epochs,
+        num_workers=num_workers,
+        min_resource=min_resource,
+        reduction_factor=reduction_factor,
+        results_path=output,
+        seed=seed,
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,4 +1,3 @@
-import pandas as pd
 from collections import defaultdict
 
 
@@ -17,6 +16,7 @@ class MetricsRecorder:
             "episode_reward_maxs": [],
         }
         self.learning = defaultdict(list)
+        self.updates = {"epochs": [], "approx_kl": []}
 
     def record_losses(self, total_loss, policy_loss, entropy_loss, value_loss):
         self.losses["total_losses"].append(total_loss)
@@ -37,6 +37,11 @@ class MetricsRecorder:
         for k, v in lrs.items():
             self.learning[k].append(v)
 
+    def record_update(self, epochs, approx_kl):
+        """Epochs run by one update and the approximate KL it reached."""
+        self.updates["epochs"].append(epochs)
+        self.updates["approx_kl"].append(approx_kl)
+
     def to_csv(self):
         import pandas as pd
 
@@ -45,9 +50,11 @@ class MetricsRecorder:
         df_actions = pd.DataFrame(self.actions)
         df_rewards = pd.DataFrame(self.episode_rewards)
         df_learning = pd.DataFrame(self.learning)
+        df_updates = pd.DataFrame(self.updates)
 
         # Save to separate CSVs
         df_losses.to_csv("losses_metrics.csv", index=False)
         df_actions.to_csv("actions_metrics.csv", index=False)
         df_rewards.to_csv("rewards_metrics.csv", index=False)
         df_learning.to_csv("learning_metrics.csv", index=False)
+        df_updates.to_csv("updates_metrics.csv", index=False)
@@ -0,0 +1,371 @@
+import copy
+import math
+import click
+import torch
+from torch.func import functional_call, stack_module_state, vmap
+from nanoppo.envs.torch_point_mass import TORCH_ENVS
+from nanoppo.tensor_normalizer import TensorNormalizer
+from nanoppo.phase_timer import PhaseTimer
+from nanoppo.policy.actor_critic import ActorCritic
+from nanoppo.ppo_utils import compute_gae_batched
+from nanoppo.tensor_rollout import TensorRolloutCollector
+
+HEADS = ("action_mu", "action_log_std", "value_layer")
+LOG_SQRT_2PI = 0.5 * math.log(2 * math.pi)
+
+
+def gaussian_log_prob(action, mu, log_std):
+    """Normal(mu, exp(log_std)).log_prob(action).sum(-1) without torch.distributions."""
+    return (
+        -((action - mu) ** 2) / (2 * torch.exp(2 * log_std)) - log_std - LOG_SQRT_2PI
+    ).sum(-1)
+
+
+class MultiSeedPPOAgent:
+    """
+    Train one ActorCritic per seed in a single process. The parameters of the
+    seeds are stacked with torch.func.stack_module_state, and acting and the
+    PPO update run as one vmapped computation over the seed dimension.
+
+    The update mirrors continuous_action_ppo.PPOAgent.update per seed: losses of
+    different seeds do not share parameters, so the gradient of their sum is
+    the per-seed gradient. Adam is elementwise, so one Adam over the stacked
+    parameters behaves like one optimizer per seed; gradient clipping uses the
+    norm of each seed separately.
+
+    Parameters:
+    - seeds (list): One seed per policy, used for its initialization.
+    - state_dim (int), action_dim (int), n_latent_var (int): ActorCritic sizes.
+    - action_low, action_high (array): Action bounds.
+    """
+
+    def __init__(
+        self,
+        seeds,
+        state_dim,
+        action_dim,
+        n_latent_var,
+        action_low,
+        action_high,
+        policy_lr=0.0005,
+        value_lr=0.0005,
+        betas=(0.9, 0.999),
+        K_epochs=4,
+        eps_clip=0.2,
+        vl_coef=0.5,
+        el_coef=0.001,
+        max_grad_norm=0.7,
+        device="cpu",
+    ):
+        self.seeds = list(seeds)
+        self.num_seeds = len(self.seeds)
+        self.K_epochs = K_epochs
+        self.eps_clip = eps_clip
+        self.vl_coef = vl_coef
+        self.el_coef = el_coef
+        self.max_grad_norm = max_grad_norm
+        self.device = device
+
+        action_low_tensor = torch.tensor(action_low, dtype=torch.float32).to(device)
+        action_high_tensor = torch.tensor(action_high, dtype=torch.float32).to(device)
+        policies = []
+        for seed in self.seeds:
+            torch.manual_seed(seed)
+            policies.append(
+                ActorCritic(
+                    state_dim,
+                    action_dim,
+                    n_latent_var,
+                    action_low_tensor,
+                    action_high_tensor,
+                ).to(device)
+            )
+        # Stateless copy that functional_call fills with the stacked parameters
+        self.base_policy = copy.deepcopy(policies[0]).to("meta")
+        self.params, self.buffers = stack_module_state(policies)
+
+        actor_params = [
+            p for name, p in self.params.items() if not name.startswith("value_layer")
+        ]
+        critic_params = [
+            p for name, p in self.params.items() if name.startswith("value_layer")
+        ]
+        self.optimizer = torch.optim.Adam(
+            [
+                {"params": actor_params, "lr": policy_lr},
+                {"params": critic_params, "lr": value_lr},
+            ],
+            betas=betas,
+        )
+        self._heads = vmap(self._single_heads)
+        self.iterations = 0
+
+    def _single_heads(self, params, buffers, states):
+        out = []
+        for head in HEADS:
+            prefix = head + "."
+            head_params = {
+                name[len(prefix) :]: p
+                for name, p in params.items()
+                if name.startswith(prefix)
+            }
+            head_buffers = {
+                name[len(prefix) :]: b
+                for name, b in buffers.items()
+                if name.startswith(prefix)
+            }
+            module = getattr(self.base_policy, head)
+            out.append(functional_call(module, (head_params, head_buffers), (states,)))
+        mu, log_std, value = out
+        return mu, log_std, value.squeeze(-1)
+
+    def heads(self, states):
+        """
+        Parameters:
+        - states (tensor): [num_seeds, batch, state_dim]
+
+        Returns:
+        - mu, log_std ([num_seeds, batch, action_dim]) and values ([num_seeds, batch])
+        """
+        return self._heads(self.params, self.buffers, states)
+
+    def act(self, states):
+        """Sample actions for [num_seeds, batch, state_dim] states."""
+        mu, log_std, _ = self.heads(states)
+        action = mu + torch.exp(log_std) * torch.randn_like(mu)
+        return action, gaussian_log_prob(action, mu, log_std)
+
+    def get_value(self, states):
+        return self.heads(states)[2]
+
+    def evaluate(self, states, actions):
+        mu, log_std, values = self.heads(states)
+        return gaussian_log_prob(actions, mu, log_std), values
+
+    def clip_grad_norm(self):
+        """Clip the gradient norm of each seed to max_grad_norm, returns the norms."""
+        grads = [p.grad for p in self.params.values() if p.grad is not None]
+        norms = torch.sqrt(sum(g.pow(2).flatten(1).sum(1) for g in grads))
+        coef = torch.clamp(self.max_grad_norm / (norms + 1e-6), max=1.0)
+        for g in grads:
+            g.mul_(coef.view(-1, *([1] * (g.dim() - 1))))
+        return norms
+
+    def update(self, states, actions, returns, old_logprobs=None):
+        """
+        PPO update on per-seed batches.
+
+        Parameters:
+        - states (tensor): [num_seeds, batch, state_dim]
+        - actions (tensor): [num_seeds, batch, action_dim]
+        - returns (tensor): [num_seeds, batch]
+        - old_logprobs (tensor): [num_seeds, batch], computed from the current
+          parameters if None.
+
+        Returns:
+        - dict of per-seed [num_seeds] tensors of the last epoch's losses.
+        """
+        if old_logprobs is None:
+            with torch.no_grad():
+                old_logprobs, _ = self.evaluate(states, actions)
+
+        for _ in range(self.K_epochs):
+            logprobs, state_values = self.evaluate(states, actions)
+
+            advantages = returns - state_values.detach()
+            advantages = (advantages - advantages.mean(1, keepdim=True)) / (
+                advantages.std(1, keepdim=True) + 1e-5
+            )
+
+            log_diff = torch.clamp(logprobs - old_logprobs, -50, 50)
+            ratio = torch.exp(log_diff)
+            surr1 = ratio * advantages
+            surr2 = (
+                torch.clamp(ratio, 1 - self.eps_clip, 1 + self.eps_clip) * advantages
+            )
+            policy_loss = -torch.min(surr1, surr2).mean(1)
+            value_loss = self.vl_coef * ((state_values - returns) ** 2).mean(1)
+            entropy_loss = -self.el_coef * logprobs.mean(1)
+            loss = policy_loss + value_loss + entropy_loss
+
+            self.optimizer.zero_grad()
+            loss.sum().backward()
+            grad_norm = self.clip_grad_norm()
+            self.optimizer.step()
+
+        self.iterations += 1
+        return {
+            "policy_loss": policy_loss.detach(),
+            "value_loss": value_loss.detach(),
+            "entropy_loss": entropy_loss.detach(),
+            "total_loss": loss.detach(),
+            "grad_norm": grad_norm,
+        }
+
+    def get_policy(self, index):
+        """Returns an ActorCritic with the parameters of seed `index`."""
+        policy = ActorCritic(
+            self.base_policy.action_mu[0].in_features,
+            self.base_policy.action_mu[-1].out_features,
+            self.base_policy.action_mu[0].out_features,
+            self.base_policy.action_low_tensor,
+            self.base_policy.action_high_tensor,
+        ).to(self.device)
+        policy.load_state_dict(
+            {name: p[index].detach() for name, p in self.params.items()}
+        )
+        return policy
+
+
+class _FlatPolicy:
+    """act/get_value on [num_seeds * num_envs, ...] batches for TensorRolloutCollector."""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def _split(self, states):
+        return states.reshape(self.agent.num_seeds, -1, states.shape[-1])
+
+    def act(self, states):
+        action, logprob = self.agent.act(self._split(states))
+        return action.flatten(0, 1), logprob.flatten()
+
+    def get_value(self, states):
+        return self.agent.get_value(self._split(states)).reshape(-1, 1)
+
+
+def train_multi_seed(
+    env_name="PointMass1D-v0",
+    seeds=(0, 1, 2, 3),
+    num_envs=16,
+    num_steps=200,
+    iterations=50,
+    n_latent_var=64,
+    policy_lr=0.0005,
+    value_lr=0.0005,
+    gamma=0.99,
+    tau=0.95,
+    K_epochs=4,
+    eps_clip=0.2,
+    max_episode_steps=200,
+    log_interval=10,
+    device="cpu",
+    phase_timer=None,
+):
+    """
+    Train len(seeds) policies on a torch PointMass environment with num_envs
+    environments per seed, all stepped as one batch.
+
+    Returns:
+    - (MultiSeedPPOAgent, list of [num_seeds] mean episode rewards per iteration)
+      A seed with no episode finished in an iteration keeps its last mean, or
+      reports the mean return so far of its running episodes until its first
+      episode finished.
+    """
+    num_seeds = len(seeds)
+    env = TORCH_ENVS[env_name](
+        num_seeds * num_envs, max_episode_steps=max_episode_steps, device=device
+    )
+    agent = MultiSeedPPOAgent(
+        seeds,
+        env.state_dim,
+        env.action_dim,
+        n_latent_var,
+        env.action_low.cpu().numpy(),
+        env.action_high.cpu().numpy(),
+        policy_lr=policy_lr,
+        value_lr=value_lr,
+        K_epochs=K_epochs,
+        eps_clip=eps_clip,
+        device=device,
+    )
+    # Environments of a seed are contiguous, so each seed keeps its own statistics
+    normalizer = TensorNormalizer(env.state_dim, device=device, num_groups=num_seeds)
+    collector = TensorRolloutCollector(env, _FlatPolicy(agent), normalizer, num_steps)
+
+    if phase_timer is None:
+        phase_timer = PhaseTimer()
+    collect_phase = phase_timer.phase("collect")
+    gae_phase = phase_timer.phase("gae")
+    update_phase = phase_timer.phase("update")
+
+    def per_seed(x):
+        # [T, num_seeds * num_envs, ...] -> [num_seeds, T * num_envs, ...]
+        x = x.reshape(num_steps, num_seeds, num_envs, *x.shape[2:]).transpose(0, 1)
+        return x.reshape(num_seeds, num_steps * num_envs, *x.shape[3:])
+
+    reward_history = []
+    last_rewards = torch.zeros(num_seeds, device=device)
+    seen = torch.zeros(num_seeds, dtype=torch.bool, device=device)
+    for iteration in range(1, iterations + 1):
+        with collect_phase:
+            rollout = collector.collect()
+        with gae_phase:
+            returns = compute_gae_batched(
+                rollout["next_value"],
+                rollout["rewards"],
+                rollout["masks"],
+                rollout["values"],
+                gamma=gamma,
+                tau=tau,
+            )
+        with update_phase:
+            metrics = agent.update(
+                per_seed(rollout["states"]),
+                per_seed(rollout["actions"]),
+                per_seed(returns),
+                old_logprobs=per_seed(rollout["logprobs"]),
+            )
+
+        ends = per_seed(rollout["episode_ends"]).float()
+        num_ends = ends.sum(1)
+        mean_rewards = (per_seed(rollout["episode_returns"]) * ends).sum(
+            1
+        ) / num_ends.clamp(min=1)
+        last_rewards = torch.where(num_ends > 0, mean_rewards, last_rewards)
+        seen |= num_ends > 0
+        running = collector.episode_rewards.reshape(num_seeds, num_envs).mean(1)
+        episode_rewards = torch.where(seen, last_rewards, running)
+        reward_history.append(episode_rewards.cpu().tolist())
+        if log_interval > 0 and iteration % log_interval == 0:
+            steps_per_sec = (
+                iteration * num_steps * num_envs * num_seeds / phase_timer.elapsed()
+            )
+            print(
+                "Iteration {} \t avg reward per seed: {} \t policy loss per seed: {} \t steps/s: {:.1f}".format(
+                    iteration,
+                    " ".join("{:.3f}".format(r) for r in reward_history[-1]),
+                    " ".join(
+                        "{:.3f}".format(l) for l in metrics["policy_loss"].tolist()
+                    ),
+                    steps_per_sec,
+                )
+            )
+            print("Phase times", phase_timer.format())
+    return agent, reward_history
+
+
+@click.command()
+@click.option(
+    "--env_name", default="PointMass1D-v0", type=click.Choice(list(TORCH_ENVS))
+)
+@click.option("--num_seeds", default=8, help="Number of seeds trained together.")
+@click.option("--num_envs", default=16, help="Environments per seed.")
+@click.option("--num_steps", default=200, help="Steps per environment per iteration.")
+@click.option("--iterations", default=50, help="Number of rollout/update iterations.")
+@click.option("--device", default="cpu", help="Torch device.")
+@click.option("--log_interval", default=10, help="Logging interval.")
+def cli(env_name, num_seeds, num_envs, num_steps, iterations, device, log_interval):
+    train_multi_seed(
+        env_name=env_name,
+        seeds=list(range(num_seeds)),
+        num_envs=num_envs,
+        num_steps=num_steps,
+        iterations=iterations,
+        device=device,
+        log_interval=log_interval,
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,8 +1,10 @@
+import copy
 import torch
 from torch import optim
 import gym
 from nanoppo.policy.network import PolicyNetwork, ValueNetwork
 from nanoppo.policy.actor_critic import ActorCritic
+from nanoppo.policy.categorical_actor_critic import CategoricalActorCritic
 from torch.optim.lr_scheduler import ExponentialLR, CosineAnnealingLR
 
 
@@ -33,14 +35,41 @@ class NetworkManager:
         else:
             action_dim = self.env.action_space.n
 
-        if self.network_type == "actor_critic":
+        discrete = isinstance(self.env.action_space, gym.spaces.Discrete)
+
+        if self.network_type == "actor_critic" and discrete:
+            policy = (
+                CategoricalActorCritic(
+                    state_dim=observation_space.shape[0],
+                    action_dim=action_dim,
+                    n_latent_var=self.hidden_size,
+                )
+                .float()
+                .to(self.device)
+            )
+            value = policy.value_layer
+
+            # Separate the parameters of the actor and critic networks
+            actor_params = list(policy.action_logits.parameters())
+            critic_params = list(policy.value_layer.parameters())
+
+            policy_old = copy.deepcopy(policy)
+            value_old = policy_old.value_layer
+
+        elif self.network_type == "actor_critic":
+            action_low_tensor = torch.tensor(
+                self.env.action_space.low, dtype=torch.float32
+            ).to(self.device)
+            action_high_tensor = torch.tensor(
+                self.env.action_space.high, dtype=torch.float32
+            ).to(self.device)
             policy = (
                 ActorCritic(
                     state_dim=observation_space.shape[0],
                     action_dim=action_dim,
                     n_latent_var=self.hidden_size,
-                    action_low=self.env.action_space.low,
-                    action_high=self.env.action_space.high,
+                    action_low_tensor=action_low_tensor,
+                    action_high_tensor=action_high_tensor,
                 )
                 .float()
                 .to(self.device)
@@ -59,8 +88,8 @@ class NetworkManager:
                     state_dim=observation_space.shape[0],
                     action_dim=action_dim,
                     n_latent_var=self.hidden_size,
-                    action_low=self.env.action_space.low,
-                    action_high=self.env.action_space.high,
+                    action_low_tensor=action_low_tensor,
+                    action_high_tensor=action_high_tensor,
                 )
                 .float()
                 .to(self.device)
@@ -69,8 +98,15 @@ class NetworkManager:
             value_old = policy_old.value_layer
 
         else:
+            if discrete:
+                raise ValueError(
+                    "Discrete action spaces need network_type 'actor_critic'."
+                )
             policy = PolicyNetwork(
-                observation_space.shape[0], action_dim, init_type=self.init_type
+                observation_space.shape[0],
+                action_dim,
+                self.hidden_size,
+                init_type=self.init_type,
             ).to(self.device)
             value = ValueNetwork(
                 observation_space.shape[0],
@@ -80,6 +116,9 @@ class NetworkManager:
             actor_params = list(policy.parameters())
             critic_params = list(value.parameters())
 
+            policy_old = copy.deepcopy(policy)
+            value_old = copy.deepcopy(value)
+
         policy_lr = self.optimizer_config["policy_lr"]
         value_lr = self.optimizer_config["value_lr"]
 
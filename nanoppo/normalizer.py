@@ -1,4 +1,5 @@
 import numpy as np
+from nanoppo.stats_sync import merge_moments
 
 
 class Normalizer:
@@ -36,3 +37,23 @@ class Normalizer:
         self.mean = state["mean"]
         self.mean_diff = state["mean_diff"]
         self.variance = state["variance"]
+
+    def get_moments(self):
+        """(count, mean, M2) float64 summaries of the observations, per dimension."""
+        return (
+            self.n.astype(np.float64),
+            self.mean.astype(np.float64),
+            self.mean_diff.astype(np.float64),
+        )
+
+    def set_moments(self, moments):
+        """Replace the statistics with (count, mean, M2) summaries."""
+        n, mean, mean_diff = moments
+        self.n = np.asarray(n, dtype=np.float32).copy()
+        self.mean = np.asarray(mean, dtype=np.float32).copy()
+        self.mean_diff = np.asarray(mean_diff, dtype=np.float32).copy()
+        self.variance = (self.mean_diff / np.maximum(self.n, 1.0)).clip(min=1e-2)
+
+    def merge_moments(self, moments):
+        """Add the observations summarized by (count, mean, M2), e.g. of another worker."""
+        self.set_moments(merge_moments(self.get_moments(), moments))
@@ -0,0 +1,152 @@
+import numpy as np
+
+# This module must not import torch: it is loaded by inference jobs that only
+# need the exported weights. Exporting works on any nn.Module duck-typed by
+# its children and `weight`/`bias` tensors.
+
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0.0),
+}
+
+
+def _export_mlp(prefix, sequential, arrays):
+    layers = []
+    for i, module in enumerate(sequential):
+        name = type(module).__name__
+        if name == "Linear":
+            arrays[f"{prefix}.{i}.weight"] = (
+                module.weight.detach().cpu().numpy().astype(np.float32)
+            )
+            arrays[f"{prefix}.{i}.bias"] = (
+                module.bias.detach().cpu().numpy().astype(np.float32)
+            )
+            layers.append(f"Linear:{i}")
+        elif name in ACTIVATIONS:
+            layers.append(name)
+        else:
+            raise ValueError(f"Cannot export layer {name} in {prefix}.")
+    arrays[f"{prefix}.layers"] = np.array(layers)
+
+
+def _to_numpy(x):
+    if hasattr(x, "detach"):
+        x = x.detach().cpu().numpy()
+    return np.asarray(x, dtype=np.float32)
+
+
+def export_policy(policy, path, normalizer=None):
+    """
+    Export the actor of an ActorCritic policy and the normalizer statistics
+    to a compressed .npz file that can be loaded by NumpyPolicy. For a policy
+    with rescale, the action bounds are exported too.
+
+    Parameters:
+    - policy (ActorCritic): Policy with `action_mu` and `action_log_std` MLPs.
+    - path (str): Output file path.
+    - normalizer (Normalizer): Optional state normalizer.
+    """
+    arrays = {}
+    _export_mlp("action_mu", policy.action_mu, arrays)
+    _export_mlp("action_log_std", policy.action_log_std, arrays)
+    if getattr(policy, "rescale", False):
+        arrays["rescale.low"] = _to_numpy(policy.action_low_tensor)
+        arrays["rescale.high"] = _to_numpy(policy.action_high_tensor)
+        arrays["rescale.epsilon"] = np.float32(policy.epsilon)
+    if normalizer is not None:
+        arrays["normalizer.mean"] = np.asarray(normalizer.mean, dtype=np.float32)
+        arrays["normalizer.variance"] = np.asarray(
+            normalizer.variance, dtype=np.float32
+        )
+    # np.savez appends .npz to paths without it; write through a file object
+    # so that the path is used as given.
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+
+class NumpyMLP:
+    def __init__(self, arrays, prefix):
+        self.layers = []
+        for layer in arrays[f"{prefix}.layers"]:
+            layer = str(layer)
+            if layer.startswith("Linear:"):
+                i = layer.split(":")[1]
+                # Keep W transposed so that a batch is a single x @ W + b
+                weight = arrays[f"{prefix}.{i}.weight"].T.copy()
+                bias = arrays[f"{prefix}.{i}.bias"]
+                self.layers.append((weight, bias))
+            else:
+                self.layers.append(ACTIVATIONS[layer])
+
+    def __call__(self, x):
+        for layer in self.layers:
+            if isinstance(layer, tuple):
+                x = x @ layer[0] + layer[1]
+            else:
+                x = layer(x)
+        return x
+
+
+class NumpyPolicy:
+    """
+    Torch-free runtime for policies written by export_policy.
+    """
+
+    def __init__(self, path, seed=None):
+        with np.load(path) as data:
+            arrays = {k: data[k] for k in data.files}
+        self.action_mu = NumpyMLP(arrays, "action_mu")
+        self.action_log_std = NumpyMLP(arrays, "action_log_std")
+        if "normalizer.mean" in arrays:
+            self.obs_mean = arrays["normalizer.mean"]
+            self.obs_std = np.sqrt(arrays["normalizer.variance"])
+        else:
+            self.obs_mean = None
+            self.obs_std = None
+        if "rescale.low" in arrays:
+            self.action_low = arrays["rescale.low"]
+            self.action_high = arrays["rescale.high"]
+            self.epsilon = float(arrays["rescale.epsilon"])
+        else:
+            self.action_low = None
+        self.rng = np.random.default_rng(seed)
+
+    def normalize(self, state):
+        """Same as Normalizer.normalize with the exported statistics."""
+        if self.obs_mean is None:
+            return np.asarray(state, dtype=np.float32)
+        return ((state - self.obs_mean) / self.obs_std).astype(np.float32)
+
+    def rescale_action(self, action):
+        """ActorCritic.rescale_action: tanh, then mapped into the action bounds."""
+        eps = self.epsilon
+        action = np.clip(np.tanh(action), -1 + eps, 1 - eps)
+        action_range = self.action_high - self.action_low
+        action = self.action_low + (action + 1 - eps) / (2 - 2 * eps) * action_range
+        return action.astype(np.float32)
+
+    def act(self, state, deterministic=True, normalize=True):
+        """
+        Compute actions for a single state or a batch of states.
+
+        Parameters:
+        - state (array): Raw state of shape [state_dim] or [N, state_dim].
+        - deterministic (bool): Return the mean action if True, otherwise
+          sample from the Gaussian given by `action_log_std`. Policies
+          exported with rescale map either through rescale_action().
+        - normalize (bool): Apply the exported normalizer first.
+
+        Returns:
+        - Actions of shape [action_dim] or [N, action_dim].
+        """
+        state = np.asarray(state, dtype=np.float32)
+        if normalize:
+            state = self.normalize(state)
+        action = self.action_mu(state)
+        if not deterministic:
+            std = np.exp(self.action_log_std(state))
+            noise = self.rng.standard_normal(action.shape).astype(np.float32)
+            action = action + std * noise
+        if self.action_low is not None:
+            action = self.rescale_action(action)
+        return action
@@ -0,0 +1,148 @@
+from time import perf_counter
+
+
+class _Phase:
+    """Reusable context manager that adds its elapsed time to a PhaseTimer."""
+
+    __slots__ = ("timer", "name", "start", "record")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = 0.0
+        self.record = None
+
+    def __enter__(self):
+        if self.timer.profiling:
+            from torch.profiler import record_function
+
+            self.record = record_function(self.name)
+            self.record.__enter__()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.totals[self.name] += perf_counter() - self.start
+        self.timer.counts[self.name] += 1
+        if self.record is not None:
+            self.record.__exit__(*exc)
+            self.record = None
+        return False
+
+
+class PhaseTimer:
+    """
+    Accumulate wall-clock time per training phase (env stepping, acting, GAE,
+    updates, logging, checkpointing, ...).
+
+    Usage:
+        timer = PhaseTimer()
+        with timer.phase("env"):
+            env.step(action)
+        print(timer.format())
+
+    Each phase costs two perf_counter calls and a dict update, so the timers
+    can stay enabled in the training loops.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.totals = {}
+        self.counts = {}
+        # Set by TrainingProfiler so that phases also show up in the trace
+        self.profiling = False
+        self.start_time = perf_counter()
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+            self.totals[name] = 0.0
+            self.counts[name] = 0
+        return phase
+
+    def elapsed(self):
+        return perf_counter() - self.start_time
+
+    def reset(self):
+        for name in self.totals:
+            self.totals[name] = 0.0
+            self.counts[name] = 0
+        self.start_time = perf_counter()
+
+    def summary(self):
+        """
+        Returns:
+        - dict of phase name -> {"seconds", "share", "count"}. The share is the
+          fraction of wall-clock time since the timer was started or reset;
+          time outside of any phase is reported as "other".
+        """
+        elapsed = max(self.elapsed(), 1e-12)
+        summary = {
+            name: {
+                "seconds": seconds,
+                "share": seconds / elapsed,
+                "count": self.counts[name],
+            }
+            for name, seconds in self.totals.items()
+        }
+        other = max(elapsed - sum(self.totals.values()), 0.0)
+        summary["other"] = {"seconds": other, "share": other / elapsed, "count": 0}
+        return summary
+
+    def format(self):
+        return " ".join(
+            "{}: {:.2f}s ({:.0%})".format(name, s["seconds"], s["share"])
+            for name, s in self.summary().items()
+        )
+
+
+class TrainingProfiler:
+    """
+    Wrap the first `iterations` training iterations in torch.profiler and
+    export a Chrome trace (open with chrome://tracing or Perfetto).
+
+    Call step() once per iteration. Profiling is disabled when iterations <= 0.
+    """
+
+    def __init__(self, iterations, trace_path, phase_timer=None):
+        self.iterations = iterations
+        self.trace_path = trace_path
+        self.phase_timer = phase_timer
+        self.profiler = None
+        self.steps = 0
+
+    def start(self):
+        if self.iterations <= 0:
+            return
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self.profiler = profile(activities=activities)
+        self.profiler.__enter__()
+        if self.phase_timer is not None:
+            self.phase_timer.profiling = True
+
+    def step(self):
+        if self.profiler is None:
+            return
+        self.steps += 1
+        if self.steps >= self.iterations:
+            self.stop()
+
+    def stop(self):
+        if self.profiler is None:
+            return
+        self.profiler.__exit__(None, None, None)
+        if self.phase_timer is not None:
+            self.phase_timer.profiling = False
+            # Keep the trace export out of the other phases
+            with self.phase_timer.phase("profiler"):
+                self.profiler.export_chrome_trace(self.trace_path)
+        else:
+            self.profiler.export_chrome_trace(self.trace_path)
+        print("Saved profiler trace to", self.trace_path)
+        self.profiler = None
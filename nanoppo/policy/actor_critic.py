@@ -37,8 +37,9 @@ class ActorCritic(nn.Module):
         )
 
     def forward(self, state):
-        mu = self.action_mu(state)
-        log_std = self.action_log_std(state)
+        # float() keeps the distribution in float32 under bfloat16 autocast
+        mu = self.action_mu(state).float()
+        log_std = self.action_log_std(state).float()
 
         if self.debug:
             # Check for NaN values immediately after computation
@@ -142,14 +143,14 @@ class ActorCritic(nn.Module):
         if self.rescale:
             assert (action >= self.action_low_tensor).all() and (action <= self.action_high_tensor).all(), "Actions are not rescaled!"
 
-        mu = self.action_mu(state)
+        mu = self.action_mu(state).float()
         if self.debug:
             # Check if 'mu' contains any NaN values and call the debug function if it does
             if torch.isnan(mu).any():
                 print("NaN detected in output. Starting debug sequence...\n")
                 self.debug_this(self.action_mu)
                 breakpoint()
-        log_std = self.action_log_std(state)
+        log_std = self.action_log_std(state).float()
         std = log_std.exp()
         
         dist = torch.distributions.Normal(mu, std)
@@ -167,7 +168,7 @@ class ActorCritic(nn.Module):
             torch.full_like(logprobs, -1e7),  # Replace -inf with -1e7
             logprobs
         )
-        state_value = self.value_layer(state)
+        state_value = self.value_layer(state).float()
         return clean_logprobs, torch.squeeze(state_value)
 
     def get_value(self, state):
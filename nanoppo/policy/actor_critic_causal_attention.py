@@ -1,10 +1,94 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch.nn import MultiheadAttention
+from torch.utils.checkpoint import checkpoint
 from nanoppo.sinusoidal_positional_encoding import SinusoidalPositionalEncoding
 
+BRANCHES = ("action_mu", "action_log_std", "value_layer")
+
+
+class AttentionKVCache:
+    """
+    Keys and values of the attention branches of ActorCriticCausalAttention
+    for incremental acting in a batch of environments. The heads of all
+    branches are stored side by side.
+
+    Every environment has its own episode length, the position of its next
+    state. Entries at or beyond it are stale and masked out, so an episode is
+    restarted by setting its length to zero. The capacity doubles when an
+    episode outgrows it.
+
+    Parameters:
+    - num_envs (int): Batch size.
+    - num_heads (int), head_dim (int): Attention shape, over all branches.
+    - capacity (int): Initial number of cached positions.
+    """
+
+    def __init__(self, num_envs, num_heads, head_dim, capacity=64, device="cpu", dtype=torch.float32):
+        self.num_envs = num_envs
+        self.keys = torch.zeros(num_envs, num_heads, capacity, head_dim, device=device, dtype=dtype)
+        self.values = torch.zeros_like(self.keys)
+        self.lengths = torch.zeros(num_envs, dtype=torch.long, device=device)
+        self.env_index = torch.arange(num_envs, device=device)
+
+    @property
+    def capacity(self):
+        return self.keys.size(2)
+
+    def reset(self, done=None):
+        """Restart all episodes, or those of the envs where `done` is True."""
+        if done is None:
+            self.lengths.zero_()
+        else:
+            done = torch.as_tensor(done, device=self.lengths.device).reshape(-1).bool()
+            self.lengths.masked_fill_(done, 0)
+
+    def reserve(self):
+        """Make room for one more position in every env."""
+        if int(self.lengths.max()) < self.capacity:
+            return
+        self.keys = torch.cat([self.keys, torch.zeros_like(self.keys)], dim=2)
+        self.values = torch.cat([self.values, torch.zeros_like(self.values)], dim=2)
+
+    def attend(self, q, k, v):
+        """
+        Store the key and value of the current position and attend to the
+        episode so far.
+
+        Parameters:
+        - q, k, v (tensor): [num_envs, num_heads, head_dim] projections of the current state.
+
+        Returns:
+        - [num_envs, num_heads, head_dim] attention output.
+        """
+        self.keys[self.env_index, :, self.lengths] = k
+        self.values[self.env_index, :, self.lengths] = v
+        length = int(self.lengths.max()) + 1
+        keys, values = self.keys[:, :, :length], self.values[:, :, :length]
+        scores = torch.einsum("bhd,bhld->bhl", q, keys) / q.size(-1) ** 0.5
+        positions = torch.arange(length, device=q.device)
+        invalid = positions.unsqueeze(0) > self.lengths.unsqueeze(1)
+        scores = scores.masked_fill(invalid.unsqueeze(1), float("-inf"))
+        return torch.einsum("bhl,bhld->bhd", torch.softmax(scores, dim=-1), values)
+
+    def advance(self):
+        self.lengths += 1
+
+
 class ActorCriticCausalAttention(nn.Module):
-    def __init__(self, state_dim, action_dim, nhead, action_low_tensor, action_high_tensor, device, rescale=False, debug=False):
+    """
+    Actor-critic whose mu, log-std and value branches attend over the states
+    of the current context: at most context_length steps of the current
+    episode while acting with act_cached(), and the matching windows of the
+    rollout in evaluate_windows() (see ppo_utils.episode_windows).
+
+    With checkpoint_attention, evaluate_windows() and get_value_windows()
+    keep only their input for backward and recompute one branch at a time,
+    trading a second forward pass for the activation memory of long windows.
+    """
+
+    def __init__(self, state_dim, action_dim, nhead, action_low_tensor, action_high_tensor, device, rescale=False, debug=False, context_length=64, checkpoint_attention=False):
         super(ActorCriticCausalAttention, self).__init__()
         self.action_low_tensor = action_low_tensor
         self.action_high_tensor = action_high_tensor
@@ -12,6 +96,12 @@ class ActorCriticCausalAttention(nn.Module):
         self.debug = debug
         self.epsilon = 1e-5
         self.positional_encoding = SinusoidalPositionalEncoding(d_model = state_dim, device=device)
+        self.nhead = nhead
+        # Acting restarts the context every context_length steps, None for whole episodes
+        self.context_length = context_length
+        self.checkpoint_attention = checkpoint_attention
+        # Keys and values of the current episodes for act_cached(), see init_cache()
+        self.kv_cache = None
         
         # Actor (Mu)
         self.action_mu = nn.Sequential(
@@ -40,6 +130,50 @@ class ActorCriticCausalAttention(nn.Module):
             nn.Linear(nhead, 1)
         )
 
+    def _packed_qkv(self, x, branches):
+        """
+        Q, K and V projections of several attention branches in one matmul.
+        The MultiheadAttention modules only hold the weights, so checkpoints
+        keep their layout.
+
+        Returns:
+        - q, k, v of shape [*x.shape[:-1], len(branches) * nhead, head_dim],
+          the heads of the branches side by side.
+        """
+        modules = [getattr(self, branch)[0] for branch in branches]
+        if len(modules) == 1:
+            weight, bias = modules[0].in_proj_weight, modules[0].in_proj_bias
+        else:
+            weight = torch.cat([m.in_proj_weight for m in modules])
+            bias = torch.cat([m.in_proj_bias for m in modules])
+        qkv = F.linear(x, weight, bias).unflatten(-1, (len(branches), 3, self.nhead, -1))
+        q, k, v = qkv.unbind(-3)
+        return q.flatten(-3, -2), k.flatten(-3, -2), v.flatten(-3, -2)
+
+    def _attention(self, state, branches, last_only=False):
+        """
+        Causal self-attention of several branches over [batch, length, state_dim]
+        states in one scaled_dot_product_attention call, without a materialized mask.
+
+        Parameters:
+        - last_only (bool): Only compute the output of the last position, which
+          attends to the whole sequence.
+
+        Returns:
+        - list with the out_proj output of each branch, [batch, length, state_dim]
+          or [batch, 1, state_dim] with last_only.
+        """
+        q, k, v = (t.transpose(1, 2) for t in self._packed_qkv(state, branches))
+        if last_only:
+            attn_output = F.scaled_dot_product_attention(q[:, :, -1:], k, v)
+        else:
+            attn_output = F.scaled_dot_product_attention(q, k, v, is_causal=True)
+        attn_output = attn_output.transpose(1, 2).unflatten(2, (len(branches), -1)).flatten(-2)
+        return [
+            getattr(self, branch)[0].out_proj(attn_output[:, :, i])
+            for i, branch in enumerate(branches)
+        ]
+
     def forward(self, state): 
         # Validate state inputs at the very beginning of the method
         if self.debug:
@@ -52,14 +186,12 @@ class ActorCriticCausalAttention(nn.Module):
             state = state.unsqueeze(0).unsqueeze(0)
         if len(state.shape) == 2:
             state = state.unsqueeze(0)
-        # Create causal mask
-        length = state.size(1)
-        mask = torch.triu(torch.ones(length, length), diagonal=1).bool().to(state.device)
-        
         state = self.positional_encoding(state)
+        attn_output_mu, attn_output_std = self._attention(
+            state, ("action_mu", "action_log_std")
+        )
         # Actor (Mu)
-        attn_output_mu, _ = self.action_mu[0](state, state, state, attn_mask=mask)
-        mu = self.action_mu[1:](attn_output_mu)
+        mu = self.action_mu[1:](attn_output_mu).float()
 
         # Validate outputs from the attention mechanism
         if self.debug:
@@ -68,15 +200,13 @@ class ActorCriticCausalAttention(nn.Module):
                 breakpoint()
 
         # Actor (Log Std)
-        attn_output_std, _ = self.action_log_std[0](state, state, state, attn_mask=mask)
-
         # Validate outputs from the attention mechanism
         if self.debug:
             if torch.any(torch.isnan(attn_output_std)):
                 print("NaN detected in attn_output_std during forward pass.")
                 breakpoint()
 
-        log_std = self.action_log_std[1:](attn_output_std)
+        log_std = self.action_log_std[1:](attn_output_std).float()
 
         if self.debug:
             # Check for NaN values immediately after computation
@@ -106,14 +236,12 @@ class ActorCriticCausalAttention(nn.Module):
             if torch.isnan(state).any():
                 print("NaN detected in the state input of the 'act' method.")
                 breakpoint()
-        # Create causal mask for attention
-        length = state.size(1)
-        mask = torch.triu(torch.ones(length, length), diagonal=1).bool().to(state.device)
-
         state = self.positional_encoding(state)
+        attn_output_mu, attn_output_std = self._attention(
+            state, ("action_mu", "action_log_std"), last_only=True
+        )
         # Actor (Mu)
-        attn_output_mu, _ = self.action_mu[0](state, state, state, attn_mask=mask)
-        mu = self.action_mu[1:](attn_output_mu)
+        mu = self.action_mu[1:](attn_output_mu).float()
         mu = mu[:, -1, :]  # Take the last sequence element
 
         # Validate 'mu' after its computation
@@ -123,8 +251,7 @@ class ActorCriticCausalAttention(nn.Module):
                 breakpoint()
         
         # Actor (Log Std)
-        attn_output_std, _ = self.action_log_std[0](state, state, state, attn_mask=mask)
-        log_std = self.action_log_std[1:](attn_output_std)
+        log_std = self.action_log_std[1:](attn_output_std).float()
         log_std = log_std[:, -1, :]  # Take the last sequence element
 
         # Validate 'log_std' after its computation
@@ -133,6 +260,9 @@ class ActorCriticCausalAttention(nn.Module):
                 print("NaN detected in 'log_std' tensor during act method.")
                 breakpoint()
 
+        return self._sample(mu, log_std, action, compute_logprobs)
+
+    def _sample(self, mu, log_std, action=None, compute_logprobs=True):
         std = torch.clamp(log_std.exp(), min=self.epsilon, max=1e2)
         if action is None:
             dist = torch.distributions.Normal(mu, std)
@@ -169,6 +299,104 @@ class ActorCriticCausalAttention(nn.Module):
             return action, clean_logprobs
         return action
 
+    def init_cache(self, num_envs=1, capacity=64):
+        """Allocate an empty key/value cache for act_cached() over num_envs environments."""
+        state_dim = self.action_mu[0].embed_dim
+        param = self.action_mu[0].in_proj_weight
+        self.kv_cache = AttentionKVCache(
+            num_envs,
+            len(BRANCHES) * self.nhead,
+            state_dim // self.nhead,
+            capacity,
+            param.device,
+            param.dtype,
+        )
+        return self.kv_cache
+
+    def reset_cache(self, done=None):
+        """Start new episodes in the cache: all of them, or those where `done` is True."""
+        if self.kv_cache is not None:
+            self.kv_cache.reset(done)
+
+    def cached_step(self, state):
+        """
+        Run the attention branches for the newest state of every context in
+        the cache. Same outputs as act() and get_value() on the states of the
+        context, at O(L) instead of O(L^2) cost per step.
+
+        Parameters:
+        - state (tensor): [num_envs, state_dim] current states, or [state_dim].
+
+        Returns:
+        - mu, log_std ([num_envs, action_dim]) and value ([num_envs, 1])
+        """
+        if len(state.shape) == 1:
+            state = state.unsqueeze(0)
+        num_envs = state.size(0)
+        if self.kv_cache is None or self.kv_cache.num_envs != num_envs:
+            self.init_cache(num_envs)
+        cache = self.kv_cache
+        if self.context_length is not None:
+            cache.reset(cache.lengths >= self.context_length)
+        cache.reserve()
+
+        # Positional encoding of each env at its own episode step
+        x = self.positional_encoding(state.unsqueeze(1), offset=cache.lengths).squeeze(1)
+        attn_output = cache.attend(*self._packed_qkv(x, BRANCHES))
+        attn_output = attn_output.unflatten(1, (len(BRANCHES), -1)).flatten(-2)
+        cache.advance()
+        return tuple(
+            layers[1:](layers[0].out_proj(attn_output[:, i])).float()
+            for i, layers in enumerate(getattr(self, branch) for branch in BRANCHES)
+        )
+
+    def _branch_head(self, state, branch):
+        (attn_output,) = self._attention(state, (branch,))
+        return getattr(self, branch)[1:](attn_output).float()
+
+    def _window_heads(self, state, branches):
+        """Head outputs of the branches at every position of [num_windows, length, state_dim] windows."""
+        state = self.positional_encoding(state)
+        if self.checkpoint_attention and torch.is_grad_enabled():
+            return [
+                checkpoint(self._branch_head, state, branch, use_reentrant=False)
+                for branch in branches
+            ]
+        attn_outputs = self._attention(state, branches)
+        return [
+            getattr(self, branch)[1:](attn_output).float()
+            for branch, attn_output in zip(branches, attn_outputs)
+        ]
+
+    def evaluate_windows(self, state, action):
+        """
+        evaluate() for every position of [num_windows, length, state_dim]
+        context windows, each position attending to the window up to itself
+        as in act_cached(). Padding at the end of a window does not affect
+        the positions before it.
+
+        Returns:
+        - logprobs and state values, [num_windows, length]
+        """
+        mu, log_std, state_value = self._window_heads(state, BRANCHES)
+        _, logprobs = self._sample(mu, log_std, action)
+        return logprobs, state_value.squeeze(-1)
+
+    def get_value_windows(self, state):
+        """get_value() for every position of [num_windows, length, state_dim] context windows."""
+        (state_value,) = self._window_heads(state, ("value_layer",))
+        return state_value.squeeze(-1)
+
+    def act_cached(self, state, action=None, compute_logprobs=True):
+        """
+        act() for the newest state of every episode in the cache. Call
+        reset_cache(done) after each env step so that finished episodes
+        restart at position 0; contexts restart by themselves every
+        context_length steps.
+        """
+        mu, log_std, _ = self.cached_step(state)
+        return self._sample(mu, log_std, action, compute_logprobs)
+
     def rescale_action(self, action):
         """Rescale action from [-1, 1] to [action_low, action_high]"""
         # It introduces training instability because of tanh's gradient
@@ -220,14 +448,10 @@ class ActorCriticCausalAttention(nn.Module):
             state = state.unsqueeze(0).unsqueeze(0)
         if len(state.shape) == 2:
             state = state.unsqueeze(0)
-        # Create causal mask for attention
-        length = state.size(1)
-        mask = torch.triu(torch.ones(length, length), diagonal=1).bool().to(state.device)
-        
         state = self.positional_encoding(state)
         # Value Layer
-        attn_output_value, _ = self.value_layer[0](state, state, state, attn_mask=mask)
-        return self.value_layer[1:](attn_output_value)[:, -1, :]
+        (attn_output_value,) = self._attention(state, ("value_layer",), last_only=True)
+        return self.value_layer[1:](attn_output_value)[:, -1, :].float()
 
     def evaluate(self, state, action):
         # Ensure state has at least 3 dimensions
@@ -235,14 +459,12 @@ class ActorCriticCausalAttention(nn.Module):
             state = state.unsqueeze(0).unsqueeze(0)
         if len(state.shape) == 2:
             state = state.unsqueeze(0)
-        # Create causal mask for attention
-        length = state.size(1)
-        mask = torch.triu(torch.ones(length, length), diagonal=1).bool().to(state.device)
-
         state = self.positional_encoding(state)
+        attn_output_mu, attn_output_std, attn_output_value = self._attention(
+            state, BRANCHES, last_only=True
+        )
         # Actor (Mu)
-        attn_output_mu, _ = self.action_mu[0](state, state, state, attn_mask=mask)
-        mu = self.action_mu[1:](attn_output_mu)
+        mu = self.action_mu[1:](attn_output_mu).float()
         mu = mu[:, -1, :]  # Take the last sequence element
         if self.debug:
             # Check if 'mu' contains any NaN values and call the debug function if it does
@@ -252,8 +474,7 @@ class ActorCriticCausalAttention(nn.Module):
                 breakpoint()
 
         # Actor (Log Std)
-        attn_output_std, _ = self.action_log_std[0](state, state, state, attn_mask=mask)
-        log_std = self.action_log_std[1:](attn_output_std)
+        log_std = self.action_log_std[1:](attn_output_std).float()
         log_std = log_std[:, -1, :]  # Take the last sequence element
 
         std = log_std.exp()
@@ -283,8 +504,7 @@ class ActorCriticCausalAttention(nn.Module):
         )
 
         # Value Layer
-        attn_output_value, _ = self.value_layer[0](state, state, state, attn_mask=mask)
-        state_value = self.value_layer[1:](attn_output_value)[:,-1,:]
+        state_value = self.value_layer[1:](attn_output_value)[:,-1,:].float()
 
         return clean_logprobs, torch.squeeze(state_value)
 
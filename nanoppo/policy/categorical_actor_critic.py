@@ -0,0 +1,79 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+class CategoricalActorCritic(nn.Module):
+    """
+    Actor-critic with a categorical action head for discrete action spaces.
+
+    It has the same interface as ActorCritic: forward() returns the action
+    distribution, act() samples actions with their log-probabilities,
+    evaluate() returns log-probabilities and state values and get_value()
+    the state values. Log-probabilities come from one log_softmax over the
+    logits, which act() and evaluate() index with the actions.
+
+    Parameters:
+    - state_dim (int): Observation size.
+    - action_dim (int): Number of actions.
+    - n_latent_var (int): Hidden layer size.
+    """
+
+    def __init__(self, state_dim, action_dim, n_latent_var, debug=False):
+        super(CategoricalActorCritic, self).__init__()
+        self.action_dim = action_dim
+        self.debug = debug
+
+        # Actor: outputs unnormalized log-probabilities
+        self.action_logits = nn.Sequential(
+            nn.Linear(state_dim, n_latent_var),
+            nn.Tanh(),
+            nn.Linear(n_latent_var, n_latent_var),
+            nn.Tanh(),
+            nn.Linear(n_latent_var, action_dim),
+        )
+
+        # Critic
+        self.value_layer = nn.Sequential(
+            nn.Linear(state_dim, n_latent_var),
+            nn.Tanh(),
+            nn.Linear(n_latent_var, n_latent_var),
+            nn.Tanh(),
+            nn.Linear(n_latent_var, 1),
+        )
+
+    def forward(self, state):
+        # float() keeps the distribution in float32 under bfloat16 autocast
+        return torch.distributions.Categorical(logits=self.action_logits(state).float())
+
+    def log_probs(self, state):
+        """Log-probabilities of all actions, [..., action_dim]."""
+        return F.log_softmax(self.action_logits(state).float(), dim=-1)
+
+    @staticmethod
+    def _gather(log_probs, action):
+        return log_probs.gather(-1, action.long().unsqueeze(-1)).squeeze(-1)
+
+    def act(self, state, action=None, compute_logprobs=True):
+        log_probs = self.log_probs(state)
+        if action is None:
+            flat = log_probs.exp().reshape(-1, self.action_dim)
+            action = torch.multinomial(flat, 1).reshape(log_probs.shape[:-1])
+        if compute_logprobs:
+            return action, self._gather(log_probs, action)
+        return action
+
+    def evaluate(self, state, action):
+        logprobs = self._gather(self.log_probs(state), action)
+        state_value = self.value_layer(state).float()
+        return logprobs, torch.squeeze(state_value)
+
+    def get_value(self, state):
+        return self.value_layer(state)
+
+    def check_for_nan_gradients(self):
+        if self.debug:
+            for name, param in self.named_parameters():
+                if param.grad is not None and torch.isnan(param.grad).any():
+                    print(f"NaN detected in the gradients. Parameter: {name}")
+                    breakpoint()
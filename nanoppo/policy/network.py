@@ -45,8 +45,8 @@ class PolicyNetwork(nn.Module):
         self.apply(lambda m: init_weights(m, init_type=init_type))
 
     def forward(self, x):
-        mean = self.action_mu(x)
-        log_std = self.action_log_std(x)
+        mean = self.action_mu(x).float()
+        log_std = self.action_log_std(x).float()
         
         # Compute std using the exponential of log_std
         std = torch.exp(log_std)
@@ -67,4 +67,4 @@ class ValueNetwork(nn.Module):
         x = F.relu(self.fc1(x))
         x = F.relu(self.fc2(x))
         x = self.fc3(x)
-        return x
+        return x.float()
@@ -2,10 +2,11 @@ import torch
 from torch import optim
 import torch.nn as nn
 from torch.nn import functional as F
+from torch.distributions import Categorical
 from time import time
+from contextlib import nullcontext
 from torch.optim.lr_scheduler import ExponentialLR, CosineAnnealingLR
 import numpy as np
-from tqdm import tqdm
 import gym
 import os
 from nanoppo.environment_manager import EnvironmentManager
@@ -14,12 +15,16 @@ from nanoppo.checkpoint_manager import CheckpointManager
 from nanoppo.wandb_logger import WandBLogger
 from nanoppo.policy.network import PolicyNetwork, ValueNetwork
 from nanoppo.rollout_buffer import RolloutBuffer
-from nanoppo.reward_scaler import RewardScaler
+from nanoppo.reward_scaler import RewardScaler, ReturnScaler
 from nanoppo.reward_shaper import RewardShaper, TDRewardShaper
 from nanoppo.normalizer import Normalizer
 from nanoppo.state_scaler import StateScaler
 from nanoppo.metrics_recorder import MetricsRecorder
+from nanoppo.phase_timer import PhaseTimer, TrainingProfiler
+from nanoppo.resource_config import ResourceConfig
 from nanoppo.ppo_utils import (
+    approx_kl,
+    autocast,
     compute_gae,
     compute_returns_and_advantages_without_gae,
     get_grad_norm,
@@ -35,7 +40,15 @@ warnings.filterwarnings(
 
 
 class PPOAgent:
-    def __init__(self, config, optimizer_config, force_cpu=False):
+    def __init__(
+        self, config, optimizer_config, force_cpu=False, env=None, state_scaler=None
+    ):
+        """
+        Parameters:
+        - env (gym.Env): Optional environment to reuse instead of creating one.
+        - state_scaler (StateScaler): Optional fitted scaler to reuse for the
+          "env", "standard", "minmax", "robust" and "quantile" scale types.
+        """
         self.config = config
         self.optimizer_config = optimizer_config
         if force_cpu:
@@ -45,7 +58,7 @@ class PPOAgent:
         self.project = config["project"]
         self.env_name = config["env_name"]
         self.env_manager = EnvironmentManager(self.env_name, config["env_config"])
-        self.env = self.env_manager.setup_env()
+        self.env = env if env is not None else self.env_manager.setup_env()
 
         self.network_manager = NetworkManager(
             self.env,
@@ -64,7 +77,10 @@ class PPOAgent:
         ) = self.network_manager.setup_networks()
 
         self.rollout_buffer = RolloutBuffer(self.config["batch_size"])
-        if self.config["rescaling_rewards"]:
+        # True standardizes rewards, "return" scales them by the return std
+        if self.config["rescaling_rewards"] == "return":
+            self.reward_scaler = ReturnScaler(gamma=self.config["gamma"])
+        elif self.config["rescaling_rewards"]:
             self.reward_scaler = RewardScaler()
         else:
             self.reward_scaler = None
@@ -80,9 +96,12 @@ class PPOAgent:
             "robust",
             "quantile",
         ]:
-            self.state_scaler = StateScaler(
-                self.env, sample_size=10000, scale_type=self.config["scale_states"]
-            )
+            if state_scaler is not None:
+                self.state_scaler = state_scaler
+            else:
+                self.state_scaler = StateScaler(
+                    self.env, sample_size=10000, scale_type=self.config["scale_states"]
+                )
         else:
             raise ValueError(f"Unknown scale type: {self.config['scale_states']}")
 
@@ -111,10 +130,17 @@ class PPOAgent:
             self.config["checkpoint_dir"], self.project, self.env_name
         )
         self.log_interval = self.config["log_interval"]
+        # Optional dict with act_threads, learn_threads, env_threads, cores, env_cores
+        if self.config.get("resources"):
+            self.resource_config = ResourceConfig.from_config(self.config["resources"])
+        else:
+            self.resource_config = None
 
     @staticmethod
     def get_epoch_iterator(last_epoch, epochs, verbose: int):
         if verbose > 0:
+            from tqdm import tqdm
+
             progress_iterator = tqdm(range(last_epoch, last_epoch + epochs))
         else:
             progress_iterator = range(last_epoch, last_epoch + epochs)
@@ -132,17 +158,38 @@ class PPOAgent:
         )
         return last_epoch
 
+    @staticmethod
+    def log_prob(dist, actions):
+        """Log-probability of actions under a Categorical or a per-dimension continuous distribution."""
+        if isinstance(dist, Categorical):
+            return dist.log_prob(actions.long())
+        # If action space is continuous, sum(-1) to sum over all dimensions
+        return dist.log_prob(actions).sum(-1)
+
+    @staticmethod
+    def get_policy_grad_norms(policy):
+        """Gradient norm of each actor head, e.g. {"mu": ..., "log_std": ...} or {"logits": ...}."""
+        return {
+            name[len("action_") :]: get_grad_norm(module.parameters())
+            for name, module in policy.named_children()
+            if name.startswith("action_")
+        }
+
     @staticmethod
     def select_action(policy: PolicyNetwork, state, device, action_min, action_max):
         state = torch.FloatTensor(state).to(device)
         dist = policy(state)
         action = dist.sample()
-        # If action space is continuous, compute the log_prob of the action, sum(-1) to sum over all dimensions
-        log_prob = dist.log_prob(action).sum(-1)
+        log_prob = PPOAgent.log_prob(dist, action)
 
         # Extract mean and std of the action distribution
-        action_mean = dist.mean
-        action_std = dist.stddev
+        if isinstance(dist, Categorical):
+            # Action probabilities and the std of their one-hot indicators
+            action_mean = dist.probs
+            action_std = torch.sqrt(dist.probs * (1 - dist.probs))
+        else:
+            action_mean = dist.mean
+            action_std = dist.stddev
 
         # action = torch.tanh(action)  # Pass the sampled action through the tanh activation function
         # action = action + torch.normal(mean=torch.zeros_like(action), std=action_std)  # Add noise to the action
@@ -160,8 +207,9 @@ class PPOAgent:
     def surrogate(policy, old_probs, states, actions, advs, clip_param, entropy_coef):
         # Policy loss
         dist = policy(states)
-        new_probs = dist.log_prob(actions).sum(-1)
-        ratio = torch.exp(new_probs - old_probs)  # Importance sampling ratio
+        new_probs = PPOAgent.log_prob(dist, actions)
+        log_ratio = new_probs - old_probs
+        ratio = torch.exp(log_ratio)  # Importance sampling ratio
         surr1 = ratio * advs
         surr2 = (
             torch.clamp(ratio, 1 - clip_param, 1 + clip_param) * advs
@@ -175,6 +223,7 @@ class PPOAgent:
         return (
             -torch.min(surr1, surr2).mean(),
             approximate_entropy_loss,
+            approx_kl(log_ratio.detach(), ratio.detach()),
         )  # Add the entropy term to the policy loss
 
     @staticmethod
@@ -207,131 +256,164 @@ class PPOAgent:
         tau,
         wandb_log,
         metrics_recorder: MetricsRecorder,
+        phase_timer: PhaseTimer = None,
+        bf16: bool = False,
+        target_kl: float = None,
+        values=None,
     ):
-        (
-            batch_states,
-            batch_actions,
-            batch_log_probs,
-            batch_rewards,
-            batch_next_states,
-            batch_dones,
-        ) = rollout_buffer.sample(batch_size, device=device, randomize=False)
-
-        # Compute returns once from rollout buffer in order
-        if use_gae:
-            # Compute Advantage using GAE and Returns
-            values = (
-                value(batch_states).detach().squeeze().tolist()
-            )  # For values + [next_value]
-            next_value = value(batch_next_states[-1]).item()
-            masks = [1 - done.item() for done in batch_dones]
-            # Only compute returns once
-            returns = compute_gae(next_value, batch_rewards, masks, values, gamma, tau)
-        else:
-            returns, advs = compute_returns_and_advantages_without_gae(
-                batch_rewards,
+        """
+        Parameters:
+        - target_kl (float): Stop the sgd_iters loop before a step once the
+          approximate KL to the rollout policy exceeds 1.5 * target_kl.
+        - values (tuple): [batch_size] values and next values of the buffered
+          states, e.g. from TD reward shaping, reused by GAE instead of
+          running the value network again.
+        """
+        if phase_timer is None:
+            phase_timer = PhaseTimer()
+        with phase_timer.phase("gae"):
+            (
                 batch_states,
+                batch_actions,
+                batch_log_probs,
+                batch_rewards,
                 batch_next_states,
                 batch_dones,
-                value,
-                gamma,
-            )
+            ) = rollout_buffer.sample(batch_size, device=device, randomize=False)
 
-        returns = torch.tensor(returns, dtype=torch.float32).to(device)
-        for sgd_iter in range(sgd_iters):
-            # Compute advantages separately for each SGD iteration
-            state_values = value(batch_states).squeeze()
-            advantages = returns - state_values.detach()
-            # Normalize the advantages (optional, but can help in training stability)
-            advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-5)
+            # Compute returns once from rollout buffer in order
+            if use_gae:
+                # Compute Advantage using GAE and Returns
+                if values is not None:
+                    values, next_value = list(values[0]), float(values[1][-1])
+                else:
+                    values = (
+                        value(batch_states).detach().squeeze().tolist()
+                    )  # For values + [next_value]
+                    next_value = value(batch_next_states[-1]).item()
+                masks = [1 - done.item() for done in batch_dones]
+                # Only compute returns once
+                returns = compute_gae(next_value, batch_rewards, masks, values, gamma, tau)
+            else:
+                returns, advs = compute_returns_and_advantages_without_gae(
+                    batch_rewards,
+                    batch_states,
+                    batch_next_states,
+                    batch_dones,
+                    value,
+                    gamma,
+                )
 
-            policy_loss, entropy_loss = PPOAgent.surrogate(
-                policy,
-                old_probs=batch_log_probs,
-                states=batch_states,
-                actions=batch_actions,
-                advs=advantages,
-                clip_param=clip_param,
-                entropy_coef=entropy_coef,
-            )
+            returns = torch.tensor(returns, dtype=torch.float32).to(device)
+
+        with phase_timer.phase("sgd"):
+            epochs = 0
+            kl = 0.0
+            for sgd_iter in range(sgd_iters):
+                # Compute advantages separately for each SGD iteration
+                with autocast(device, enabled=bf16):
+                    state_values = value(batch_states).float().squeeze()
+                advantages = returns - state_values.detach()
+                # Normalize the advantages (optional, but can help in training stability)
+                advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-5)
+
+                with autocast(device, enabled=bf16):
+                    policy_loss, entropy_loss, kl = PPOAgent.surrogate(
+                        policy,
+                        old_probs=batch_log_probs,
+                        states=batch_states,
+                        actions=batch_actions,
+                        advs=advantages,
+                        clip_param=clip_param,
+                        entropy_coef=entropy_coef,
+                    )
 
-            value_loss = PPOAgent.compute_value_loss(state_values, returns)
+                kl = kl.item()
+                if target_kl is not None and kl > 1.5 * target_kl:
+                    break
+                epochs += 1
 
-            # Compute total loss and update parameters
-            total_loss = policy_loss + entropy_loss + vf_coef * value_loss
+                value_loss = PPOAgent.compute_value_loss(state_values, returns)
 
-            optimizer.zero_grad()
-            total_loss.backward()
-            optimizer.step()
-            # if scheduler is not None:
-            #    scheduler.step()
+                # Compute total loss and update parameters
+                total_loss = policy_loss + entropy_loss + vf_coef * value_loss
 
-            """
-            # Clip the gradients to avoid exploding gradients
-            policy_grad_norm = nn.utils.clip_grad_norm_(
-                policy.parameters(), max_grad_norm
-            )
-            value_grad_norm = nn.utils.clip_grad_norm_(
-                value.parameters(), max_grad_norm
-            )
-            """
-            action_mu_grad_norm = get_grad_norm(policy.action_mu.parameters())
-            action_log_std_grad_norm = get_grad_norm(policy.action_log_std.parameters())
-            value_grad_norm = get_grad_norm(value.parameters())
-
-            # compute activation norm
-            # remove the forward hooks
-            """
-            for hook in hooks:
-                hook.remove()
-            # compute the mean activation norm for the value network
-            activation_norm = sum(activation_norms) / len(activation_norms)
-            """
-
-            if wandb_log:
-                # Log the losses and gradients to WandB
-                WandBLogger.log(
-                    {
-                        "iteration": iter_num,
-                        "Loss/Total": total_loss.item(),
-                        "Loss/Policy": policy_loss.item(),
-                        "Loss/Entropy": entropy_loss.item(),
-                        "Loss/Value": value_loss.item(),
-                        "Loss/Coef_Value": vf_coef * value_loss.item(),
-                    }
-                )
-                # wandb.log({"Gradients/PolicyNet": wandb.Histogram(policy.fc1.weight.grad.detach().cpu().numpy())})
-                WandBLogger.log(
-                    {
-                        "Policy/Mu_Gradient_Norm": action_mu_grad_norm,
-                        "Policy/Log_Std_Gradient_Norm": action_log_std_grad_norm,
-                        "Value/Gradient_Norm": value_grad_norm,
-                        # "Value/Activation_Norm": activation_norm
-                    }
+                optimizer.zero_grad()
+                total_loss.backward()
+                optimizer.step()
+                # if scheduler is not None:
+                #    scheduler.step()
+
+                """
+                # Clip the gradients to avoid exploding gradients
+                policy_grad_norm = nn.utils.clip_grad_norm_(
+                    policy.parameters(), max_grad_norm
                 )
-                # wandb.log({"Gradients/ValueNet": wandb.Histogram(value.fc1.weight.grad.detach().cpu().numpy())})
-                log_std_value = (
-                    policy.action_log_std(batch_states).detach().cpu().numpy()
+                value_grad_norm = nn.utils.clip_grad_norm_(
+                    value.parameters(), max_grad_norm
                 )
-                WandBLogger.log({"Policy/Log_Std": log_std_value})
-            # log the learning rate to wandb
-            lrs = {}
-            for i, param_group in enumerate(optimizer.param_groups):
-                lr = param_group["lr"]
-                lrs["learning_rate_{}".format(i)] = lr
+                """
+                policy_grad_norms = PPOAgent.get_policy_grad_norms(policy)
+                value_grad_norm = get_grad_norm(value.parameters())
+
+                # compute activation norm
+                # remove the forward hooks
+                """
+                for hook in hooks:
+                    hook.remove()
+                # compute the mean activation norm for the value network
+                activation_norm = sum(activation_norms) / len(activation_norms)
+                """
+
                 if wandb_log:
-                    WandBLogger.log({"LR/LearningRate_{}".format(i): lr})
-
-            if metrics_recorder:
-                metrics_recorder.record_losses(
-                    total_loss.item(),
-                    policy_loss.item(),
-                    entropy_loss.item(),
-                    value_loss.item(),
-                )
-                metrics_recorder.record_learning(lrs)
+                    # Log the losses and gradients to WandB
+                    WandBLogger.log(
+                        {
+                            "iteration": iter_num,
+                            "Loss/Total": total_loss.item(),
+                            "Loss/Policy": policy_loss.item(),
+                            "Loss/Entropy": entropy_loss.item(),
+                            "Loss/Value": value_loss.item(),
+                            "Loss/Coef_Value": vf_coef * value_loss.item(),
+                        }
+                    )
+                    # wandb.log({"Gradients/PolicyNet": wandb.Histogram(policy.fc1.weight.grad.detach().cpu().numpy())})
+                    grad_norms = {
+                        f"Policy/{name.title()}_Gradient_Norm": norm
+                        for name, norm in policy_grad_norms.items()
+                    }
+                    grad_norms["Value/Gradient_Norm"] = value_grad_norm
+                    # grad_norms["Value/Activation_Norm"] = activation_norm
+                    WandBLogger.log(grad_norms)
+                    # wandb.log({"Gradients/ValueNet": wandb.Histogram(value.fc1.weight.grad.detach().cpu().numpy())})
+                    if hasattr(policy, "action_log_std"):
+                        log_std_value = (
+                            policy.action_log_std(batch_states).detach().cpu().numpy()
+                        )
+                        WandBLogger.log({"Policy/Log_Std": log_std_value})
+                # log the learning rate to wandb
+                lrs = {}
+                for i, param_group in enumerate(optimizer.param_groups):
+                    lr = param_group["lr"]
+                    lrs["learning_rate_{}".format(i)] = lr
+                    if wandb_log:
+                        WandBLogger.log({"LR/LearningRate_{}".format(i): lr})
 
-            iter_num += 1
+                if metrics_recorder:
+                    metrics_recorder.record_losses(
+                        total_loss.item(),
+                        policy_loss.item(),
+                        entropy_loss.item(),
+                        value_loss.item(),
+                    )
+                    metrics_recorder.record_learning(lrs)
+
+                iter_num += 1
+
+        if wandb_log:
+            WandBLogger.log({"Update/Epochs": epochs, "Update/Approx_KL": kl})
+        if metrics_recorder:
+            metrics_recorder.record_update(epochs, kl)
 
         rollout_buffer.clear()  # clear the rollout buffer, all data is from the current policy
         assert len(rollout_buffer) == 0
@@ -343,6 +425,39 @@ class PPOAgent:
             iter_num,
         )
 
+    @staticmethod
+    def shape_rewards(
+        reward_shaper: RewardShaper, rollout_buffer: RolloutBuffer, values=None
+    ):
+        """
+        Reshape the rewards of the whole rollout buffer with one reshape() call.
+        Shapers see the raw observations pushed with the transitions, or the
+        buffered network inputs if they set scaled_observations.
+
+        Parameters:
+        - values (tuple): [len] values and next values of the buffered states
+          for TDRewardShaper, which computes them if None.
+        """
+        if reward_shaper.scaled_observations:
+            observations, next_observations = rollout_buffer.get_states()
+        else:
+            observations, next_observations = rollout_buffer.get_observations()
+        extra = () if values is None else values
+        rewards = reward_shaper.reshape(
+            rollout_buffer.get_rewards(), observations, next_observations, *extra
+        )
+        rollout_buffer.set_rewards(rewards)
+        return rewards
+
+    @staticmethod
+    def scale_rewards(reward_scaler: RewardScaler, rollout_buffer: RolloutBuffer):
+        """Scale the rewards of the whole rollout buffer, in step order."""
+        rewards = reward_scaler.scale_rewards(
+            rollout_buffer.get_rewards(), rollout_buffer.get_episode_ends()
+        )
+        rollout_buffer.set_rewards(rewards)
+        return rewards
+
     @staticmethod
     def train_with_epoch(
         project: str,
@@ -381,6 +496,11 @@ class PPOAgent:
         device: str = "cpu",
         wandb_log: bool = True,
         metrics_recorder: MetricsRecorder = None,
+        phase_timer: PhaseTimer = None,
+        profile_iterations: int = 0,
+        bf16: bool = False,
+        resource_config: ResourceConfig = None,
+        target_kl: float = None,
     ):
         checkpoint_path = os.path.join(checkpoint_dir, project, env_name)
         if resume_training:
@@ -396,6 +516,7 @@ class PPOAgent:
                 policy,
                 value,
                 optimizer,
+                normalizer,
                 checkpoint_path,
                 None if resume_epoch <= 0 else resume_epoch - 1,
             )
@@ -409,6 +530,9 @@ class PPOAgent:
             reward_shaper = TDRewardShaper(model=value, device=device)
         else:
             reward_shaper = shape_reward()
+        raw_observations = (
+            reward_shaper is not None and not reward_shaper.scaled_observations
+        )
 
         # Set up training loop
         total_iters = epochs * sgd_iters
@@ -419,158 +543,212 @@ class PPOAgent:
         average_reward = -np.inf
         best_reward = -np.inf
         start = time()
-        for epoch in PPOAgent.get_epoch_iterator(last_epoch, epochs, verbose):
-            state, info = env.reset()
-            if isinstance(state, dict):
-                state = state["obs"]
-            if normalizer:
-                normalizer.observe(state)
-                scaled_state = normalizer.normalize(state)
-            elif state_scaler:
-                scaled_state = state_scaler.scale_state(state)
-            else:
-                raise ValueError("No state scaler or normalizer is provided")
-            done = False
-            total_reward = 0
-
-            for step in range(max_timesteps):
-                action, log_prob, action_mean, action_std = PPOAgent.select_action(
-                    policy,
-                    scaled_state,
-                    device,
-                    env.action_space.low[0],
-                    env.action_space.high[0],
-                )
-                if wandb_log:
-                    WandBLogger.log_action_distribution_parameters(
-                        action_mean, action_std
-                    )
-
-                next_state, reward, done, truncated, info = env.step(action)
-
-                if isinstance(next_state, dict):
-                    next_state = next_state["obs"]
-                if normalizer:
-                    normalizer.observe(next_state)
-                    scaled_next_state = normalizer.normalize(next_state)
-                elif state_scaler:
-                    scaled_next_state = state_scaler.scale_state(next_state)
-                else:
-                    raise ValueError("No state scaler or normalizer is provided")
 
-                scaled_state = scaled_next_state
-                total_reward += reward
-                # Reshape rewards
-                if reward_shaper is None:
-                    reshaped_reward = reward
-                else:
-                    raise NotImplementedError
-                    reshaped_reward = reward_shaper.reshape(
-                        [reward], [state], [next_state]
-                    )[0]
-                # Scale rewards
-                if reward_scaler is None:
-                    scaled_reward = reshaped_reward
-                    # click.secho("Warning: Reward scaling is not applied.", fg="yellow", err=True)
-                else:
-                    raise NotImplementedError
-                    scaled_reward = reward_scaler.scale_rewards([reshaped_reward])[0]
-                rollout_buffer.push(
-                    state=scaled_state,
-                    action=action.squeeze(),
-                    log_prob=log_prob,
-                    reward=scaled_reward,
-                    next_state=scaled_next_state,
-                    done=done,
-                )
-                time_steps += 1
-                if time_steps % batch_size == 0:
-                    _, _, train_iters = PPOAgent.minibatch_update(
-                        train_iters,
-                        policy,
-                        value,
-                        policy_old,
-                        value_old,
-                        optimizer,
-                        scheduler,
-                        rollout_buffer,
-                        device,
-                        batch_size,
-                        sgd_iters,
-                        gamma,
-                        clip_param,
-                        vf_coef,
-                        entropy_coef,
-                        max_grad_norm=max_grad_norm,
-                        use_gae=use_gae,
-                        tau=tau,
-                        wandb_log=wandb_log,
-                        metrics_recorder=metrics_recorder,
-                    )
-
-                if done or truncated:
-                    break
-
-            episode_steps.append(step + 1)
-            episode_rewards.append(total_reward)
-
-            # Average of last 10 episodes or all episodes if less than 10 episodes are available
-            if len(episode_rewards) >= 20 and (epoch + 1) % log_interval == 0:
-                average_reward = sum(episode_rewards[-20:]) / len(episode_rewards[-20:])
-                if wandb_log:
-                    WandBLogger.log_rewards(episode_rewards[-20:])
-                if metrics_recorder:
-                    metrics_recorder.record_rewards(episode_rewards[-20:])
-                if report_func:
-                    report_func(mean_reward=average_reward)  # Reporting the reward
-
-            if verbose > 0 and (epoch + 1) % log_interval == 0:
-                print(
-                    "env",
-                    env_name,
-                    "epoch",
-                    epoch + 1,
-                    "reward episodes",
-                    len(episode_rewards),
-                    "everage steps",
-                    np.mean(episode_steps),
-                    "average reward",
-                    round(average_reward, 2),
-                    "train epochs",
-                    epoch - last_epoch + 1,
-                    "train iters",
-                    train_iters,
-                    "rollout episodes",
-                    len(episode_rewards),
-                    "rollout time steps",
-                    time_steps,
-                )
-
-                action_mu_grad_norm = get_grad_norm(policy.action_mu.parameters())
-                action_log_std_grad_norm = get_grad_norm(
-                    policy.action_log_std.parameters()
-                )
-                value_grad_norm = get_grad_norm(value.parameters())
-                print(
-                    "action_mu_grad_norm",
-                    round(action_mu_grad_norm, 2),
-                    "action_log_std_grad_norm",
-                    round(action_log_std_grad_norm, 2),
-                    "value_grad_norm",
-                    round(value_grad_norm, 2),
-                )
-
-            if checkpoint_interval > 0:
-                if average_reward > best_reward:
-                    print("Saving checkpoint...", checkpoint_path)
-                    print("avg_reward", average_reward, "> best_reward", best_reward)
-                    best_reward = average_reward
-                    CheckpointManager.save_checkpoint(
-                        policy, value, optimizer, normalizer, epoch, checkpoint_path
+        # Time per phase, reported with the periodic log line
+        if phase_timer is None:
+            phase_timer = PhaseTimer()
+        act_phase = phase_timer.phase("act")
+        env_phase = phase_timer.phase("env")
+        rewards_phase = phase_timer.phase("rewards")
+        logging_phase = phase_timer.phase("logging")
+        checkpoint_phase = phase_timer.phase("checkpoint")
+        profiler = TrainingProfiler(
+            profile_iterations, os.path.join(checkpoint_path, "trace.json"), phase_timer
+        )
+        if profile_iterations > 0:
+            os.makedirs(checkpoint_path, exist_ok=True)
+        if resource_config is not None:
+            resource_config.apply()
+            acting, learning = resource_config.acting(), resource_config.learning()
+            stepping = resource_config.stepping()
+        else:
+            acting = learning = stepping = nullcontext()
+        try:
+            profiler.start()
+            if isinstance(env.action_space, gym.spaces.Box):
+                action_min, action_max = env.action_space.low[0], env.action_space.high[0]
+            else:
+                action_min = action_max = None
+            last_log = (phase_timer.elapsed(), 0, 0)
+            for epoch in PPOAgent.get_epoch_iterator(last_epoch, epochs, verbose):
+                with env_phase, stepping:
+                    state, info = env.reset()
+                    if isinstance(state, dict):
+                        state = state["obs"]
+                    if normalizer:
+                        normalizer.observe(state)
+                        scaled_state = normalizer.normalize(state)
+                    elif state_scaler:
+                        scaled_state = state_scaler.scale_state(state)
+                    else:
+                        raise ValueError("No state scaler or normalizer is provided")
+                done = False
+                total_reward = 0
+
+                for step in range(max_timesteps):
+                    with act_phase, acting:
+                        action, log_prob, action_mean, action_std = PPOAgent.select_action(
+                            policy,
+                            scaled_state,
+                            device,
+                            action_min,
+                            action_max,
+                        )
+                    if wandb_log:
+                        with logging_phase:
+                            WandBLogger.log_action_distribution_parameters(
+                                action_mean, action_std
+                            )
+
+                    with env_phase, stepping:
+                        next_state, reward, done, truncated, info = env.step(action)
+
+                        if isinstance(next_state, dict):
+                            next_state = next_state["obs"]
+                        if normalizer:
+                            normalizer.observe(next_state)
+                            scaled_next_state = normalizer.normalize(next_state)
+                        elif state_scaler:
+                            scaled_next_state = state_scaler.scale_state(next_state)
+                        else:
+                            raise ValueError("No state scaler or normalizer is provided")
+
+                    total_reward += reward
+                    # Rewards are reshaped and scaled per batch, before the update
+                    rollout_buffer.push(
+                        state=scaled_state,
+                        action=action.squeeze(),
+                        log_prob=log_prob,
+                        reward=reward,
+                        next_state=scaled_next_state,
+                        done=done,
+                        # Raw observations for shapers that read them
+                        observation=state if raw_observations else None,
+                        next_observation=next_state,
+                        episode_end=done or truncated or step == max_timesteps - 1,
                     )
-
+                    state, scaled_state = next_state, scaled_next_state
+                    time_steps += 1
+                    if time_steps % batch_size == 0:
+                        gae_values = None
+                        with rewards_phase:
+                            if use_gae and isinstance(reward_shaper, TDRewardShaper):
+                                # One critic forward for TD shaping and GAE
+                                gae_values = reward_shaper.values(
+                                    *rollout_buffer.get_states()
+                                )
+                            if reward_shaper is not None:
+                                PPOAgent.shape_rewards(
+                                    reward_shaper, rollout_buffer, gae_values
+                                )
+                            if reward_scaler is not None:
+                                PPOAgent.scale_rewards(reward_scaler, rollout_buffer)
+                        with learning:
+                            _, _, train_iters = PPOAgent.minibatch_update(
+                                train_iters,
+                                policy,
+                                value,
+                                policy_old,
+                                value_old,
+                                optimizer,
+                                scheduler,
+                                rollout_buffer,
+                                device,
+                                batch_size,
+                                sgd_iters,
+                                gamma,
+                                clip_param,
+                                vf_coef,
+                                entropy_coef,
+                                max_grad_norm=max_grad_norm,
+                                use_gae=use_gae,
+                                tau=tau,
+                                wandb_log=wandb_log,
+                                metrics_recorder=metrics_recorder,
+                                phase_timer=phase_timer,
+                                bf16=bf16,
+                                target_kl=target_kl,
+                                values=gae_values,
+                            )
+
+                    if done or truncated:
+                        break
+                profiler.step()
+
+                episode_steps.append(step + 1)
+                episode_rewards.append(total_reward)
+
+                with logging_phase:
+                    # Average of last 10 episodes or all episodes if less than 10 episodes are available
+                    if len(episode_rewards) >= 20 and (epoch + 1) % log_interval == 0:
+                        average_reward = sum(episode_rewards[-20:]) / len(episode_rewards[-20:])
+                        if wandb_log:
+                            WandBLogger.log_rewards(episode_rewards[-20:])
+                        if metrics_recorder:
+                            metrics_recorder.record_rewards(episode_rewards[-20:])
+                        if report_func:
+                            report_func(mean_reward=average_reward)  # Reporting the reward
+
+                    if verbose > 0 and (epoch + 1) % log_interval == 0:
+                        now = phase_timer.elapsed()
+                        interval = max(now - last_log[0], 1e-12)
+                        steps_per_sec = (time_steps - last_log[1]) / interval
+                        updates_per_sec = (train_iters - last_log[2]) / interval
+                        last_log = (now, time_steps, train_iters)
+                        print(
+                            "env",
+                            env_name,
+                            "epoch",
+                            epoch + 1,
+                            "reward episodes",
+                            len(episode_rewards),
+                            "everage steps",
+                            np.mean(episode_steps),
+                            "average reward",
+                            round(average_reward, 2),
+                            "train epochs",
+                            epoch - last_epoch + 1,
+                            "train iters",
+                            train_iters,
+                            "rollout episodes",
+                            len(episode_rewards),
+                            "rollout time steps",
+                            time_steps,
+                            "steps/s",
+                            round(steps_per_sec, 1),
+                            "updates/s",
+                            round(updates_per_sec, 2),
+                        )
+                        print("Phase times", phase_timer.format())
+
+                        grad_norms = []
+                        for name, norm in PPOAgent.get_policy_grad_norms(policy).items():
+                            grad_norms += [f"action_{name}_grad_norm", round(norm, 2)]
+                        value_grad_norm = get_grad_norm(value.parameters())
+                        print(
+                            *grad_norms,
+                            "value_grad_norm",
+                            round(value_grad_norm, 2),
+                        )
+
+                with checkpoint_phase:
+                    if checkpoint_interval > 0:
+                        if average_reward > best_reward:
+                            print("Saving checkpoint...", checkpoint_path)
+                            print("avg_reward", average_reward, "> best_reward", best_reward)
+                            best_reward = average_reward
+                            CheckpointManager.save_checkpoint(
+                                policy, value, optimizer, normalizer, epoch, checkpoint_path
+                            )
+
+        finally:
+            # Also on errors, so the process is not left throttled
+            profiler.stop()
+            if resource_config is not None:
+                resource_config.restore()
         end = time()
         print("Training time: ", round((end - start) / 60, 2), "minutes")
+        print("Phase times", phase_timer.format())
         if metrics_recorder:
             metrics_recorder.to_csv()
         if wandb_log:
@@ -585,7 +763,11 @@ class PPOAgent:
         return policy, value, average_reward, train_iters
 
     def train(self, epochs):
-        PPOAgent.train_with_epoch(
+        """
+        Returns:
+        - (policy, value, average_reward, train_iters) from train_with_epoch.
+        """
+        return PPOAgent.train_with_epoch(
             project=self.project,
             env=self.env,
             env_name=self.env_name,
@@ -626,5 +808,9 @@ class PPOAgent:
             device=self.device,
             wandb_log=self.config["wandb_log"],
             metrics_recorder=self.metrics_recorder,
+            profile_iterations=self.config.get("profile_iterations", 0),
+            bf16=self.config.get("bf16", False),
+            resource_config=self.resource_config,
+            target_kl=self.config.get("target_kl"),
             # seed=self.config["seed"],
         )
@@ -2,6 +2,27 @@ import torch
 from typing import List
 
 
+def autocast(device, enabled=True):
+    """
+    bfloat16 autocast for the forward passes of a PPO update, a no-op when
+    disabled. Policies return their heads in float32, so log-probs, ratios
+    and losses stay in float32; the optimizer only sees float32 parameters.
+    """
+    return torch.autocast(
+        device_type=torch.device(device).type, dtype=torch.bfloat16, enabled=enabled
+    )
+
+
+def approx_kl(log_ratio, ratio=None):
+    """
+    Approximate KL(old || new) from log(new_prob / old_prob) of the sampled
+    actions, using the low-variance estimator mean((ratio - 1) - log_ratio).
+    """
+    if ratio is None:
+        ratio = torch.exp(log_ratio)
+    return ((ratio - 1) - log_ratio).mean()
+
+
 def compute_gae(
     next_value: float,
     rewards: List[torch.Tensor],  # List of float32 tensors
@@ -20,6 +41,56 @@ def compute_gae(
     return returns
 
 
+def compute_gae_batched(
+    next_value: torch.Tensor,  # [num_envs]
+    rewards: torch.Tensor,  # [num_steps, num_envs]
+    masks: torch.Tensor,  # [num_steps, num_envs]
+    values: torch.Tensor,  # [num_steps, num_envs]
+    gamma: float,
+    tau: float,
+):
+    """compute_gae for a [num_steps, num_envs] batch of rollouts, returns a tensor."""
+    returns = torch.empty_like(rewards)
+    gae = torch.zeros_like(next_value)
+    for step in reversed(range(rewards.shape[0])):
+        delta = rewards[step] + gamma * next_value * masks[step] - values[step]
+        gae = delta + gamma * tau * masks[step] * gae
+        returns[step] = gae + values[step]
+        next_value = values[step]
+    return returns
+
+
+def episode_windows(episode_ends, context_length):
+    """
+    Cut a rollout into context windows of at most context_length steps. A
+    window starts at the first step, after every episode end and every
+    context_length steps of an episode, like the context of a sequence policy
+    that is reset at those steps while acting.
+
+    Parameters:
+    - episode_ends (tensor): [num_steps], nonzero where an episode ended.
+
+    Returns:
+    - index ([num_windows, context_length] long): Rollout step of each window
+      position, -1 for the padding at the end of short windows.
+    - valid ([num_windows, context_length] bool): index >= 0.
+    """
+    num_steps = len(episode_ends)
+    device = episode_ends.device
+    steps = torch.arange(num_steps, device=device)
+    starts = torch.zeros(num_steps, dtype=torch.bool, device=device)
+    starts[0] = True
+    starts[1:] = episode_ends[:-1].bool()
+    episode_start = torch.cummax(torch.where(starts, steps, 0), dim=0).values
+    position = (steps - episode_start) % context_length
+    window = torch.cumsum(position == 0, dim=0) - 1
+    index = torch.full(
+        (int(window[-1]) + 1, context_length), -1, dtype=torch.long, device=device
+    )
+    index[window, position] = steps
+    return index, index >= 0
+
+
 def compute_returns_and_advantages_without_gae(
     rewards, states, next_states, dones, value, gamma=0.99
 ):
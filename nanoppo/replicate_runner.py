@@ -0,0 +1,230 @@
+import csv
+import json
+import multiprocessing as mp
+import os
+from time import time
+import click
+import numpy as np
+
+
+def run_seed(seed, run_dir, train_kwargs, num_threads=1):
+    """
+    Train one replicate with train_ppo_agent.train_agent in its own run directory.
+
+    Returns:
+    - dict with the seed, per-episode rewards and lengths, wall-clock seconds
+      and environment steps per second.
+    """
+    import torch
+    from nanoppo.random_utils import set_seed
+    from nanoppo.train_ppo_agent import train_agent
+
+    # One intra-op thread per worker, the pool provides the parallelism
+    torch.set_num_threads(num_threads)
+    set_seed(seed)
+    episode_rewards = []
+    episode_lengths = []
+
+    def report_func(mean_reward, episode_reward, episode_length):
+        episode_rewards.append(episode_reward)
+        episode_lengths.append(episode_length)
+
+    seed_dir = os.path.join(run_dir, f"seed_{seed}")
+    start = time()
+    train_agent(
+        checkpoint_dir=seed_dir,
+        report_func=report_func,
+        device="cpu",
+        seed=seed,
+        **train_kwargs,
+    )
+    seconds = time() - start
+    steps = int(sum(episode_lengths))
+    return {
+        "seed": seed,
+        "episode_rewards": episode_rewards,
+        "episode_lengths": episode_lengths,
+        "seconds": seconds,
+        "steps": steps,
+        "steps_per_sec": steps / max(seconds, 1e-12),
+    }
+
+
+def aggregate_curves(curves, window=1, z=1.96):
+    """
+    Aggregate per-seed learning curves of possibly different lengths.
+
+    Parameters:
+    - curves (list): One list of episode rewards per seed.
+    - window (int): Moving-average window applied to each curve first.
+    - z (float): Normal quantile of the confidence interval, 1.96 for 95%.
+
+    Returns:
+    - dict of arrays over episodes: mean, ci_low, ci_high and n, the number of
+      seeds that reached the episode.
+    """
+    length = max(len(c) for c in curves)
+    values = np.full((len(curves), length), np.nan)
+    for i, curve in enumerate(curves):
+        curve = np.asarray(curve, dtype=float)
+        if window > 1 and len(curve) > 0:
+            cumsum = np.cumsum(np.insert(curve, 0, 0.0))
+            counts = np.minimum(np.arange(1, len(curve) + 1), window)
+            curve = (cumsum[1:] - cumsum[np.arange(len(curve)) + 1 - counts]) / counts
+        values[i, : len(curve)] = curve
+    n = np.sum(~np.isnan(values), axis=0)
+    mean = np.nanmean(values, axis=0)
+    std = np.zeros(length)
+    several = n > 1
+    std[several] = np.nanstd(values[:, several], axis=0, ddof=1)
+    half_width = z * std / np.sqrt(n)
+    return {
+        "mean": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "n": n,
+    }
+
+
+def write_curves(results, aggregate, path):
+    seeds = [r["seed"] for r in results]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["episode", "mean", "ci_low", "ci_high", "n"] + [f"seed_{s}" for s in seeds]
+        )
+        for episode in range(len(aggregate["mean"])):
+            writer.writerow(
+                [
+                    episode + 1,
+                    aggregate["mean"][episode],
+                    aggregate["ci_low"][episode],
+                    aggregate["ci_high"][episode],
+                    int(aggregate["n"][episode]),
+                ]
+                + [
+                    (
+                        r["episode_rewards"][episode]
+                        if episode < len(r["episode_rewards"])
+                        else ""
+                    )
+                    for r in results
+                ]
+            )
+
+
+def run_replicates(
+    seeds,
+    run_dir="runs",
+    num_workers=None,
+    window=10,
+    num_threads=1,
+    **train_kwargs,
+):
+    """
+    Run train_agent for every seed in a spawn process pool and aggregate the
+    learning curves.
+
+    Every seed trains in run_dir/seed_<seed>, so replicates do not load or
+    overwrite each other's checkpoints. run_dir receives curves.csv (mean and
+    95% CI per episode plus the raw curve of each seed) and summary.json (per
+    seed and total wall-clock time and throughput).
+
+    Parameters:
+    - seeds (list): Seeds passed to random_utils.set_seed in the workers.
+    - num_workers (int): Pool size, min(len(seeds), os.cpu_count()) if None.
+    - window (int): Moving-average window of the aggregated curves.
+    - num_threads (int): torch intra-op threads per worker.
+    - train_kwargs: Arguments of train_agent, e.g. env_name and max_episodes.
+
+    Returns:
+    - (list of per-seed results, aggregate dict)
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    num_workers = num_workers or min(len(seeds), os.cpu_count())
+    start = time()
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(num_workers) as pool:
+        results = pool.starmap(
+            run_seed,
+            [(seed, run_dir, train_kwargs, num_threads) for seed in seeds],
+            chunksize=1,
+        )
+    wall_clock = time() - start
+
+    aggregate = aggregate_curves([r["episode_rewards"] for r in results], window)
+    write_curves(results, aggregate, os.path.join(run_dir, "curves.csv"))
+    total_steps = sum(r["steps"] for r in results)
+    summary = {
+        "train_kwargs": train_kwargs,
+        "num_workers": num_workers,
+        "wall_clock_seconds": wall_clock,
+        "total_steps": total_steps,
+        "steps_per_sec": total_steps / max(wall_clock, 1e-12),
+        "final_mean_reward": float(aggregate["mean"][-1]),
+        "seeds": [
+            {key: r[key] for key in ("seed", "seconds", "steps", "steps_per_sec")}
+            for r in results
+        ],
+    }
+    with open(os.path.join(run_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    for r in results:
+        print(
+            "seed",
+            r["seed"],
+            "episodes",
+            len(r["episode_rewards"]),
+            "seconds",
+            round(r["seconds"], 2),
+            "steps/s",
+            round(r["steps_per_sec"], 1),
+        )
+    print(
+        "Replicates",
+        len(seeds),
+        "workers",
+        num_workers,
+        "wall clock",
+        round(wall_clock, 2),
+        "seconds",
+        "total steps/s",
+        round(summary["steps_per_sec"], 1),
+        "final mean reward",
+        round(summary["final_mean_reward"], 2),
+        "+/-",
+        round(float(aggregate["ci_high"][-1] - aggregate["mean"][-1]), 2),
+    )
+    print("Saved curves and summary to", run_dir)
+    return results, aggregate
+
+
+@click.command()
+@click.option(
+    "--env_name",
+    default="PointMass2D-v0",
+    type=click.Choice(
+        ["PointMass1D-v0", "PointMass2D-v0", "Pendulum-v1", "MountainCarContinuous-v0"]
+    ),
+)
+@click.option("--num_seeds", default=4, help="Number of replicates, seeds 0..N-1.")
+@click.option("--max_episodes", default=100, help="Number of training episodes.")
+@click.option(
+    "--run_dir", default="runs", help="Directory for per-seed runs and results."
+)
+@click.option("--num_workers", default=None, type=int, help="Pool size.")
+@click.option("--window", default=10, help="Moving-average window of the curves.")
+def cli(env_name, num_seeds, max_episodes, run_dir, num_workers, window):
+    run_replicates(
+        list(range(num_seeds)),
+        run_dir=os.path.join(run_dir, env_name),
+        num_workers=num_workers,
+        window=window,
+        env_name=env_name,
+        max_episodes=max_episodes,
+    )
+
+
+if __name__ == "__main__":
+    cli()
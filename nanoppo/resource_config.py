@@ -0,0 +1,166 @@
+import os
+from contextlib import nullcontext
+import torch
+
+
+class _ThreadScope:
+    """Reusable context manager that switches torch to `num_threads` intra-op threads."""
+
+    __slots__ = ("resources", "num_threads")
+
+    def __init__(self, resources, num_threads):
+        self.resources = resources
+        self.num_threads = num_threads
+
+    def __enter__(self):
+        self.resources.set_threads(self.num_threads)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _BlasScope:
+    """Reusable context manager that caps the BLAS pools at `num_threads` threads."""
+
+    __slots__ = ("controller", "num_threads", "limiter")
+
+    def __init__(self, controller, num_threads):
+        self.controller = controller
+        self.num_threads = num_threads
+        self.limiter = None
+
+    def __enter__(self):
+        self.limiter = self.controller.limit(limits=self.num_threads)
+        return self
+
+    def __exit__(self, *exc):
+        self.limiter.restore_original_limits()
+        self.limiter = None
+        return False
+
+
+class ResourceConfig:
+    """
+    Thread counts and CPU affinity for the work of a training process.
+
+    Batch-1 acting gains nothing from torch's intra-op pool but pays its
+    synchronization, while batched updates do use it. Thread counts are
+    therefore set separately for acting and learning and switched at phase
+    boundaries (only when they change). NumPy env code uses the BLAS pool,
+    which is capped around env stepping with threadpoolctl when it is
+    installed. Settings left at None keep the torch and BLAS defaults.
+
+    Parameters:
+    - act_threads (int): torch threads while selecting actions, unchanged if
+      None.
+    - learn_threads (int): torch threads for GAE and updates, unchanged if
+      None, or all cores of cores if that is set.
+    - env_threads (int): BLAS threads for env stepping and state scaling,
+      unchanged if None.
+    - cores (list): CPU affinity of the training process, unchanged if None.
+    - env_cores (list): CPU affinity of env worker processes.
+
+    Usage:
+        resources = ResourceConfig(act_threads=1, learn_threads=4, cores=[0, 1, 2, 3])
+        resources.apply()
+        with resources.acting():
+            action = policy.act(state)
+        with resources.stepping():
+            state, reward, done, truncated, info = env.step(action)
+        with resources.learning():
+            ppo.update(...)
+    """
+
+    def __init__(
+        self,
+        act_threads=None,
+        learn_threads=None,
+        env_threads=None,
+        cores=None,
+        env_cores=None,
+    ):
+        self.act_threads = act_threads
+        self.learn_threads = learn_threads
+        self.env_threads = env_threads
+        self.cores = None if cores is None else list(cores)
+        self.env_cores = None if env_cores is None else list(env_cores)
+        self.current_threads = None
+        self.initial_threads = None
+        self.initial_cores = None
+        self._acting = None
+        self._learning = None
+        self._stepping = nullcontext()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the act_threads, learn_threads, env_threads, cores and env_cores keys."""
+        keys = ["act_threads", "learn_threads", "env_threads", "cores", "env_cores"]
+        return cls(**{key: config[key] for key in keys if key in config})
+
+    def apply(self):
+        """Set the affinity and resolve the thread and BLAS limits."""
+        self.initial_threads = torch.get_num_threads()
+        if hasattr(os, "sched_getaffinity"):
+            self.initial_cores = sorted(os.sched_getaffinity(0))
+            if self.cores is not None:
+                os.sched_setaffinity(0, self.cores)
+            available = len(os.sched_getaffinity(0))
+        else:
+            available = os.cpu_count()
+
+        act_threads = self.act_threads or self.initial_threads
+        if self.learn_threads:
+            learn_threads = self.learn_threads
+        else:
+            learn_threads = available if self.cores is not None else self.initial_threads
+        self._acting = _ThreadScope(self, act_threads)
+        self._learning = _ThreadScope(self, learn_threads)
+
+        if self.env_threads is not None:
+            try:
+                from threadpoolctl import ThreadpoolController
+            except ImportError:
+                print("threadpoolctl is not installed, env_threads is ignored")
+            else:
+                self._stepping = _BlasScope(ThreadpoolController(), self.env_threads)
+        self.set_threads(act_threads)
+        print("Resources", self.describe())
+        return self
+
+    def set_threads(self, num_threads):
+        if num_threads != self.current_threads:
+            torch.set_num_threads(num_threads)
+            self.current_threads = num_threads
+
+    def acting(self):
+        return self._acting
+
+    def learning(self):
+        return self._learning
+
+    def stepping(self):
+        """BLAS limit for env stepping, a no-op without env_threads."""
+        return self._stepping
+
+    def describe(self):
+        """Effective settings after apply()."""
+        return {
+            "act_threads": self._acting.num_threads if self._acting else None,
+            "learn_threads": self._learning.num_threads if self._learning else None,
+            "env_threads": self.env_threads,
+            "interop_threads": torch.get_num_interop_threads(),
+            "cores": (
+                sorted(os.sched_getaffinity(0))
+                if hasattr(os, "sched_getaffinity")
+                else None
+            ),
+            "env_cores": self.env_cores,
+        }
+
+    def restore(self):
+        """Undo apply()."""
+        if self.initial_cores is not None and self.cores is not None:
+            os.sched_setaffinity(0, self.initial_cores)
+        if self.initial_threads is not None:
+            self.set_threads(self.initial_threads)
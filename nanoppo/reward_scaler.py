@@ -1,4 +1,5 @@
 import numpy as np
+from nanoppo.stats_sync import merge_moments
 
 
 class RewardScaler:
@@ -18,6 +19,12 @@ class RewardScaler:
     S_k: Running sum of squares of differences from the current mean after observing k samples.
     x_k: k-th sample.
 
+    A batch of n samples with mean M_b and sum of squares S_b is merged in
+    closed form (Chan et al.), with delta = M_b - M_k:
+
+    M_{k+n} = M_k + delta * n / (k + n)
+    S_{k+n} = S_k + S_b + delta^2 * k * n / (k + n)
+
     The variance is then computed as:
     variance = S_k / (k-1)
     (for k > 1).
@@ -32,42 +39,107 @@ class RewardScaler:
 
     def update(self, rewards):
         """
-        Update the running mean and variance using Welford's online algorithm.
+        Merge the mean and sum of squares of a batch into the running statistics.
 
         Parameters:
         - rewards (list or array): Batch of rewards from recent episodes.
         """
-        batch_mean = np.mean(rewards)
+        rewards = np.asarray(rewards, dtype=np.float64).reshape(-1)
         batch_count = len(rewards)
+        if batch_count == 0:
+            return
+        batch_mean = rewards.mean()
+        batch_sum_of_square_diffs = np.square(rewards - batch_mean).sum()
         new_count = self.count + batch_count
 
         delta = batch_mean - self.running_mean
-        new_mean = self.running_mean + delta * batch_count / new_count
+        self.running_mean = self.running_mean + delta * batch_count / new_count
+        self.running_sum_of_square_diffs = (
+            self.running_sum_of_square_diffs
+            + batch_sum_of_square_diffs
+            + delta**2 * self.count * batch_count / new_count
+        )
+        self.count = new_count
 
-        for reward in rewards:
-            delta = reward - new_mean
-            delta2 = reward - self.running_mean
-            self.running_sum_of_square_diffs += delta * delta2
+    def get_moments(self):
+        """(count, mean, M2) summary of the observed rewards."""
+        return (
+            float(self.count),
+            float(self.running_mean),
+            float(self.running_sum_of_square_diffs),
+        )
 
-        self.running_mean = new_mean
-        self.count = new_count
+    def set_moments(self, moments):
+        """Replace the statistics with a (count, mean, M2) summary."""
+        count, self.running_mean, self.running_sum_of_square_diffs = map(float, moments)
+        self.count = int(round(count))
+
+    def merge_moments(self, moments):
+        """Add the rewards summarized by (count, mean, M2), e.g. of another worker."""
+        self.set_moments(merge_moments(self.get_moments(), moments))
 
-    def scale_rewards(self, rewards):
+    def std(self):
+        """Running standard deviation, 1 before two samples were seen."""
+        if self.count < 2:
+            return 1.0
+        return np.sqrt(self.running_sum_of_square_diffs / (self.count - 1))
+
+    def scale_rewards(self, rewards, dones=None):
         """
         Scale rewards using the running statistics and update the statistics.
 
         Parameters:
         - rewards (list or array): Batch of rewards from recent episodes.
+        - dones (list or array): Episode ends, unused here.
 
         Returns:
-        - Normalized rewards.
+        - Normalized rewards as an array.
         """
         self.update(rewards)
-        variance = (
-            self.running_sum_of_square_diffs / (self.count - 1)
-            if self.count > 1
-            else 1.0
-        )
-        std = np.sqrt(variance)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        return (rewards - self.running_mean) / (self.std() + 1e-8)
 
-        return [(reward - self.running_mean) / (std + 1e-8) for reward in rewards]
+
+class ReturnScaler(RewardScaler):
+    """
+    Scales rewards by the running standard deviation of the discounted return,
+    without shifting them, so the sign of each reward and the optimal policy
+    are kept. Each env accumulates its own return, which restarts after the
+    env's episode ends.
+
+    Parameters:
+    - num_envs (int): Number of envs the rewards come from.
+    - gamma (float): Discount factor of the return.
+    """
+
+    def __init__(self, num_envs=1, gamma=0.99):
+        super().__init__()
+        self.gamma = gamma
+        self.returns = np.zeros(num_envs)
+
+    def scale_rewards(self, rewards, dones=None):
+        """
+        Parameters:
+        - rewards (array): [steps] rewards of one env or [steps, num_envs]
+          rewards, in step order.
+        - dones (array): Episode ends of the same shape.
+
+        Returns:
+        - Scaled rewards as an array of the shape of rewards.
+        """
+        rewards = np.asarray(rewards, dtype=np.float64)
+        steps = rewards.reshape(len(rewards), -1)
+        if dones is None:
+            ends = np.zeros(steps.shape, dtype=bool)
+        else:
+            ends = np.asarray(dones, dtype=bool).reshape(steps.shape)
+
+        # The recurrence is sequential in time, each step is vectorized over envs
+        returns = np.empty_like(steps)
+        for t in range(len(steps)):
+            self.returns = self.returns * self.gamma + steps[t]
+            returns[t] = self.returns
+            self.returns = np.where(ends[t], 0.0, self.returns)
+
+        self.update(returns)
+        return rewards / (self.std() + 1e-8)
@@ -1,25 +1,51 @@
+import numpy as np
+import torch
+
+
 class RewardShaper:
     """
     Base class for reward shaping. It provides a structure and can be subclassed
     for specific environments.
+
+    Shapers work on batches: reshape() takes [N] rewards and [N, obs_dim]
+    observations and returns [N] rewards. Shapers that read the network inputs
+    rather than the raw observations set scaled_observations to True.
     """
 
+    scaled_observations = False
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def as_batch(rewards, observations):
+        """Rewards as a float [N] array and observations as a [N, obs_dim] array."""
+        rewards = np.asarray(rewards, dtype=np.float64).reshape(-1)
+        observations = np.asarray(observations, dtype=np.float64).reshape(
+            len(rewards), -1
+        )
+        return rewards, observations
+
     def reshape(self, rewards, observations, next_observations=None):
         """
         This method should be overridden by subclasses to provide specific reward shaping logic.
 
         Parameters:
-        - rewards (list or array): Original rewards from the environment.
-        - observations (list or array): Corresponding observations for the rewards.
+        - rewards (array): [N] original rewards from the environment.
+        - observations (array): [N, obs_dim] observations the rewards were received in.
+        - next_observations (array): [N, obs_dim] observations after each step.
 
         Returns:
-        - Reshaped rewards.
+        - [N] array of reshaped rewards.
         """
         # By default, just return the original rewards.
-        return rewards
+        return np.asarray(rewards, dtype=np.float64).reshape(-1)
+
+
+def mountain_car_height(position):
+    """Height of the MountainCar terrain at position (float or array)."""
+    # This formula is derived from the MountainCar environment's terrain shape.
+    return np.sin(3 * position) * 0.45 + 0.55
 
 
 class MountainCarRewardShaper(RewardShaper):
@@ -44,32 +70,19 @@ class MountainCarRewardShaper(RewardShaper):
         Reward shaping for MountainCar based on position and velocity.
 
         Parameters:
-        - rewards (list or array): Original rewards from the environment.
-        - observations (list or array): Corresponding observations for the rewards.
+        - rewards (array): [N] original rewards from the environment.
+        - observations (array): [N, 2] positions and velocities.
 
         Returns:
-        - Reshaped rewards.
+        - [N] array of reshaped rewards.
         """
-        # Extract position and velocity from observations.
-        positions = [obs[0] for obs in observations]
-        velocities = [obs[1] for obs in observations]
-
-        # Calculate position-based and velocity-based rewards.
-        position_rewards = [pos * self.position_weight for pos in positions]
-        velocity_rewards = [abs(vel) * self.velocity_weight for vel in velocities]
-
-        # Combine the original rewards with the shaped rewards.
-        reshaped_rewards = [
-            orig_reward + pos_reward + vel_reward
-            for orig_reward, pos_reward, vel_reward in zip(
-                rewards, position_rewards, velocity_rewards
-            )
-        ]
-
-        return reshaped_rewards
-
-
-import numpy as np
+        rewards, observations = self.as_batch(rewards, observations)
+        positions, velocities = observations[:, 0], observations[:, 1]
+        return (
+            rewards
+            + positions * self.position_weight
+            + np.abs(velocities) * self.velocity_weight
+        )
 
 
 class MountainCarHeightRewardShaper(RewardShaper):
@@ -92,37 +105,26 @@ class MountainCarHeightRewardShaper(RewardShaper):
         Calculate the height of the car based on its position.
 
         Parameters:
-        - position (float): Current position of the car.
+        - position (float or array): Current position of the car.
 
         Returns:
         - Height of the car.
         """
-        # This formula is derived from the MountainCar environment's terrain shape.
-        return np.sin(3 * position) * 0.45 + 0.55
+        return mountain_car_height(position)
 
     def reshape(self, rewards, observations, next_observations=None):
         """
         Reward shaping for MountainCar based on the car's height.
 
         Parameters:
-        - rewards (list or array): Original rewards from the environment.
-        - observations (list or array): Corresponding observations for the rewards.
+        - rewards (array): [N] original rewards from the environment.
+        - observations (array): [N, 2] positions and velocities.
 
         Returns:
-        - Reshaped rewards.
+        - [N] array of reshaped rewards.
         """
-        # Calculate height-based rewards.
-        height_rewards = [
-            self.height(obs[0]) * self.height_weight for obs in observations
-        ]
-
-        # Combine the original rewards with the shaped rewards.
-        reshaped_rewards = [
-            orig_reward + height_reward
-            for orig_reward, height_reward in zip(rewards, height_rewards)
-        ]
-
-        return reshaped_rewards
+        rewards, observations = self.as_batch(rewards, observations)
+        return rewards + self.height(observations[:, 0]) * self.height_weight
 
 
 class MountainCarAdvancedRewardShaper(RewardShaper):
@@ -157,42 +159,35 @@ class MountainCarAdvancedRewardShaper(RewardShaper):
         Calculate the height of the car based on its position.
 
         Parameters:
-        - position (float): Current position of the car.
+        - position (float or array): Current position of the car.
 
         Returns:
         - Height of the car.
         """
-        return np.sin(3 * position) * 0.45 + 0.55
+        return mountain_car_height(position)
 
     def reshape(self, rewards, observations, next_observations=None):
         """
         Advanced reward shaping for MountainCar based on multiple techniques.
 
         Parameters:
-        - rewards (list or array): Original rewards from the environment.
-        - observations (list or array): Corresponding observations for the rewards.
+        - rewards (array): [N] original rewards from the environment.
+        - observations (array): [N, 2] positions and velocities.
 
         Returns:
-        - Reshaped rewards.
+        - [N] array of reshaped rewards.
         """
-        reshaped_rewards = []
-        for reward, obs in zip(rewards, observations):
-            position, velocity = obs
-
-            # Height-based reward
-            height_reward = self.height(position) * self.height_weight
-
-            # Velocity-based reward
-            velocity_reward = abs(velocity) * self.velocity_weight
+        rewards, observations = self.as_batch(rewards, observations)
+        positions, speeds = observations[:, 0], np.abs(observations[:, 1])
 
-            # Penalty for staying still
-            penalty = self.still_penalty if abs(velocity) < self.still_threshold else 0
+        # Height-based reward
+        height_rewards = self.height(positions) * self.height_weight
+        # Velocity-based reward
+        velocity_rewards = speeds * self.velocity_weight
+        # Penalty for staying still
+        penalties = np.where(speeds < self.still_threshold, self.still_penalty, 0.0)
 
-            # Combine the rewards
-            total_reward = reward + height_reward + velocity_reward + penalty
-            reshaped_rewards.append(total_reward)
-
-        return reshaped_rewards
+        return rewards + height_rewards + velocity_rewards + penalties
 
 
 class MountainCarDirectionalRewardShaper(RewardShaper):
@@ -200,6 +195,8 @@ class MountainCarDirectionalRewardShaper(RewardShaper):
     Reward shaping for MountainCar based on height, velocity direction, and distance from the goal.
     """
 
+    goal_position = 0.5
+
     def __init__(
         self, height_weight=1.0, velocity_direction_weight=1.0, distance_weight=1.0
     ):
@@ -209,35 +206,29 @@ class MountainCarDirectionalRewardShaper(RewardShaper):
         self.distance_weight = distance_weight
 
     def height(self, position):
-        return np.sin(3 * position) * 0.45 + 0.55
+        return mountain_car_height(position)
 
     def reshape(self, rewards, observations, next_observations=None):
-        reshaped_rewards = []
+        rewards, observations = self.as_batch(rewards, observations)
+        positions, velocities = observations[:, 0], observations[:, 1]
 
-        for reward, obs in zip(rewards, observations):
-            position, velocity = obs
+        # Height-based reward
+        height_rewards = self.height(positions) * self.height_weight
 
-            # Height-based reward
-            height_reward = self.height(position) * self.height_weight
+        # Velocity direction reward, when moving back towards the valley floor
+        towards_center = ((positions < 0) & (velocities > 0)) | (
+            (positions > 0) & (velocities < 0)
+        )
+        direction_rewards = np.where(
+            towards_center, np.abs(velocities) * self.velocity_direction_weight, 0.0
+        )
 
-            # Velocity direction reward
-            if (position < 0 and velocity > 0) or (position > 0 and velocity < 0):
-                direction_reward = abs(velocity) * self.velocity_direction_weight
-            else:
-                direction_reward = 0
+        # Distance from the goal reward
+        distance_rewards = (
+            -np.abs(self.goal_position - positions) * self.distance_weight
+        )
 
-            # Distance from the goal reward
-            goal_position = 0.5
-            distance_reward = -abs(goal_position - position) * self.distance_weight
-
-            # Combine the rewards
-            total_reward = reward + height_reward + direction_reward + distance_reward
-            reshaped_rewards.append(total_reward)
-
-        return reshaped_rewards
-
-
-import torch
+        return rewards + height_rewards + direction_rewards + distance_rewards
 
 
 class TDRewardShaper(RewardShaper):
@@ -245,28 +236,55 @@ class TDRewardShaper(RewardShaper):
     Reward shaping for MountainCar based on Temporal Difference (TD) error.
     """
 
+    # The value network sees scaled observations
+    scaled_observations = True
+
     def __init__(self, model, device, gamma=0.99):
         super().__init__()
         self.model = model  # The neural network model used by PPO to estimate values
         self.device = device
         self.gamma = gamma
 
-    def td_error(self, reward, current_state, next_state):
-        current_state = torch.from_numpy(current_state).float().to(self.device)
-        current_value = self.model(current_state)
-        next_state = torch.from_numpy(next_state).float().to(self.device)
-        next_value = self.model(next_state)
-
-        return reward + self.gamma * next_value - current_value
+    def values(self, observations, next_observations):
+        """
+        Values of observations and next_observations from one forward of the
+        stacked [2N, obs_dim] batch.
 
-    def reshape(self, rewards, observations, next_observations):
-        reshaped_rewards = []
+        Returns:
+        - values, next_values ([N] arrays)
+        """
+        n = len(observations)
+        states = np.concatenate(
+            [
+                np.asarray(observations).reshape(n, -1),
+                np.asarray(next_observations).reshape(n, -1),
+            ]
+        )
         with torch.no_grad():
-            for t in range(len(rewards)):
-                reward = rewards[t]
-                current_state = observations[t]
-                next_state = next_observations[t]
-                td = self.td_error(reward, current_state, next_state)
-                r = (reward + td).cpu().numpy().item()
-                reshaped_rewards.append(r)
-        return reshaped_rewards
+            values = self.model(
+                torch.as_tensor(states, dtype=torch.float32, device=self.device)
+            )
+        values = values.reshape(-1).cpu().numpy()
+        return values[:n], values[n:]
+
+    def td_errors(self, rewards, values, next_values):
+        """[N] TD errors r + gamma * V(s') - V(s)."""
+        return rewards + self.gamma * np.asarray(next_values) - np.asarray(values)
+
+    def reshape(
+        self, rewards, observations, next_observations, values=None, next_values=None
+    ):
+        """
+        Parameters:
+        - rewards (array): [N] original rewards from the environment.
+        - observations, next_observations (array): [N, obs_dim] network inputs.
+        - values, next_values (array): [N] values of observations and
+          next_observations if already computed, e.g. for GAE.
+
+        Returns:
+        - [N] array of reshaped rewards.
+        """
+        rewards = np.asarray(rewards, dtype=np.float64).reshape(-1)
+        if values is None or next_values is None:
+            values, next_values = self.values(observations, next_observations)
+        return rewards + self.td_errors(rewards, values, next_values)
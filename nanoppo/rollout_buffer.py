@@ -8,9 +8,27 @@ class RolloutBuffer:
     def __init__(self, capacity):
         self.capacity = capacity
         self.buffer = deque(maxlen=capacity)
+        # Optional raw (unscaled) observation pairs, aligned with buffer
+        self.observations = deque(maxlen=capacity)
+        # Terminations and truncations, aligned with buffer
+        self.episode_ends = deque(maxlen=capacity)
 
-    def push(self, state, action, log_prob, reward, next_state, done):
+    def push(
+        self,
+        state,
+        action,
+        log_prob,
+        reward,
+        next_state,
+        done,
+        observation=None,
+        next_observation=None,
+        episode_end=None,
+    ):
         self.buffer.append((state, action, log_prob, reward, next_state, done))
+        self.episode_ends.append(done if episode_end is None else episode_end)
+        if observation is not None:
+            self.observations.append((observation, next_observation))
 
     def sample(self, batch_size, device, randomize=True):
         if randomize:
@@ -31,8 +49,45 @@ class RolloutBuffer:
         dones_t = torch.tensor(np.array(dones, dtype=np.float32), device=device)
         return states_t, actions_t, log_probs_t, rewards_t, next_states_t, dones_t
 
+    def get_rewards(self):
+        """Rewards in insertion order as a [len] array."""
+        return np.array([transition[3] for transition in self.buffer], dtype=np.float32)
+
+    def set_rewards(self, rewards):
+        """Replace the rewards in insertion order, e.g. with a shaped batch."""
+        assert len(rewards) == len(self.buffer)
+        self.buffer = deque(
+            (
+                (state, action, log_prob, reward, next_state, done)
+                for (state, action, log_prob, _, next_state, done), reward in zip(
+                    self.buffer, rewards
+                )
+            ),
+            maxlen=self.capacity,
+        )
+
+    def get_states(self):
+        """States and next states in insertion order as [len, state_dim] arrays."""
+        states = np.array([transition[0] for transition in self.buffer], dtype=np.float32)
+        next_states = np.array(
+            [transition[4] for transition in self.buffer], dtype=np.float32
+        )
+        return states, next_states
+
+    def get_episode_ends(self):
+        """Whether each transition ended its episode, terminated or truncated."""
+        return np.array(self.episode_ends, dtype=bool)
+
+    def get_observations(self):
+        """Raw observations and next observations pushed with the transitions."""
+        assert len(self.observations) == len(self.buffer)
+        observations, next_observations = zip(*self.observations)
+        return np.array(observations), np.array(next_observations)
+
     def __len__(self):
         return len(self.buffer)
 
     def clear(self):
         self.buffer.clear()
+        self.observations.clear()
+        self.episode_ends.clear()
@@ -4,16 +4,76 @@ import torch
 import torch.nn as nn
 import math
 
+# (d_model, dtype, device) -> encoding table shared by all instances, grown on demand
+_TABLES = {}
+
+
+def sinusoidal_table(length, d_model):
+    """[length, d_model] float32 encoding of positions 0..length-1."""
+    encoding = torch.zeros(length, d_model)
+    position = torch.arange(0, length).unsqueeze(1)
+    div_term = torch.exp(torch.arange(0, d_model, 2).float() * -(math.log(10000.0) / d_model))
+    div_term = torch.repeat_interleave(div_term, 2, dim=0)  # Repeat each element twice
+    encoding[:, 0::2] = torch.sin(position * div_term[:d_model//2])
+    encoding[:, 1::2] = torch.cos(position * div_term[:d_model//2])
+    return encoding
+
+
+def get_encoding(length, d_model, dtype=torch.float32, device=torch.device("cpu")):
+    """
+    Shared encoding table with at least `length` rows. The table of a
+    (d_model, dtype, device) is computed once and regrown, at least doubling,
+    when a longer sequence needs it.
+    """
+    key = (d_model, dtype, torch.device(device))
+    table = _TABLES.get(key)
+    if table is None or table.size(0) < length:
+        size = max(length, 2 * table.size(0) if table is not None else 0)
+        table = sinusoidal_table(size, d_model).to(device=device, dtype=dtype)
+        _TABLES[key] = table
+    return table
+
+
 class SinusoidalPositionalEncoding(nn.Module):
+    """
+    Adds the sinusoidal encoding of each position to [batch, length, d_model]
+    inputs. The table is shared between instances and grows with the longest
+    sequence seen. It is a non-persistent buffer: it follows .to() but is not
+    saved in state_dict, so checkpoints do not change.
+
+    Parameters:
+    - d_model (int): Input size.
+    - max_len (int): Initial table length.
+    """
+
     def __init__(self, d_model, max_len=2000, device=torch.device("cpu")):
         super(SinusoidalPositionalEncoding, self).__init__()
-        self.encoding = torch.zeros(max_len, d_model).to(device)
-        position = torch.arange(0, max_len).unsqueeze(1)
-        div_term = torch.exp(torch.arange(0, d_model, 2).float() * -(math.log(10000.0) / d_model))
-        div_term = torch.repeat_interleave(div_term, 2, dim=0)  # Repeat each element twice
-        self.encoding[:, 0::2] = torch.sin(position * div_term[:d_model//2])
-        self.encoding[:, 1::2] = torch.cos(position * div_term[:d_model//2])
-        self.encoding = self.encoding.unsqueeze(0)
-
-    def forward(self, x):
-        return x + self.encoding[:, :x.size(1)].detach()
+        self.d_model = d_model
+        self.register_buffer(
+            "encoding",
+            get_encoding(max_len, d_model, device=device).unsqueeze(0),
+            persistent=False,
+        )
+
+    def table(self, length, dtype, device):
+        """[>= length, d_model] table in dtype on device."""
+        encoding = self.encoding
+        if encoding.size(1) < length or encoding.dtype != dtype or encoding.device != device:
+            self.encoding = get_encoding(length, self.d_model, dtype, device).unsqueeze(0)
+        return self.encoding[0]
+
+    def forward(self, x, offset=0):
+        """
+        Parameters:
+        - x (tensor): [batch, length, d_model]
+        - offset (int or tensor): Position of x[:, 0], or a [batch] tensor
+          with the position of each row, e.g. the current step of each env
+          when acting incrementally.
+        """
+        length = x.size(1)
+        if isinstance(offset, torch.Tensor):
+            table = self.table(int(offset.max()) + length, x.dtype, x.device)
+            positions = offset.unsqueeze(-1) + torch.arange(length, device=x.device)
+            return x + table[positions].detach()
+        table = self.table(offset + length, x.dtype, x.device)
+        return x + table[offset:offset + length].detach()
@@ -1,9 +1,3 @@
-from sklearn.preprocessing import (
-    StandardScaler,
-    MinMaxScaler,
-    RobustScaler,
-    QuantileTransformer,
-)
 import numpy as np
 
 
@@ -16,6 +10,14 @@ class StateScaler:
             self.scaler = self._init_scaler(env, sample_size, scale_type)
 
     def _init_scaler(self, env, sample_size, scale_type):
+        # scikit-learn is slow to import, only load it for fitted scalers
+        from sklearn.preprocessing import (
+            StandardScaler,
+            MinMaxScaler,
+            RobustScaler,
+            QuantileTransformer,
+        )
+
         samples = [env.observation_space.sample() for _ in range(sample_size)]
         state_space_samples = np.array(
             [
@@ -0,0 +1,174 @@
+import multiprocessing as mp
+import queue
+
+import numpy as np
+
+
+def merge_moments(a, b):
+    """
+    Exact merge of two (count, mean, M2) summaries with the parallel variance
+    formula (Chan et al.). M2 is the sum of squared differences from the
+    mean. Each field is a float or a per-dimension array, so the cost is
+    O(dim) whatever the number of samples.
+
+    Returns:
+    - (count, mean, M2) of the samples of a and b together.
+    """
+    n_a, mean_a, m2_a = (np.asarray(x, dtype=np.float64) for x in a)
+    n_b, mean_b, m2_b = (np.asarray(x, dtype=np.float64) for x in b)
+    n = n_a + n_b
+    safe_n = np.where(n > 0, n, 1.0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / safe_n
+    m2 = m2_a + m2_b + delta**2 * n_a * n_b / safe_n
+    return n, mean, m2
+
+
+def subtract_moments(total, part):
+    """
+    Inverse of merge_moments: the summary of the samples of total that are
+    not in part.
+    """
+    n_t, mean_t, m2_t = (np.asarray(x, dtype=np.float64) for x in total)
+    n_p, mean_p, m2_p = (np.asarray(x, dtype=np.float64) for x in part)
+    n = n_t - n_p
+    safe_n = np.where(n > 0, n, 1.0)
+    mean = np.where(n > 0, (n_t * mean_t - n_p * mean_p) / safe_n, 0.0)
+    delta = mean - mean_p
+    m2 = m2_t - m2_p - delta**2 * n_p * n / np.where(n_t > 0, n_t, 1.0)
+    return n, mean, np.maximum(m2, 0.0)
+
+
+def zero_moments(shape=()):
+    """Summary of no samples."""
+    return np.zeros(shape), np.zeros(shape), np.zeros(shape)
+
+
+class SharedMoments:
+    """
+    One (count, mean, M2) slot per worker in a shared-memory array. Any
+    process can publish its slot and gather the merge of all slots. Create it
+    before starting the workers and pass it to them.
+
+    Parameters:
+    - num_workers (int): Number of slots.
+    - shape (tuple): Shape of each field, () for a RewardScaler and (dim,)
+      for a Normalizer.
+    """
+
+    def __init__(self, num_workers, shape=(), ctx=None):
+        ctx = ctx or mp.get_context("spawn")
+        self.num_workers = num_workers
+        self.shape = tuple(shape)
+        self.lock = ctx.Lock()
+        self.table = ctx.RawArray("d", num_workers * 3 * int(np.prod(self.shape)))
+
+    def _view(self):
+        array = np.frombuffer(self.table, dtype=np.float64)
+        return array.reshape((self.num_workers, 3) + self.shape)
+
+    def publish(self, worker_id, moments):
+        with self.lock:
+            self._view()[worker_id] = np.stack(
+                [np.broadcast_to(x, self.shape) for x in moments]
+            )
+
+    def gather(self):
+        with self.lock:
+            slots = self._view().copy()
+        merged = zero_moments(self.shape)
+        for slot in slots:
+            merged = merge_moments(merged, slot)
+        return merged
+
+
+class QueueMoments:
+    """
+    Workers put their (count, mean, M2) summaries on a multiprocessing queue.
+    The one process that calls gather(), e.g. the learner before a
+    checkpoint, keeps the latest summary of each worker and merges them.
+
+    Parameters:
+    - num_workers (int): Number of workers.
+    - shape (tuple): Shape of each field.
+    """
+
+    def __init__(self, num_workers, shape=(), ctx=None):
+        ctx = ctx or mp.get_context("spawn")
+        self.num_workers = num_workers
+        self.shape = tuple(shape)
+        self.queue = ctx.Queue()
+        self.latest = {}
+
+    def __getstate__(self):
+        # Workers only publish, the latest summaries stay with the gathering process
+        return {**self.__dict__, "latest": {}}
+
+    def publish(self, worker_id, moments):
+        self.queue.put((worker_id, tuple(np.asarray(x) for x in moments)))
+
+    def gather(self):
+        while True:
+            try:
+                worker_id, moments = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.latest[worker_id] = moments
+        merged = zero_moments(self.shape)
+        for moments in self.latest.values():
+            merged = merge_moments(merged, moments)
+        return merged
+
+
+class StatsSync:
+    """
+    Periodic exact synchronization of a Normalizer or RewardScaler between
+    workers. sync() publishes the summary of the samples this worker observed
+    itself and, with pull, replaces its statistics with the merge over all
+    workers, so every worker normalizes with the same statistics.
+
+    Parameters:
+    - stats (Normalizer or RewardScaler): Statistics of this worker.
+    - moments (SharedMoments or QueueMoments): Transport shared by the workers.
+      Only one process may gather from a QueueMoments, so its workers use
+      pull=False.
+    - worker_id (int): Slot of this worker.
+    - interval (int): step() calls between syncs.
+    - pull (bool): Replace the statistics with the merge after publishing.
+    - own_initial (bool): Count the statistics present at creation as this
+      worker's, e.g. on the one worker that loaded them from a checkpoint.
+      Otherwise they are treated as already shared.
+
+    Usage:
+        sync = StatsSync(normalizer, shared_moments, worker_id, interval=100)
+        for step in range(num_steps):
+            normalizer.observe(state)
+            sync.step()
+    """
+
+    def __init__(
+        self, stats, moments, worker_id, interval=1, pull=True, own_initial=False
+    ):
+        self.stats = stats
+        self.moments = moments
+        self.worker_id = worker_id
+        self.interval = interval
+        self.pull = pull
+        self.calls = 0
+        # Summary of the samples in stats that were already published
+        self.base = stats.get_moments()
+        self.own = self.base if own_initial else zero_moments(moments.shape)
+
+    def step(self):
+        self.calls += 1
+        if self.calls % self.interval == 0:
+            self.sync()
+
+    def sync(self):
+        current = self.stats.get_moments()
+        self.own = merge_moments(self.own, subtract_moments(current, self.base))
+        self.moments.publish(self.worker_id, self.own)
+        if self.pull:
+            self.stats.set_moments(self.moments.gather())
+            current = self.stats.get_moments()
+        self.base = current
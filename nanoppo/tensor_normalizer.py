@@ -0,0 +1,63 @@
+import torch
+
+
+class TensorNormalizer:
+    """
+    Normalizer on torch tensors for rollouts that stay on the device.
+
+    observe() takes a [batch, dim] tensor and merges its moments into the
+    running statistics (Chan et al.), which matches calling Normalizer.observe
+    once per row.
+
+    With num_groups, statistics are kept separately for num_groups contiguous
+    blocks of the batch, e.g. one block of environments per seed.
+    """
+
+    def __init__(self, dim, device="cpu", num_groups=None):
+        self.num_groups = num_groups
+        shape = (dim,) if num_groups is None else (num_groups, dim)
+        self.n = torch.zeros(shape, device=device)
+        self.mean = torch.zeros(shape, device=device)
+        self.mean_diff = torch.zeros(shape, device=device)
+        self.variance = torch.zeros(shape, device=device)
+
+    def _grouped(self, x):
+        if self.num_groups is None:
+            return x.reshape(-1, self.mean.shape[-1])
+        return x.reshape(self.num_groups, -1, self.mean.shape[-1])
+
+    def observe(self, x):
+        """Update statistics with a batch of observations"""
+        x = self._grouped(x)
+        batch_n = x.shape[-2]
+        batch_mean = x.mean(dim=-2)
+        batch_mean_diff = ((x - batch_mean.unsqueeze(-2)) ** 2).sum(dim=-2)
+        n = self.n + batch_n
+        delta = batch_mean - self.mean
+        self.mean_diff += batch_mean_diff + delta**2 * self.n * batch_n / n
+        self.mean += delta * batch_n / n
+        self.n = n
+        self.variance = (self.mean_diff / self.n).clamp(min=1e-2)
+
+    def normalize(self, inputs):
+        """Normalize input using running mean and variance"""
+        if self.num_groups is None:
+            return (inputs - self.mean) / torch.sqrt(self.variance)
+        grouped = self._grouped(inputs)
+        v = (grouped - self.mean.unsqueeze(-2)) / torch.sqrt(self.variance).unsqueeze(-2)
+        return v.reshape(inputs.shape)
+
+    def get_state(self):
+        return {
+            "n": self.n.cpu().numpy(),
+            "mean": self.mean.cpu().numpy(),
+            "mean_diff": self.mean_diff.cpu().numpy(),
+            "variance": self.variance.cpu().numpy(),
+        }
+
+    def set_state(self, state):
+        device = self.mean.device
+        self.n = torch.as_tensor(state["n"], device=device)
+        self.mean = torch.as_tensor(state["mean"], device=device)
+        self.mean_diff = torch.as_tensor(state["mean_diff"], device=device)
+        self.variance = torch.as_tensor(state["variance"], device=device)
@@ -0,0 +1,236 @@
+import click
+import torch
+from nanoppo.continuous_action_ppo import PPOAgent
+from nanoppo.envs.torch_point_mass import TORCH_ENVS
+from nanoppo.tensor_normalizer import TensorNormalizer
+from nanoppo.phase_timer import PhaseTimer
+from nanoppo.ppo_utils import compute_gae_batched
+
+
+class TensorRolloutCollector:
+    """
+    Collect fixed-length rollouts from a batched torch environment (see
+    nanoppo.envs.torch_point_mass). Policy, normalizer and environment all work
+    on [num_envs, ...] tensors, so a rollout does not convert to NumPy or sync
+    with the host.
+
+    Parameters:
+    - env (TorchPointMassEnv): Batched environment.
+    - policy (ActorCritic): Policy with act() and get_value().
+    - normalizer (TensorNormalizer): Optional observation normalizer.
+    - num_steps (int): Steps per environment in each rollout.
+    """
+
+    def __init__(self, env, policy, normalizer=None, num_steps=200):
+        self.env = env
+        self.policy = policy
+        self.normalizer = normalizer
+        self.num_steps = num_steps
+        self.obs = None
+        self.episode_rewards = torch.zeros(env.num_envs, device=env.device)
+
+    def _normalize(self, obs):
+        if self.normalizer is None:
+            return obs
+        self.normalizer.observe(obs)
+        return self.normalizer.normalize(obs)
+
+    @torch.no_grad()
+    def collect(self):
+        """
+        Returns:
+        - dict of [num_steps, num_envs, ...] tensors: states, actions, logprobs,
+          rewards, masks and values, plus next_states, next_value ([num_envs])
+          and episode_rewards, the returns of the episodes that finished. The
+          [num_steps, num_envs] episode_ends mask and episode_returns keep the
+          environment index of each finished episode.
+        """
+        env, policy = self.env, self.policy
+        if self.obs is None:
+            self.obs = self._normalize(env.reset())
+
+        T, N = self.num_steps, env.num_envs
+        device = env.device
+        states = torch.empty(T, N, self.obs.shape[-1], device=device)
+        next_states = torch.empty_like(states)
+        actions = torch.empty(T, N, env.action_dim, device=device)
+        logprobs = torch.empty(T, N, device=device)
+        rewards = torch.empty(T, N, device=device)
+        masks = torch.empty(T, N, device=device)
+        values = torch.empty(T, N, device=device)
+        finished = torch.empty(T, N, dtype=torch.bool, device=device)
+        finished_rewards = torch.empty(T, N, device=device)
+
+        obs = self.obs
+        for t in range(T):
+            action, logprob = policy.act(obs)
+            states[t] = obs
+            actions[t] = action
+            logprobs[t] = logprob
+            values[t] = policy.get_value(obs).squeeze(-1)
+
+            next_obs, reward, terminated, truncated, final_obs = env.step(action)
+            done = terminated | truncated
+            rewards[t] = reward
+            masks[t] = (~done).float()
+            self.episode_rewards += reward
+            finished[t] = done
+            finished_rewards[t] = self.episode_rewards
+            self.episode_rewards = torch.where(
+                done, torch.zeros_like(self.episode_rewards), self.episode_rewards
+            )
+            obs = self._normalize(next_obs)
+            # Scaled like states, with the statistics that scaled next_obs
+            if self.normalizer is not None:
+                final_obs = self.normalizer.normalize(final_obs)
+            next_states[t] = final_obs
+        self.obs = obs
+
+        return {
+            "states": states,
+            "actions": actions,
+            "logprobs": logprobs,
+            "rewards": rewards,
+            "masks": masks,
+            "values": values,
+            "next_states": next_states,
+            "next_value": policy.get_value(obs).squeeze(-1),
+            "episode_rewards": finished_rewards[finished],
+            "episode_ends": finished,
+            "episode_returns": finished_rewards,
+        }
+
+
+def train_tensor_agent(
+    env_name="PointMass1D-v0",
+    num_envs=64,
+    num_steps=200,
+    iterations=50,
+    n_latent_var=64,
+    policy_lr=0.0005,
+    value_lr=0.0005,
+    betas=(0.9, 0.999),
+    gamma=0.99,
+    tau=0.95,
+    K_epochs=4,
+    eps_clip=0.2,
+    vl_coef=0.5,
+    el_coef=0.001,
+    max_episode_steps=200,
+    compile_step=False,
+    log_interval=10,
+    device="cpu",
+    phase_timer=None,
+):
+    """
+    Train the continuous PPOAgent on a torch implementation of a PointMass
+    environment, with num_envs environments stepped as one batch.
+
+    Returns:
+    - (PPOAgent, list of mean episode rewards per iteration)
+    """
+    env = TORCH_ENVS[env_name](
+        num_envs,
+        max_episode_steps=max_episode_steps,
+        device=device,
+        compile_step=compile_step,
+    )
+    state_normalizer = TensorNormalizer(env.state_dim, device=device)
+    ppo = PPOAgent(
+        env.state_dim,
+        env.action_dim,
+        n_latent_var,
+        None,
+        policy_lr,
+        value_lr,
+        betas,
+        gamma,
+        K_epochs,
+        eps_clip,
+        state_normalizer,
+        action_low=env.action_low.cpu().numpy(),
+        action_high=env.action_high.cpu().numpy(),
+        vl_coef=vl_coef,
+        el_coef=el_coef,
+        device=device,
+    )
+    collector = TensorRolloutCollector(env, ppo.policy, state_normalizer, num_steps)
+
+    if phase_timer is None:
+        phase_timer = PhaseTimer()
+    collect_phase = phase_timer.phase("collect")
+    gae_phase = phase_timer.phase("gae")
+    update_phase = phase_timer.phase("update")
+
+    reward_history = []
+    for iteration in range(1, iterations + 1):
+        with collect_phase:
+            rollout = collector.collect()
+        with gae_phase:
+            returns = compute_gae_batched(
+                rollout["next_value"],
+                rollout["rewards"],
+                rollout["masks"],
+                rollout["values"],
+                gamma=gamma,
+                tau=tau,
+            )
+        with update_phase:
+            ppo.update(
+                rollout["states"].flatten(0, 1),
+                rollout["actions"].flatten(0, 1),
+                returns=returns.flatten(),
+                next_states=rollout["next_states"].flatten(0, 1),
+                dones=1 - rollout["masks"].flatten(),
+            )
+
+        episode_rewards = rollout["episode_rewards"]
+        if len(episode_rewards) > 0:
+            reward_history.append(episode_rewards.mean().item())
+        if log_interval > 0 and iteration % log_interval == 0:
+            steps_per_sec = iteration * num_steps * num_envs / phase_timer.elapsed()
+            print(
+                "Iteration {} \t episodes: {} \t avg reward: {:.3f} \t steps/s: {:.1f}".format(
+                    iteration,
+                    len(episode_rewards),
+                    reward_history[-1] if reward_history else float("nan"),
+                    steps_per_sec,
+                )
+            )
+            print("Phase times", phase_timer.format())
+    return ppo, reward_history
+
+
+@click.command()
+@click.option(
+    "--env_name", default="PointMass1D-v0", type=click.Choice(list(TORCH_ENVS))
+)
+@click.option(
+    "--num_envs", default=64, help="Number of environments stepped as a batch."
+)
+@click.option("--num_steps", default=200, help="Steps per environment per iteration.")
+@click.option("--iterations", default=50, help="Number of rollout/update iterations.")
+@click.option(
+    "--device", default="cpu", help="Torch device for env, policy and normalizer."
+)
+@click.option(
+    "--compile_step",
+    is_flag=True,
+    default=False,
+    help="torch.compile the env dynamics.",
+)
+@click.option("--log_interval", default=10, help="Logging interval.")
+def cli(env_name, num_envs, num_steps, iterations, device, compile_step, log_interval):
+    train_tensor_agent(
+        env_name=env_name,
+        num_envs=num_envs,
+        num_steps=num_steps,
+        iterations=iterations,
+        device=device,
+        compile_step=compile_step,
+        log_interval=log_interval,
+    )
+
+
+if __name__ == "__main__":
+    cli()
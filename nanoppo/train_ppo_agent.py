@@ -1,13 +1,17 @@
+import numpy as np
 import torch
 import os
 import pickle
 import click
-import wandb
+from contextlib import nullcontext
 from nanoppo.continuous_action_ppo import PPOAgent
 from nanoppo.normalizer import Normalizer
 from nanoppo.ppo_utils import compute_gae
 from nanoppo.environment_manager import EnvironmentManager
 from nanoppo.ppo_utils import get_grad_norm
+from nanoppo.wandb_logger import WandBLogger
+from nanoppo.phase_timer import PhaseTimer, TrainingProfiler
+from nanoppo.resource_config import ResourceConfig
 
 # Memory for PPO
 class PPOMemory:
@@ -18,6 +22,8 @@ class PPOMemory:
         self.next_states = []
         self.rewards = []
         self.is_terminals = []
+        # Ends of episodes, also by truncation or the step limit
+        self.episode_ends = []
         self.device = device
 
     def clear(self):
@@ -27,8 +33,11 @@ class PPOMemory:
         del self.next_states[:]
         del self.rewards[:]
         del self.is_terminals[:]
+        del self.episode_ends[:]
 
-    def append(self, state, action, logprob, next_state, reward, is_terminal):
+    def append(
+        self, state, action, logprob, next_state, reward, is_terminal, episode_end=None
+    ):
         assert (
             len(self.states)
             == len(self.actions)
@@ -36,6 +45,7 @@ class PPOMemory:
             == len(self.next_states)
             == len(self.rewards)
             == len(self.is_terminals)
+            == len(self.episode_ends)
         )
         self.states.append(state)
         self.actions.append(action)
@@ -47,6 +57,10 @@ class PPOMemory:
         self.is_terminals.append(
             torch.tensor(is_terminal, dtype=torch.float32).to(self.device)
         )  # Convert to tensor here
+        self.episode_ends.append(is_terminal if episode_end is None else episode_end)
+
+    def get_episode_ends(self):
+        return torch.tensor(self.episode_ends, dtype=torch.float32, device=self.device)
 
     def get(self):
         return (
@@ -84,11 +98,52 @@ def train_agent(
     wandb_log=False,
     device=None,
     debug=False,
+    phase_timer=None,
+    profile_iterations=0,
+    report_func=None,
+    bf16=False,
+    resource_config=None,
+    target_kl=None,
+    context_length=None,
+    checkpoint_attention=False,
+    num_envs=1,
+    min_ready_envs=None,
+    env_step_timeout=None,
+    seed=None,
 ):
+    """
+    Parameters:
+    - report_func (callable): Called after every episode with the keyword
+      arguments mean_reward (average of the last 30 episodes), episode_reward
+      and episode_length.
+    - bf16 (bool): Run the forward/backward passes of the PPO update under
+      bfloat16 autocast.
+    - resource_config (ResourceConfig): Thread counts and CPU affinity for
+      acting and learning, torch defaults if None.
+    - target_kl (float): Stop the K_epochs loop of an update early once the
+      approximate KL exceeds 1.5 * target_kl.
+    - context_length (int): Context window of a sequence policy_class such as
+      ActorCriticCausalAttention, the policy's default if None.
+    - checkpoint_attention (bool): Recompute the attention activations of a
+      sequence policy in backward instead of keeping them.
+    - num_envs (int): Copies of the env stepped in worker processes, the env
+      runs in this process if 1. Episodes are counted as they finish in any
+      env and end after max_timesteps steps.
+    - min_ready_envs (int): With num_envs > 1, act as soon as this many envs
+      finished their step instead of waiting for all of them, so slow env
+      steps do not hold up the others. Waits for all envs if None.
+    - env_step_timeout (float): Seconds after which a hung env worker is
+      restarted and its episode truncated.
+    - seed (int): Seeds the first reset of the env, or of env worker i with
+      seed + i. Torch and NumPy are seeded by the caller, e.g. with set_seed.
+    """
     if device is None:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     # Setting up the environment and the agent
     env = EnvironmentManager(env_name, env_config).setup_env()
+    if seed is not None:
+        # Later unseeded resets continue from the seeded generator
+        env.reset(seed=seed)
     state_dim = env.observation_space.shape[-1]
     action_dim = env.action_space.shape[0]
     print("state_dim", state_dim)
@@ -100,7 +155,7 @@ def train_agent(
     model_file = f"{checkpoint_path}/models.pth"
     metrics_file = f"{checkpoint_path}/metrics.pkl"
     if wandb_log:
-        wandb.init(
+        WandBLogger.init(
             project="nanoPPO",
             name=env_name,
             config={
@@ -135,7 +190,11 @@ def train_agent(
         lr_scheduler=lr_scheduler,
         device=device,
         wandb_log=wandb_log,
-        debug = debug
+        debug = debug,
+        bf16=bf16,
+        target_kl=target_kl,
+        context_length=context_length,
+        checkpoint_attention=checkpoint_attention,
     )
     print(policy_lr, value_lr, betas)
     print('ppo use device', ppo.device)
@@ -159,50 +218,136 @@ def train_agent(
 
     ppo_memory = PPOMemory(device= device)
 
-    # Training loop
-    time_step = 0
-    avg_length_list = []
-    cumulative_reward_list = []  # Initialize cumulative reward
-    for episode in range(start_episode, max_episodes + start_episode):
-        state, info = env.reset()
-        state_normalizer.observe(state)
-        state = state_normalizer.normalize(state)
-
-        total_reward = 0
-        state = torch.FloatTensor(state).to(device)
-        for t in range(max_timesteps):
-            action, log_prob = ppo.policy.act(state)
-
-            action_np = action.detach().cpu().numpy()
-            if len(action_np.shape) > 1:
-                # (1, action_dim) -> (action_dim,)
-                action_np = action_np.squeeze()
-            next_state, reward, done, truncated, _ = env.step(action_np)
-            state_normalizer.observe(next_state)
-            next_state = state_normalizer.normalize(next_state)
-
-            total_reward += reward
-            next_state = torch.FloatTensor(next_state).to(device)
-            ppo_memory.append(state, action, log_prob, next_state, reward, done)
-
-            state = next_state
-            time_step += 1
-
-            # update if it's time
-            if time_step % update_timestep == 0:
-                try:
-                    # Get state values for all states
-                    next_value = ppo.policy.get_value(next_state).detach().item()
-                    values = [
-                        ppo.policy.get_value(state).item()
-                        for state in ppo_memory.states
-                    ]
-                    masks = [1 - terminal.item() for terminal in ppo_memory.is_terminals]
-                    returns = compute_gae(
-                        next_value, ppo_memory.rewards, masks, values, gamma=gamma, tau=tau
+    env_pool = None
+    if num_envs > 1:
+        if min_ready_envs is None:
+            min_ready_envs = num_envs
+        if min_ready_envs < num_envs and ppo.context_length is not None:
+            raise ValueError(
+                "min_ready_envs < num_envs needs a policy without a context window"
+            )
+        env_pool = EnvironmentManager(env_name, env_config).setup_env_pool(
+            num_envs,
+            seed=seed,
+            cores=resource_config.env_cores if resource_config else None,
+            max_episode_steps=min(
+                max_timesteps, env.spec.max_episode_steps or max_timesteps
+            ),
+            observation_space=env.observation_space,
+            action_space=env.action_space,
+            step_timeout=env_step_timeout,
+        )
+
+    if resource_config is not None:
+        resource_config.apply()
+        acting, learning = resource_config.acting(), resource_config.learning()
+        stepping = resource_config.stepping()
+    else:
+        acting = learning = stepping = nullcontext()
+
+    # Time per phase, reported with the periodic log line
+    if phase_timer is None:
+        phase_timer = PhaseTimer()
+    act_phase = phase_timer.phase("act")
+    env_phase = phase_timer.phase("env")
+    memory_phase = phase_timer.phase("memory")
+    gae_phase = phase_timer.phase("gae")
+    update_phase = phase_timer.phase("update")
+    logging_phase = phase_timer.phase("logging")
+    checkpoint_phase = phase_timer.phase("checkpoint")
+    profiler = TrainingProfiler(
+        profile_iterations, f"{checkpoint_path}/trace.json", phase_timer
+    )
+    try:
+        profiler.start()
+
+        # Training loop
+        time_step = 0
+        total_steps = 0
+        total_updates = 0
+        last_log = (phase_timer.elapsed(), 0, 0)
+        avg_length_list = []
+        cumulative_reward_list = []  # Initialize cumulative reward
+        def run_episode():
+            """Run one episode in env, update every update_timestep steps."""
+            nonlocal time_step, total_steps, total_updates
+            with env_phase, stepping:
+                state, info = env.reset()
+                state_normalizer.observe(state)
+                state = state_normalizer.normalize(state)
+
+            total_reward = 0
+            state = torch.FloatTensor(state).to(device)
+            ppo.start_episode()
+            for t in range(max_timesteps):
+                with act_phase, acting:
+                    action, log_prob = ppo.act(state)
+
+                    action_np = action.detach().cpu().numpy()
+                    if len(action_np.shape) > 1:
+                        # (1, action_dim) -> (action_dim,)
+                        action_np = action_np.squeeze(0)
+                with env_phase, stepping:
+                    next_state, reward, done, truncated, _ = env.step(action_np)
+                    state_normalizer.observe(next_state)
+                    next_state = state_normalizer.normalize(next_state)
+
+                total_reward += reward
+                with memory_phase:
+                    next_state = torch.FloatTensor(next_state).to(device)
+                    ppo_memory.append(
+                        state,
+                        action,
+                        log_prob,
+                        next_state,
+                        reward,
+                        done,
+                        episode_end=done or truncated or t == max_timesteps - 1,
                     )
+
+                state = next_state
+                time_step += 1
+                total_steps += 1
+
+                # update if it's time
+                if time_step % update_timestep == 0:
+                    run_update([(ppo_memory, next_state)])
+                    time_step = 0
+                    total_updates += 1
+                if done or truncated:
+                    break
+            return total_reward, t + 1
+
+        def run_update(streams):
+            """Update on the rollouts of streams, one (PPOMemory, next_state) per env."""
+            streams = [(memory, next_state) for memory, next_state in streams if memory.states]
+            try:
+                with gae_phase, learning:
+                    returns, episode_ends = [], []
+                    for memory, next_state in streams:
+                        ends = memory.get_episode_ends()
+                        # Get state values for all states
+                        if ppo.context_length is not None:
+                            context_values, next_value = ppo.get_context_values(
+                                torch.stack(memory.states), ends, next_state
+                            )
+                            values = context_values.tolist()
+                        else:
+                            next_value = ppo.policy.get_value(next_state).detach().item()
+                            values = [
+                                ppo.policy.get_value(state).item()
+                                for state in memory.states
+                            ]
+                        masks = [1 - terminal.item() for terminal in memory.is_terminals]
+                        returns += compute_gae(
+                            next_value, memory.rewards, masks, values, gamma=gamma, tau=tau
+                        )
+                        # Context windows do not run from one env's rollout into the next
+                        ends[-1] = 1
+                        episode_ends.append(ends)
                     torch_returns = torch.tensor(returns, dtype=torch.float32).to(device)
-    
+
+                with update_phase, learning:
                     (
                         states,
                         actions,
@@ -210,85 +355,214 @@ def train_agent(
                         next_states,
                         rewards,
                         dones,
-                    ) = ppo_memory.get()
+                    ) = (torch.cat(batch) for batch in zip(*(m.get() for m, _ in streams)))
                     ppo.update(
                         states,
                         actions,
                         returns=torch_returns,
                         next_states=next_states,
                         dones=dones,
+                        episode_ends=torch.cat(episode_ends),
                     )
-                    ppo_memory.clear()
+                    for memory, _ in streams:
+                        memory.clear()
+            except Exception as e:
+                print("ppo.update error")
+                print(e)
+                breakpoint()
+                raise e
+
+        def pool_episodes():
+            """
+            Step the envs of env_pool, keep the transitions of each env in its own
+            memory and update every update_timestep transitions. Yields the reward
+            and length of every finished episode.
+            """
+            nonlocal time_step, total_steps, total_updates
+            memories = [PPOMemory(device=device) for _ in range(num_envs)]
+            episode_rewards = [0.0] * num_envs
+            episode_lengths = [0] * num_envs
+
+            def normalize(observations):
+                for observation in observations:
+                    state_normalizer.observe(observation)
+                return torch.FloatTensor(state_normalizer.normalize(observations)).to(device)
+
+            with env_phase, stepping:
+                observations, _ = env_pool.reset()
+                states = normalize(observations)
+            ppo.start_episode()
+            with act_phase, acting:
+                actions, log_probs = (x.detach() for x in ppo.act(states))
+            env_ids = np.arange(num_envs)
+            env_pool.step_async(actions.cpu().numpy(), env_ids)
+            while True:
+                with env_phase, stepping:
+                    (
+                        env_ids,
+                        observations,
+                        rewards,
+                        terminated,
+                        truncated,
+                        infos,
+                    ) = env_pool.step_any(min_ready_envs)
+                    ends = terminated | truncated
+                    next_states = normalize(observations)
+                    # Transitions that end an episode end in its last observation
+                    final_states = next_states.clone()
+                    for k in np.flatnonzero(ends):
+                        final_states[k] = torch.FloatTensor(
+                            state_normalizer.normalize(infos[k]["final_observation"])
+                        )
+
+                with memory_phase:
+                    # Rows of states, actions and log_probs are already in the
+                    # memories, the next states go into a new tensor
+                    current = states.clone()
+                    for k, i in enumerate(env_ids):
+                        if infos[k].get("timeout"):
+                            # The step never finished, the episode ends with the transition before
+                            if memories[i].episode_ends:
+                                memories[i].episode_ends[-1] = True
+                        else:
+                            memories[i].append(
+                                states[i],
+                                actions[i],
+                                log_probs[i],
+                                final_states[k],
+                                rewards[k],
+                                terminated[k],
+                                episode_end=ends[k],
+                            )
+                            episode_rewards[i] += rewards[k]
+                            episode_lengths[i] += 1
+                            time_step += 1
+                            total_steps += 1
+                        current[i] = next_states[k]
+                    states = current
+
+                # update if it's time
+                if time_step >= update_timestep:
+                    run_update([(memories[i], states[i]) for i in range(num_envs)])
                     time_step = 0
-                except Exception as e:
-                    print("ppo.update error")
-                    print(e)
-                    breakpoint()
-                    raise e
-            if done or truncated:
-                break
-        avg_length_list.append(t + 1)
-
-        cumulative_reward_list.append(total_reward)
-
-        num_cumulative_rewards = len(cumulative_reward_list)
-        avg_reward = float(sum(cumulative_reward_list[-30:]) / 30)
-        avg_length = int(sum(avg_length_list) / len(avg_length_list))
-        action_mu_grad_norm = get_grad_norm(ppo.policy.action_mu.parameters())
-        action_log_std_grad_norm = get_grad_norm(ppo.policy.action_log_std.parameters())
-        value_grad_norm = get_grad_norm(ppo.policy.value_layer.parameters())
-        # Logging
-        if log_interval > 0 and (episode % log_interval == 0):
-            sample_length = len(avg_length_list)
-            avg_length = int(sum(avg_length_list) / sample_length)
-            print(
-                (
-                    "Episode {} \t samples:{} avg steps: {} \t avg reward: {:.3f} \t best reward: {:.3f} \t"
-                    "action_mu_grad_norm: {:.2f} \t action_log_std_grad_norm: {:.2f} \t value_grad_norm: {:.2f} \t"
-                    "num cumulative rewards: {}"
-                ).format(
-                    episode,
-                    sample_length,
-                    avg_length,
-                    avg_reward,
-                    best_reward,
-                    action_mu_grad_norm,
-                    action_log_std_grad_norm,
-                    value_grad_norm,
-                    num_cumulative_rewards
+                    total_updates += 1
+
+                for k, i in enumerate(env_ids):
+                    if ends[k] and episode_lengths[i] > 0:
+                        yield episode_rewards[i], episode_lengths[i]
+                        episode_rewards[i], episode_lengths[i] = 0.0, 0
+
+                with act_phase, acting:
+                    if len(env_ids) == num_envs:
+                        done = np.zeros(num_envs, dtype=bool)
+                        done[env_ids] = ends
+                        ppo.start_episode(torch.as_tensor(done, device=device))
+                        env_ids = np.arange(num_envs)
+                        actions, log_probs = (x.detach() for x in ppo.act(states))
+                    else:
+                        index = torch.as_tensor(env_ids, device=device)
+                        actions, log_probs = actions.clone(), log_probs.clone()
+                        actions[index], log_probs[index] = (
+                            x.detach() for x in ppo.act(states[index])
+                        )
+                env_pool.step_async(actions[env_ids].cpu().numpy(), env_ids)
+
+        if env_pool is not None:
+            episodes = pool_episodes()
+        for episode in range(start_episode, max_episodes + start_episode):
+            if env_pool is not None:
+                total_reward, episode_length = next(episodes)
+            else:
+                total_reward, episode_length = run_episode()
+            avg_length_list.append(episode_length)
+
+            cumulative_reward_list.append(total_reward)
+
+            profiler.step()
+
+            num_cumulative_rewards = len(cumulative_reward_list)
+            avg_reward = float(sum(cumulative_reward_list[-30:]) / 30)
+            if report_func:
+                report_func(
+                    mean_reward=avg_reward,
+                    episode_reward=float(total_reward),
+                    episode_length=episode_length,
                 )
-            )
+            avg_length = int(sum(avg_length_list) / len(avg_length_list))
+            with logging_phase:
+                action_mu_grad_norm = get_grad_norm(ppo.policy.action_mu.parameters())
+                action_log_std_grad_norm = get_grad_norm(ppo.policy.action_log_std.parameters())
+                value_grad_norm = get_grad_norm(ppo.policy.value_layer.parameters())
+                # Logging
+                if log_interval > 0 and (episode % log_interval == 0):
+                    sample_length = len(avg_length_list)
+                    avg_length = int(sum(avg_length_list) / sample_length)
+                    now = phase_timer.elapsed()
+                    interval = max(now - last_log[0], 1e-12)
+                    steps_per_sec = (total_steps - last_log[1]) / interval
+                    updates_per_sec = (total_updates - last_log[2]) / interval
+                    last_log = (now, total_steps, total_updates)
+                    print(
+                        (
+                            "Episode {} \t samples:{} avg steps: {} \t avg reward: {:.3f} \t best reward: {:.3f} \t"
+                            "action_mu_grad_norm: {:.2f} \t action_log_std_grad_norm: {:.2f} \t value_grad_norm: {:.2f} \t"
+                            "num cumulative rewards: {} \t steps/s: {:.1f} \t updates/s: {:.2f}"
+                        ).format(
+                            episode,
+                            sample_length,
+                            avg_length,
+                            avg_reward,
+                            best_reward,
+                            action_mu_grad_norm,
+                            action_log_std_grad_norm,
+                            value_grad_norm,
+                            num_cumulative_rewards,
+                            steps_per_sec,
+                            updates_per_sec,
+                        )
+                    )
+                    print("Phase times", phase_timer.format())
 
-        if (checkpoint_interval > 0 and (avg_reward > best_reward) and (num_cumulative_rewards > 30)):
-            print("avg_reward", avg_reward, "> best_reward", best_reward)
-            best_reward = avg_reward
-            metrics = {"train_reward": avg_reward, "best_reward": best_reward, "episode": episode, "stop_reward":stop_reward}
-            pickle.dump(metrics, open(metrics_file, "wb"))
-            ppo.save(model_file)
-            print("Saved best weights!", best_reward, model_file, metrics_file)
-        
-        if stop_reward and (avg_reward > stop_reward) and (num_cumulative_rewards > 30):
-            print("avg_reward", avg_reward, "> stop_reward", stop_reward)
-            best_reward = avg_reward
-            metrics = {"train_reward":avg_reward, "best_reward": best_reward, "episode": episode, "stop_reward":stop_reward}
-            pickle.dump(metrics, open(metrics_file, "wb"))
-            ppo.save(model_file)
-            print("Saved best weights!", best_reward, model_file, metrics_file)
-            break
-
-        if wandb_log:
-            wandb.log(
-                {
-                    "avg_reward": avg_reward,
-                    "best_reward": best_reward,
-                    "avg_length": avg_length,
-                    "action_mu_grad_norm": action_mu_grad_norm,
-                    "action_log_std_grad_norm": action_log_std_grad_norm,
-                    "value_grad_norm": value_grad_norm,
-                }
-            )
+            with checkpoint_phase:
+                if (checkpoint_interval > 0 and (avg_reward > best_reward) and (num_cumulative_rewards > 30)):
+                    print("avg_reward", avg_reward, "> best_reward", best_reward)
+                    best_reward = avg_reward
+                    metrics = {"train_reward": avg_reward, "best_reward": best_reward, "episode": episode, "stop_reward":stop_reward}
+                    pickle.dump(metrics, open(metrics_file, "wb"))
+                    ppo.save(model_file)
+                    print("Saved best weights!", best_reward, model_file, metrics_file)
+
+                if stop_reward and (avg_reward > stop_reward) and (num_cumulative_rewards > 30):
+                    print("avg_reward", avg_reward, "> stop_reward", stop_reward)
+                    best_reward = avg_reward
+                    metrics = {"train_reward":avg_reward, "best_reward": best_reward, "episode": episode, "stop_reward":stop_reward}
+                    pickle.dump(metrics, open(metrics_file, "wb"))
+                    ppo.save(model_file)
+                    print("Saved best weights!", best_reward, model_file, metrics_file)
+                    break
+
+            if wandb_log:
+                with logging_phase:
+                    WandBLogger.log(
+                        {
+                            "avg_reward": avg_reward,
+                            "best_reward": best_reward,
+                            "avg_length": avg_length,
+                            "action_mu_grad_norm": action_mu_grad_norm,
+                            "action_log_std_grad_norm": action_log_std_grad_norm,
+                            "value_grad_norm": value_grad_norm,
+                        }
+                    )
+    finally:
+        # Also on errors, so the process is not left throttled
+        profiler.stop()
+        if env_pool is not None:
+            env_pool.close()
+        if resource_config is not None:
+            resource_config.restore()
+    print("Phase times", phase_timer.format())
     if wandb_log:
-        wandb.finish()
+        WandBLogger.finish()
     return ppo, model_file, metrics_file
 
 
@@ -310,6 +584,41 @@ def train_agent(
 @click.option(
     "--wandb_log", is_flag=True, default=False, help="Flag to log results to wandb."
 )
+@click.option(
+    "--profile_iterations",
+    default=0,
+    help="Profile the first N episodes with torch.profiler and save a Chrome trace.",
+)
+@click.option(
+    "--bf16",
+    is_flag=True,
+    default=False,
+    help="Run the PPO update forward/backward under bfloat16 autocast.",
+)
+@click.option(
+    "--act_threads", default=0, help="torch threads for acting, 0 for the torch default."
+)
+@click.option(
+    "--learn_threads",
+    default=0,
+    help="torch threads for GAE and updates, 0 for the torch default.",
+)
+@click.option(
+    "--cores", default=None, help="Comma-separated CPU affinity, e.g. 0,1,2,3."
+)
+@click.option(
+    "--target_kl",
+    default=None,
+    type=float,
+    help="Stop the epochs of an update early at this approximate KL.",
+)
+@click.option("--num_envs", default=1, help="Env copies in worker processes.")
+@click.option(
+    "--min_ready_envs",
+    default=None,
+    type=int,
+    help="Act once this many envs finished their step, all of them if unset.",
+)
 def cli(
     env_name,
     max_episodes,
@@ -320,7 +629,22 @@ def cli(
     checkpoint_interval,
     log_interval,
     wandb_log,
+    profile_iterations,
+    bf16,
+    act_threads,
+    learn_threads,
+    cores,
+    target_kl,
+    num_envs,
+    min_ready_envs,
 ):
+    resource_config = None
+    if act_threads or learn_threads or cores:
+        resource_config = ResourceConfig(
+            act_threads=act_threads or None,
+            learn_threads=learn_threads or None,
+            cores=None if cores is None else [int(c) for c in cores.split(",")],
+        )
     ppo, model_file, metrics_file = train_agent(
         env_name=env_name,
         max_episodes=max_episodes,
@@ -331,6 +655,12 @@ def cli(
         checkpoint_interval=checkpoint_interval,
         log_interval=log_interval,
         wandb_log=wandb_log,
+        profile_iterations=profile_iterations,
+        bf16=bf16,
+        resource_config=resource_config,
+        target_kl=target_kl,
+        num_envs=num_envs,
+        min_ready_envs=min_ready_envs,
         device='cpu'
     )
     # Load the best weights
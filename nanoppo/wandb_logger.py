@@ -1,24 +1,29 @@
-import wandb
 import numpy as np
 
 
 class WandBLogger:
     @staticmethod
     def init(project, name, config):
+        import wandb
+
         wandb.init(project=project, name=name, config=config)
 
     @staticmethod
     def log(data):
+        import wandb
+
         wandb.log(data)
 
     @staticmethod
     def finish():
+        import wandb
+
         wandb.finish()
 
     @staticmethod
     def log_rewards(rewards):
         # Log the rewards during training
-        wandb.log(
+        WandBLogger.log(
             {
                 "Reward/Min": min(rewards),
                 "Reward/Mean": sum(rewards) / len(rewards),
@@ -47,4 +52,4 @@ class WandBLogger:
                 for i, std_val in enumerate(action_std.tolist())
             }
         )
-        wandb.log(log_data)
+        WandBLogger.log(log_data)
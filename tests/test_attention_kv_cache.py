@@ -0,0 +1,49 @@
+import torch
+from nanoppo.policy.actor_critic_causal_attention import ActorCriticCausalAttention
+
+
+def make_policy():
+    torch.manual_seed(0)
+    low, high = torch.full((2,), -1.0), torch.full((2,), 1.0)
+    return ActorCriticCausalAttention(4, 2, 2, low, high, device="cpu")
+
+
+def test_cached_step_matches_full_history():
+    policy = make_policy()
+    num_envs, steps = 3, 40
+    states = torch.randn(steps, num_envs, 4)
+    dones = {(12, 1), (25, 0), (26, 2)}
+    policy.init_cache(num_envs, capacity=8)
+    starts = [0] * num_envs
+    action = torch.zeros(1, 2)
+    with torch.no_grad():
+        for t in range(steps):
+            mu, log_std, value = policy.cached_step(states[t])
+            for b in range(num_envs):
+                history = states[starts[b] : t + 1, b]
+                _, logprob = policy.act(history, action=action)
+                _, cached_logprob = policy._sample(
+                    mu[b : b + 1], log_std[b : b + 1], action
+                )
+                assert torch.allclose(cached_logprob, logprob, atol=1e-5)
+                assert torch.allclose(value[b], policy.get_value(history)[0], atol=1e-5)
+            done = torch.tensor([(t, b) in dones for b in range(num_envs)])
+            policy.reset_cache(done)
+            for b in range(num_envs):
+                if done[b]:
+                    starts[b] = t + 1
+    # The cache grew past its initial capacity
+    assert policy.kv_cache.capacity >= 32
+
+
+def test_act_cached_shapes():
+    policy = make_policy()
+    with torch.no_grad():
+        action, logprob = policy.act_cached(torch.randn(5, 4))
+        assert action.shape == (5, 2) and logprob.shape == (5,)
+        action, logprob = policy.act_cached(torch.randn(4))
+        assert action.shape == (1, 2) and logprob.shape == (1,)
+    assert policy.kv_cache.num_envs == 1
+    assert policy.kv_cache.lengths.tolist() == [1]
+    policy.reset_cache()
+    assert policy.kv_cache.lengths.tolist() == [0]
@@ -0,0 +1,44 @@
+from nanoppo.benchmark import (
+    BENCHMARKS,
+    MEMORY_BENCHMARKS,
+    compare_results,
+    run_benchmarks,
+)
+
+
+def test_run_benchmarks():
+    output = run_benchmarks(
+        ["compute_gae", "actor_critic_act_b64"], repeat=1, min_time=0.01, verbose=False
+    )
+    assert set(output["results"]) == {"compute_gae", "actor_critic_act_b64"}
+    assert output["results"]["compute_gae"]["median"] > 0
+    assert "torch" in output["metadata"]
+
+
+def test_registered_hot_paths():
+    for name in [
+        "compute_gae",
+        "rollout_buffer_push",
+        "rollout_buffer_sample",
+        "ppo_memory_append",
+        "ppo_memory_get",
+        "actor_critic_act_b1",
+        "actor_critic_evaluate_b1024",
+        "normalizer_observe",
+        "state_scaler_scale_state_standard",
+        "ppo_agent_update",
+        "ppo_agent_update_h512_bf16",
+        "attention_update_L1024_checkpoint",
+    ]:
+        assert name in BENCHMARKS
+    assert set(MEMORY_BENCHMARKS) <= set(BENCHMARKS)
+
+
+def test_compare_results():
+    baseline = {"results": {"a": {"median": 1.0}, "b": {"median": 1.0}}}
+    current = {
+        "results": {"a": {"median": 1.1}, "b": {"median": 1.5}, "c": {"median": 9.0}}
+    }
+    regressions = compare_results(current, baseline, tolerance=0.2)
+    assert [r[0] for r in regressions] == ["b"]
+    assert regressions[0][3] == 1.5
@@ -0,0 +1,85 @@
+import numpy as np
+import torch
+from nanoppo.benchmark import make_policy
+from nanoppo.continuous_action_ppo import PPOAgent
+from nanoppo.normalizer import Normalizer
+from nanoppo.policy.actor_critic_causal_attention import ActorCriticCausalAttention
+from nanoppo.ppo_utils import autocast
+from nanoppo.random_utils import set_seed
+from nanoppo.train_ppo_agent import train_agent
+
+
+def test_log_probs_stay_float32_under_autocast():
+    low, high = torch.full((2,), -1.0), torch.full((2,), 1.0)
+    for policy in [
+        make_policy(),
+        ActorCriticCausalAttention(2, 2, 2, low, high, device="cpu"),
+    ]:
+        with autocast("cpu"):
+            logprobs, values = policy.evaluate(torch.randn(8, 2), torch.randn(8, 2))
+            log_prob = policy(torch.randn(8, 2)).log_prob(torch.randn(8, 2))
+        assert logprobs.dtype == values.dtype == log_prob.dtype == torch.float32
+
+
+def make_agent(bf16):
+    torch.manual_seed(0)
+    return PPOAgent(
+        2,
+        2,
+        64,
+        None,
+        0.0005,
+        0.0005,
+        (0.9, 0.999),
+        0.99,
+        4,
+        0.2,
+        Normalizer(2),
+        np.array([-1.0, -1.0]),
+        np.array([1.0, 1.0]),
+        bf16=bf16,
+    )
+
+
+def test_bf16_update_close_to_float32():
+    agents = [make_agent(False), make_agent(True)]
+    initial = [p.detach().clone() for p in agents[0].policy.parameters()]
+    states, actions, returns = (
+        torch.randn(256, 2),
+        torch.randn(256, 2),
+        torch.randn(256),
+    )
+    for agent in agents:
+        agent.update(states, actions, returns, states, torch.zeros(256))
+    for (name, p32), pbf16, p0 in zip(
+        agents[0].policy.named_parameters(), agents[1].policy.parameters(), initial
+    ):
+        assert pbf16.dtype == torch.float32
+        # The bfloat16 update moves the parameters like the float32 one
+        step32, step_bf16 = p32 - p0, pbf16 - p0
+        assert (step_bf16 - step32).norm() < 0.25 * step32.norm(), name
+
+
+def train_rewards(bf16, tmp_path):
+    set_seed(0)
+    rewards = []
+    train_agent(
+        "PointMass1D-v0",
+        max_episodes=60,
+        max_timesteps=50,
+        update_timestep=50,
+        n_latent_var=64,
+        checkpoint_dir=str(tmp_path / f"bf16_{bf16}"),
+        device="cpu",
+        bf16=bf16,
+        report_func=lambda mean_reward, episode_reward, episode_length: rewards.append(
+            episode_reward
+        ),
+    )
+    return np.mean(rewards[-20:])
+
+
+def test_bf16_point_mass_rewards_within_tolerance(tmp_path):
+    float32_reward = train_rewards(False, tmp_path)
+    bf16_reward = train_rewards(True, tmp_path)
+    assert abs(bf16_reward - float32_reward) < 5.0
@@ -0,0 +1,96 @@
+import gym
+import numpy as np
+import torch
+from nanoppo.network_manager import NetworkManager
+from nanoppo.policy.categorical_actor_critic import CategoricalActorCritic
+from nanoppo.ppo_agent import PPOAgent
+
+
+def make_config(checkpoint_dir):
+    config = dict(
+        project="test",
+        env_name="CartPole-v1",
+        env_config=None,
+        hidden_size=32,
+        init_type="default",
+        batch_size=128,
+        rescaling_rewards=False,
+        scale_states="default",
+        metrics_log=False,
+        wandb_log=False,
+        checkpoint_interval=-1,
+        checkpoint_dir=checkpoint_dir,
+        log_interval=5,
+        shape_reward=None,
+        max_timesteps=200,
+        sgd_iters=2,
+        gamma=0.99,
+        vf_coef=0.5,
+        entropy_coef=0.001,
+        max_grad_norm=0.5,
+        use_gae=True,
+        tau=0.95,
+        verbose=0,
+        resume_training=False,
+        resume_epoch=0,
+        report_func=None,
+    )
+    optimizer_config = dict(
+        policy_lr=5e-4,
+        value_lr=5e-4,
+        beta1=0.9,
+        beta2=0.999,
+        epsilon=1e-8,
+        weight_decay=0.0,
+        scheduler=None,
+    )
+    return config, optimizer_config
+
+
+def test_log_probs_match_categorical():
+    torch.manual_seed(0)
+    policy = CategoricalActorCritic(4, 3, 16)
+    states = torch.randn(10, 4)
+    actions, logprobs = policy.act(states)
+    assert actions.shape == (10,)
+    assert ((actions >= 0) & (actions < 3)).all()
+
+    expected = policy(states).log_prob(actions)
+    assert torch.allclose(logprobs, expected, atol=1e-6)
+    eval_logprobs, values = policy.evaluate(states, actions.float())
+    assert torch.allclose(eval_logprobs, expected, atol=1e-6)
+    assert values.shape == (10,)
+
+    action, logprob = policy.act(states[0])
+    assert action.shape == () and logprob.shape == ()
+
+
+def test_network_manager_builds_categorical_policy():
+    env = gym.make("CartPole-v1")
+    _, optimizer_config = make_config("unused")
+    policy, value, optimizer, _, policy_old, value_old = NetworkManager(
+        env, optimizer_config, 16, "default", "cpu"
+    ).setup_networks()
+    assert isinstance(policy, CategoricalActorCritic)
+    assert value is policy.value_layer
+    assert value_old is policy_old.value_layer
+    assert policy_old is not policy
+    assert sum(len(g["params"]) for g in optimizer.param_groups) == len(
+        list(policy.parameters())
+    )
+
+    policy, value, _, _, policy_old, value_old = NetworkManager(
+        gym.make("Pendulum-v1"), optimizer_config, 16, "he", "cpu", network_type="mlp"
+    ).setup_networks()
+    assert value_old is not value
+    for p, q in zip(value.parameters(), value_old.parameters()):
+        assert torch.equal(p, q)
+
+
+def test_config_agent_trains_discrete_env(tmp_path):
+    torch.manual_seed(0)
+    config, optimizer_config = make_config(str(tmp_path))
+    agent = PPOAgent(config, optimizer_config, force_cpu=True)
+    _, _, average_reward, train_iters = agent.train(30)
+    assert train_iters > 0
+    assert np.isfinite(average_reward)
@@ -0,0 +1,136 @@
+import torch
+from nanoppo.policy.actor_critic_causal_attention import ActorCriticCausalAttention
+from nanoppo.ppo_utils import episode_windows
+from nanoppo.train_ppo_agent import train_agent
+
+
+def make_policy(state_dim=4, nhead=2):
+    torch.manual_seed(0)
+    low, high = torch.full((2,), -1.0), torch.full((2,), 1.0)
+    return ActorCriticCausalAttention(state_dim, 2, nhead, low, high, device="cpu")
+
+
+def reference_heads(policy, state):
+    # Separate MultiheadAttention modules with a materialized causal mask
+    length = state.size(1)
+    mask = torch.triu(torch.ones(length, length), diagonal=1).bool()
+    state = policy.positional_encoding(state)
+    outputs = []
+    for layers in (policy.action_mu, policy.action_log_std, policy.value_layer):
+        attn_output, _ = layers[0](state, state, state, attn_mask=mask)
+        outputs.append(layers[1:](attn_output))
+    return outputs
+
+
+def test_fused_attention_matches_multihead_attention():
+    policy = make_policy()
+    state = torch.randn(3, 50, 4)
+    mu, log_std, value = reference_heads(policy, state)
+    with torch.no_grad():
+        dist = policy(state)
+        assert torch.allclose(dist.mean, mu, atol=1e-5)
+        assert torch.allclose(
+            dist.stddev, torch.clamp(log_std.exp(), min=1e-5, max=1e2), atol=1e-5
+        )
+        assert torch.allclose(policy.get_value(state), value[:, -1], atol=1e-5)
+
+        action = torch.randn(3, 2)
+        _, logprobs = policy.act(state, action=action)
+        _, expected = policy._sample(mu[:, -1], log_std[:, -1], action)
+        assert torch.allclose(logprobs, expected, atol=1e-5)
+
+        eval_logprobs, state_values = policy.evaluate(state, action)
+        assert torch.allclose(state_values, value[:, -1, 0], atol=1e-5)
+
+
+def test_gradients_match_multihead_attention():
+    policy = make_policy()
+    state = torch.randn(2, 30, 4)
+    mu, log_std, value = reference_heads(policy, state)
+    (mu.sum() + log_std.exp().sum() + value.sum()).backward()
+    expected = {name: p.grad.clone() for name, p in policy.named_parameters()}
+    policy.zero_grad()
+
+    dist = policy(state)
+    values = policy._attention(policy.positional_encoding(state), ("value_layer",))[0]
+    (
+        dist.mean.sum() + dist.stddev.sum() + policy.value_layer[1:](values).sum()
+    ).backward()
+    for name, p in policy.named_parameters():
+        assert torch.allclose(p.grad, expected[name], atol=1e-4), name
+    # Checkpoints keep the MultiheadAttention layout
+    assert "action_mu.0.in_proj_weight" in policy.state_dict()
+
+
+def test_episode_windows():
+    episode_ends = torch.tensor([0, 0, 1, 0, 0, 0, 0, 0, 1, 0.0])
+    index, valid = episode_windows(episode_ends, 3)
+    assert index.tolist() == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9, -1, -1]]
+    assert valid.sum() == 10
+
+
+def test_windows_match_acting_context():
+    policy = make_policy()
+    policy.context_length = 8
+    steps = 40
+    states = torch.randn(steps, 4)
+    episode_ends = torch.zeros(steps)
+    episode_ends[[13, 30]] = 1
+    actions, logprobs, values = [], [], []
+    with torch.no_grad():
+        for t in range(steps):
+            mu, log_std, value = policy.cached_step(states[t])
+            action, logprob = policy._sample(mu, log_std)
+            actions.append(action[0])
+            logprobs.append(logprob[0])
+            values.append(value[0, 0])
+            policy.reset_cache(episode_ends[t : t + 1])
+
+        index, valid = episode_windows(episode_ends, 8)
+        gather = index.clamp(min=0)
+        window_logprobs, window_values = policy.evaluate_windows(
+            states[gather], torch.stack(actions)[gather]
+        )
+    order = index[valid]
+    assert torch.allclose(
+        window_logprobs[valid], torch.stack(logprobs)[order], atol=1e-5
+    )
+    assert torch.allclose(window_values[valid], torch.stack(values)[order], atol=1e-5)
+    assert torch.allclose(
+        policy.get_value_windows(states[gather])[valid], window_values[valid]
+    )
+
+
+def test_train_agent_with_context_windows(tmp_path):
+    torch.manual_seed(0)
+    ppo, _, _ = train_agent(
+        "PointMass2D-v0",
+        max_episodes=3,
+        policy_class=ActorCriticCausalAttention,
+        n_latent_var=2,
+        max_timesteps=50,
+        update_timestep=40,
+        checkpoint_dir=str(tmp_path),
+        context_length=16,
+        device="cpu",
+    )
+    assert ppo.context_length == ppo.policy.context_length == 16
+    assert ppo.update_stats["epochs"] == 4
+    # The cache was reset after the last update and never outgrew the context
+    assert int(ppo.policy.kv_cache.lengths.max()) <= 16
+
+
+def test_checkpoint_attention_matches_gradients():
+    policy = make_policy()
+    states, actions = torch.randn(3, 16, 4), torch.randn(3, 16, 2)
+    grads = []
+    for checkpoint_attention in (False, True):
+        policy.zero_grad()
+        policy.checkpoint_attention = checkpoint_attention
+        logprobs, values = policy.evaluate_windows(states, actions)
+        (
+            logprobs.sum() + values.sum() + policy.get_value_windows(states).sum()
+        ).backward()
+        grads.append([p.grad.clone() for p in policy.parameters()])
+    for g, g_checkpoint in zip(*grads):
+        assert torch.allclose(g, g_checkpoint, atol=1e-6)
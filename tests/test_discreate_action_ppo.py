@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import torch
 from nanoppo.discrete_action_ppo import PPO
@@ -17,4 +18,82 @@ def test_compute_advantage():
     expected_advantages = torch.tensor(
         [4.9203, 3.9700, 2.000]
     ) 
-    assert torch.isclose(advantages, expected_advantages, atol=1e-4).all()
\ No newline at end of file
+    assert torch.isclose(advantages, expected_advantages, atol=1e-4).all()
+
+def test_discrete_agent_act_and_update():
+    from nanoppo.discrete_action_ppo import DiscretePPOAgent
+
+    torch.manual_seed(0)
+    agent = DiscretePPOAgent(4, 3, minibatch_size=16, K_epochs=2)
+    states = torch.randn(64, 4)
+    actions, log_probs, values = agent.act(states)
+    assert actions.shape == log_probs.shape == values.shape == (64,)
+    assert not log_probs.requires_grad
+    expected = agent.policy(states).gather(1, actions.unsqueeze(1)).log().squeeze(1)
+    assert torch.allclose(log_probs, expected, atol=1e-5)
+    stats = agent.update(states, actions, log_probs, torch.randn(64), torch.randn(64))
+    assert stats["epochs"] == 2
+    assert stats["approx_kl"] >= 0
+
+
+def test_train_discrete_agent(tmp_path):
+    from nanoppo.discrete_action_ppo import DiscretePPOAgent, train_discrete_agent
+
+    ppo, rewards, model_file = train_discrete_agent(
+        num_envs=4,
+        num_steps=64,
+        total_timesteps=4 * 64 * 3,
+        checkpoint_dir=str(tmp_path),
+        seed=0,
+    )
+    assert len(rewards) > 20
+    assert os.path.exists(model_file)
+    loaded = DiscretePPOAgent(4, 2)
+    loaded.load(model_file)
+    states = torch.randn(8, 4)
+    # the checkpoint holds the best weights, which may predate the last update
+    assert loaded.policy(states).shape == ppo.policy(states).shape
+    ppo.save(model_file)
+    loaded.load(model_file)
+    assert torch.allclose(loaded.policy(states), ppo.policy(states))
+
+
+def test_train_discrete_agent_terminated_on_time_limit(tmp_path, monkeypatch):
+    import gym
+    import nanoppo.discrete_action_ppo as discrete_action_ppo
+
+    class GoalAtLimitEnv(gym.Env):
+        """Reaches its goal on the last step allowed by the time limit."""
+
+        observation_space = gym.spaces.Box(-1.0, 1.0, (4,), np.float32)
+        action_space = gym.spaces.Discrete(2)
+
+        def reset(self, seed=None, options=None):
+            super().reset(seed=seed)
+            self.t = 0
+            return np.zeros(4, np.float32), {}
+
+        def step(self, action):
+            self.t += 1
+            return np.ones(4, np.float32), 1.0, self.t == 4, False, {}
+
+    if "GoalAtLimit-v0" not in gym.envs.registry:
+        gym.register("GoalAtLimit-v0", entry_point=GoalAtLimitEnv, max_episode_steps=4)
+    batches = []
+    compute_gae_batched = discrete_action_ppo.compute_gae_batched
+
+    def recording_gae(next_value, rewards, *args):
+        batches.append(rewards.clone())
+        return compute_gae_batched(next_value, rewards, *args)
+
+    monkeypatch.setattr(discrete_action_ppo, "compute_gae_batched", recording_gae)
+    discrete_action_ppo.train_discrete_agent(
+        env_name="GoalAtLimit-v0",
+        num_envs=2,
+        num_steps=8,
+        total_timesteps=2 * 8,
+        checkpoint_dir=str(tmp_path),
+        seed=0,
+    )
+    # Terminated and truncated on the same step, nothing is bootstrapped
+    assert torch.equal(batches[0], torch.ones(8, 2))
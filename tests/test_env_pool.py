@@ -0,0 +1,228 @@
+import time
+from functools import partial
+
+import gym
+import numpy as np
+import pytest
+from nanoppo.env_pool import SubprocEnvPool
+from nanoppo.environment_manager import EnvironmentManager
+
+
+class SleepEnv(gym.Env):
+    """Counts steps and sleeps delay seconds per step, episodes of 3 steps."""
+
+    observation_space = gym.spaces.Box(-np.inf, np.inf, (2,), np.float32)
+    action_space = gym.spaces.Box(-1.0, 1.0, (1,), np.float32)
+
+    def __init__(self, delay=0.0, fail_at=None):
+        self.delay = delay
+        self.fail_at = fail_at
+        self.t = 0
+
+    def reset(self, seed=None, options=None):
+        self.t = 0
+        return np.array([0.0, -1.0 if seed is None else seed], np.float32), {}
+
+    def step(self, action):
+        time.sleep(self.delay)
+        self.t += 1
+        if self.t == self.fail_at:
+            raise ValueError("step failed")
+        observation = np.array([self.t, action[0]], np.float32)
+        return observation, float(action[0]), self.t == 3, False, {"t": self.t}
+
+
+def test_pool_matches_in_process_envs():
+    pool = EnvironmentManager("Pendulum-v1").setup_env_pool(3, seed=10)
+    envs = [gym.make("Pendulum-v1") for _ in range(3)]
+    try:
+        observations, _ = pool.reset()
+        assert observations.shape == (3, 3)
+        for i, env in enumerate(envs):
+            np.testing.assert_allclose(observations[i], env.reset(seed=10 + i)[0])
+        actions = np.random.uniform(-2, 2, size=(3, 1)).astype(np.float32)
+        observations, rewards, terminated, truncated, _ = pool.step(actions)
+        for i, env in enumerate(envs):
+            observation, reward, done, trunc, _ = env.step(actions[i])
+            np.testing.assert_allclose(observations[i], observation, rtol=1e-6)
+            assert np.isclose(rewards[i], reward)
+            assert terminated[i] == done and truncated[i] == trunc
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("env_name", ["PointMass1D-v0", "PointMass2D-v0"])
+def test_seeded_pool_of_point_mass_envs(env_name):
+    with EnvironmentManager(env_name).setup_env_pool(2, seed=0) as pool:
+        observations, _ = pool.reset()
+        again, _ = pool.reset(seed=0)
+    np.testing.assert_array_equal(observations, again)
+    assert not np.array_equal(observations[0], observations[1])
+    np.testing.assert_array_equal(observations[1], gym.make(env_name).reset(seed=1)[0])
+
+
+def test_auto_reset_and_worker_errors():
+    env_fns = [SleepEnv, partial(SleepEnv, fail_at=2)]
+    with SubprocEnvPool(env_fns, seed=5) as pool:
+        observations, _ = pool.reset()
+        np.testing.assert_array_equal(observations[:, 1], [5, 6])
+        pool.step(np.ones((2, 1), np.float32))
+        with pytest.raises(RuntimeError, match="step failed"):
+            pool.step(np.ones((2, 1), np.float32))
+
+    with SubprocEnvPool([SleepEnv] * 2) as pool:
+        pool.reset()
+        for t in range(3):
+            observations, rewards, terminated, _, infos = pool.step(
+                np.full((2, 1), t, np.float32)
+            )
+        assert terminated.all()
+        np.testing.assert_array_equal(infos[0]["final_observation"], [3, 2])
+        # The next episode starts unseeded
+        np.testing.assert_array_equal(observations, [[0, -1], [0, -1]])
+
+
+def test_slow_steps_overlap():
+    delay, num_envs, steps = 0.05, 4, 4
+    with SubprocEnvPool([partial(SleepEnv, delay)] * num_envs) as pool:
+        pool.reset()
+        start = time.perf_counter()
+        for _ in range(steps):
+            pool.step(np.zeros((num_envs, 1), np.float32))
+        elapsed = time.perf_counter() - start
+    # Sequential stepping would take delay * num_envs * steps = 0.8s
+    assert elapsed < 0.5 * delay * num_envs * steps
+
+
+class HangEnv(SleepEnv):
+    """SleepEnv whose second step never returns."""
+
+    def step(self, action):
+        if self.t == 1:
+            time.sleep(3600)
+        return super().step(action)
+
+
+class HangResetEnv(HangEnv):
+    """HangEnv whose unseeded resets, i.e. after a restart, never return."""
+
+    def reset(self, seed=None, options=None):
+        if seed is None:
+            time.sleep(3600)
+        return super().reset(seed, options)
+
+
+def test_step_any_returns_fast_envs_first():
+    delays = [0.01, 0.01, 0.01, 1.0]
+    with SubprocEnvPool([partial(SleepEnv, d) for d in delays], seed=0) as pool:
+        pool.reset()
+        pool.step_async(np.zeros((4, 1), np.float32))
+        start = time.perf_counter()
+        env_ids, observations, rewards, _, _, _ = pool.step_any(3)
+        assert time.perf_counter() - start < 0.5
+        assert sorted(env_ids) == [0, 1, 2]
+        np.testing.assert_array_equal(observations[:, 0], [1, 1, 1])
+
+        # Actions go back to the returned envs while env 3 is still stepping
+        pool.step_async(np.full((3, 1), 7.0, np.float32), env_ids)
+        env_ids, observations, rewards, _, _, _ = pool.step_any(4)
+        assert sorted(env_ids) == [0, 1, 2, 3]
+        t = dict(zip(env_ids, observations[:, 0]))
+        assert t == {0: 2, 1: 2, 2: 2, 3: 1}
+        assert not pool.pending.any()
+
+
+def test_step_timeout_restarts_hung_worker():
+    env_fns = [SleepEnv, HangEnv]
+    with SubprocEnvPool(env_fns, seed=0, step_timeout=0.5) as pool:
+        pool.reset()
+        pool.step(np.zeros((2, 1), np.float32))
+        pool.step_async(np.zeros((2, 1), np.float32))
+        env_ids, observations, _, terminated, truncated, infos = pool.step_any(2)
+        assert sorted(env_ids) == [0, 1]
+        hung = list(env_ids).index(1)
+        assert truncated[hung] and not terminated[hung]
+        assert infos[hung]["timeout"]
+        np.testing.assert_array_equal(infos[hung]["final_observation"], [1, 0])
+        # The restarted env begins a new episode
+        np.testing.assert_array_equal(observations[hung], [0, -1])
+        assert pool.restarts == 1
+
+
+def test_step_timeout_bounds_restart_reset():
+    with SubprocEnvPool([HangResetEnv], seed=0, step_timeout=0.3) as pool:
+        pool.reset()
+        pool.step(np.zeros((1, 1), np.float32))
+        pool.step_async(np.zeros((1, 1), np.float32))
+        start = time.perf_counter()
+        with pytest.raises(RuntimeError, match="did not reset"):
+            pool.step_any(1)
+        assert time.perf_counter() - start < 30
+
+
+@pytest.mark.parametrize("min_ready_envs", [None, 1])
+def test_train_agent_with_env_pool(tmp_path, monkeypatch, min_ready_envs):
+    import torch
+    from nanoppo.continuous_action_ppo import PPOAgent
+    from nanoppo.train_ppo_agent import train_agent
+
+    rollouts = []
+    update = PPOAgent.update
+
+    def recording_update(self, states, actions, **kwargs):
+        rollouts.append(
+            (
+                states.clone(),
+                kwargs["next_states"].clone(),
+                kwargs["episode_ends"].clone(),
+            )
+        )
+        return update(self, states, actions, **kwargs)
+
+    monkeypatch.setattr(PPOAgent, "update", recording_update)
+    lengths = []
+    train_agent(
+        "Pendulum-v1",
+        max_episodes=4,
+        n_latent_var=16,
+        max_timesteps=20,
+        update_timestep=32,
+        checkpoint_dir=str(tmp_path),
+        device="cpu",
+        report_func=lambda **kwargs: lengths.append(kwargs["episode_length"]),
+        num_envs=2,
+        min_ready_envs=min_ready_envs,
+    )
+    assert lengths == [20] * 4
+
+    assert rollouts
+    for states, next_states, episode_ends in rollouts:
+        assert not torch.equal(states, next_states)
+        # Within an episode each transition starts where the one before ended
+        within = episode_ends[:-1] == 0
+        assert within.any()
+        assert torch.equal(states[1:][within], next_states[:-1][within])
+
+
+def test_train_agent_with_env_pool_is_seeded(tmp_path):
+    from nanoppo.random_utils import set_seed
+    from nanoppo.train_ppo_agent import train_agent
+
+    def run(name):
+        rewards = []
+        set_seed(0)
+        train_agent(
+            "Pendulum-v1",
+            max_episodes=2,
+            n_latent_var=16,
+            max_timesteps=20,
+            update_timestep=32,
+            checkpoint_dir=str(tmp_path / name),
+            device="cpu",
+            report_func=lambda **kwargs: rewards.append(kwargs["episode_reward"]),
+            num_envs=2,
+            seed=0,
+        )
+        return rewards
+
+    np.testing.assert_allclose(run("a"), run("b"), rtol=1e-5)
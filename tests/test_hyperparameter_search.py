@@ -0,0 +1,117 @@
+import csv
+from nanoppo.hyperparameter_search import ASHAScheduler, asha_search, sample_trials
+
+
+def make_config(checkpoint_dir):
+    config = dict(
+        project="test",
+        env_name="PointMass1D-v0",
+        env_config=None,
+        hidden_size=16,
+        init_type="default",
+        batch_size=100,
+        rescaling_rewards=False,
+        scale_states="default",
+        metrics_log=False,
+        wandb_log=False,
+        checkpoint_interval=-1,
+        checkpoint_dir=checkpoint_dir,
+        log_interval=1,
+        shape_reward=None,
+        max_timesteps=20,
+        sgd_iters=1,
+        gamma=0.99,
+        vf_coef=0.5,
+        entropy_coef=0.001,
+        max_grad_norm=0.5,
+        use_gae=True,
+        tau=0.95,
+        verbose=0,
+        resume_training=False,
+        resume_epoch=0,
+        report_func=None,
+    )
+    optimizer_config = dict(
+        policy_lr=5e-4,
+        value_lr=5e-4,
+        beta1=0.9,
+        beta2=0.999,
+        epsilon=1e-8,
+        weight_decay=0.0,
+        scheduler=None,
+    )
+    return config, optimizer_config
+
+
+def test_rungs():
+    scheduler = ASHAScheduler(min_resource=2, reduction_factor=3, max_resource=50)
+    assert [r for r in range(1, 60) if scheduler.rung_of(r) is not None] == [2, 6, 18]
+    assert scheduler.rung_of(18) == 2
+
+
+def test_asha_stops_trials_below_cutoff():
+    scheduler = ASHAScheduler(min_resource=1, reduction_factor=2)
+    # The first trials at a rung are always kept
+    assert scheduler.on_report(1, 5.0)
+    assert scheduler.on_report(1, 1.0) is False
+    assert scheduler.on_report(1, 10.0)
+    assert scheduler.on_report(2, 0.0)  # not a rung
+
+
+def test_sample_trials():
+    trials = sample_trials({"policy_lr": [1e-3, 1e-4], "gamma": [0.9]}, 5, seed=0)
+    assert len(trials) == 5
+    assert all(t["gamma"] == 0.9 and t["policy_lr"] in (1e-3, 1e-4) for t in trials)
+    assert trials == sample_trials(
+        {"policy_lr": [1e-3, 1e-4], "gamma": [0.9]}, 5, seed=0
+    )
+
+
+def test_asha_search(tmp_path):
+    config, optimizer_config = make_config(str(tmp_path / "checkpoints"))
+    results_path = tmp_path / "results.csv"
+    rows = asha_search(
+        config,
+        optimizer_config,
+        {"policy_lr": [1e-3, 1e-4], "tau": [0.9, 0.95]},
+        num_trials=4,
+        epochs=25,
+        num_workers=2,
+        min_resource=2,
+        reduction_factor=2,
+        results_path=str(results_path),
+        seed=0,
+    )
+    assert len(rows) == 4
+    assert all(r["status"] in ("completed", "pruned") for r in rows)
+    with open(results_path) as f:
+        table = list(csv.DictReader(f))
+    assert len(table) == 4
+    assert set(table[0]) >= {"trial_id", "policy_lr", "tau", "status", "last_reward"}
+
+
+class PruneAll:
+    def on_report(self, resource, reward):
+        return False
+
+
+def test_run_trial_cleans_up_and_records_errors(tmp_path, monkeypatch):
+    import torch
+    from nanoppo.hyperparameter_search import run_trial
+    from nanoppo.ppo_agent import PPOAgent
+
+    config, optimizer_config = make_config(str(tmp_path))
+    config["resources"] = {"act_threads": 1, "learn_threads": 2}
+    initial = torch.get_num_threads()
+    row = run_trial(0, {}, config, optimizer_config, 25, PruneAll())
+    assert row["status"] == "pruned" and row["error"] is None
+    # The pruned run restored the thread settings for the next trial
+    assert torch.get_num_threads() == initial
+
+    def failing_train(self, epochs):
+        raise ValueError("bad trial")
+
+    monkeypatch.setattr(PPOAgent, "train", failing_train)
+    row = run_trial(1, {}, config, optimizer_config, 5, PruneAll())
+    assert row["status"] == "error"
+    assert "ValueError: bad trial" in row["error"]
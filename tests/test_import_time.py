@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+# Optional dependencies that must only be imported when the feature is used
+OPTIONAL_MODULES = ["wandb", "tqdm", "sklearn", "pandas"]
+
+# Import time of nanoppo.policy.actor_critic on top of torch itself
+IMPORT_TIME_BUDGET_US = 300_000
+
+
+def import_times(module):
+    """Return {module: cumulative import time in us} from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_actor_critic_import_time_budget():
+    times = import_times("nanoppo.policy.actor_critic")
+    own_time = times["nanoppo.policy.actor_critic"] - times["torch"]
+    assert own_time < IMPORT_TIME_BUDGET_US, (
+        f"import nanoppo.policy.actor_critic took {own_time} us on top of torch, "
+        f"budget is {IMPORT_TIME_BUDGET_US} us"
+    )
+
+
+def test_optional_dependencies_are_lazy():
+    # Some torch builds import tqdm themselves, only blame nanoppo for the rest
+    required = import_times("torch, gym")
+    times = import_times(
+        "nanoppo, nanoppo.policy.actor_critic, "
+        "nanoppo.continuous_action_ppo, nanoppo.ppo_agent"
+    )
+    loaded = [m for m in OPTIONAL_MODULES if m in times and m not in required]
+    assert not loaded, f"importing nanoppo loaded {loaded}"
+
+
+def test_normalizer_does_not_import_torch():
+    assert "torch" not in import_times("nanoppo.normalizer")
@@ -0,0 +1,71 @@
+import numpy as np
+import torch
+from nanoppo.continuous_action_ppo import PPOAgent
+from nanoppo.multi_seed_ppo import MultiSeedPPOAgent, train_multi_seed
+from nanoppo.normalizer import Normalizer
+
+
+def make_agents(seeds):
+    low, high = np.array([-1.0, -1.0]), np.array([1.0, 1.0])
+    multi = MultiSeedPPOAgent(seeds, 2, 2, 16, low, high)
+    singles = []
+    for i in range(len(seeds)):
+        ppo = PPOAgent(
+            2,
+            2,
+            16,
+            None,
+            0.0005,
+            0.0005,
+            (0.9, 0.999),
+            0.99,
+            4,
+            0.2,
+            Normalizer(2),
+            low,
+            high,
+        )
+        ppo.policy.load_state_dict(multi.get_policy(i).state_dict())
+        ppo.policy_old.load_state_dict(ppo.policy.state_dict())
+        singles.append(ppo)
+    return multi, singles
+
+
+def test_multi_seed_evaluate_matches_actor_critic():
+    multi, singles = make_agents([0, 1, 2])
+    states = torch.randn(3, 10, 2)
+    actions = torch.randn(3, 10, 2)
+    logprobs, values = multi.evaluate(states, actions)
+    for i, ppo in enumerate(singles):
+        expected_logprobs, expected_values = ppo.policy.evaluate(states[i], actions[i])
+        assert torch.allclose(logprobs[i], expected_logprobs, atol=1e-5)
+        assert torch.allclose(values[i], expected_values, atol=1e-5)
+
+
+def test_multi_seed_update_matches_per_seed_updates():
+    multi, singles = make_agents([0, 1])
+    states = torch.randn(2, 32, 2)
+    actions = torch.randn(2, 32, 2)
+    returns = torch.randn(2, 32)
+    multi.update(states, actions, returns)
+    for i, ppo in enumerate(singles):
+        ppo.update(states[i], actions[i], returns[i], states[i], torch.zeros(32))
+        updated = multi.get_policy(i).state_dict()
+        for name, param in ppo.policy.state_dict().items():
+            assert torch.allclose(updated[name], param, atol=1e-5), name
+
+
+def test_train_multi_seed():
+    agent, rewards = train_multi_seed(
+        seeds=[0, 1], num_envs=4, num_steps=50, iterations=2, max_episode_steps=50
+    )
+    assert np.array(rewards).shape == (2, 2)
+    assert np.all(np.isfinite(rewards))
+
+
+def test_train_multi_seed_rollouts_shorter_than_episodes():
+    agent, rewards = train_multi_seed(
+        seeds=[0, 1], num_envs=2, num_steps=10, iterations=3, max_episode_steps=200
+    )
+    assert np.array(rewards).shape == (3, 2)
+    assert np.all(np.isfinite(rewards))
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import numpy as np
+import torch
+from nanoppo.normalizer import Normalizer
+from nanoppo.numpy_policy import NumpyPolicy, export_policy
+from nanoppo.policy.actor_critic import ActorCritic
+
+
+def make_policy(state_dim=3, action_dim=2):
+    torch.manual_seed(0)
+    low = torch.full((action_dim,), -1.0)
+    high = torch.full((action_dim,), 1.0)
+    return ActorCritic(state_dim, action_dim, 16, low, high)
+
+
+def test_numpy_policy_matches_torch(tmp_path):
+    policy = make_policy()
+    normalizer = Normalizer(3)
+    rng = np.random.default_rng(0)
+    for x in rng.normal(2.0, 3.0, size=(50, 3)):
+        normalizer.observe(x)
+
+    path = tmp_path / "policy.npz"
+    export_policy(policy, str(path), normalizer=normalizer)
+    runtime = NumpyPolicy(str(path), seed=0)
+
+    states = rng.normal(2.0, 3.0, size=(8, 3)).astype(np.float32)
+    with torch.no_grad():
+        normalized = torch.from_numpy(normalizer.normalize(states))
+        expected_mu = policy.action_mu(normalized).numpy()
+        expected_log_std = policy.action_log_std(normalized).numpy()
+
+    np.testing.assert_allclose(runtime.act(states), expected_mu, atol=1e-5)
+    np.testing.assert_allclose(runtime.act(states[0]), expected_mu[0], atol=1e-5)
+    np.testing.assert_allclose(
+        runtime.action_log_std(runtime.normalize(states)), expected_log_std, atol=1e-5
+    )
+    sampled = runtime.act(states, deterministic=False)
+    assert sampled.shape == expected_mu.shape
+    assert not np.allclose(sampled, expected_mu)
+
+
+def test_numpy_policy_matches_rescaled_torch_actions(tmp_path):
+    torch.manual_seed(0)
+    low, high = torch.tensor([-2.0, 0.0]), torch.tensor([2.0, 1.0])
+    policy = ActorCritic(3, 2, 16, low, high, rescale=True)
+    path = tmp_path / "policy.npz"
+    export_policy(policy, str(path))
+    runtime = NumpyPolicy(str(path), seed=0)
+
+    states = np.random.default_rng(1).normal(size=(64, 3)).astype(np.float32)
+    noise = np.random.default_rng(0).standard_normal((64, 2)).astype(np.float32)
+    with torch.no_grad():
+        x = torch.from_numpy(states)
+        mu, std = policy.action_mu(x), policy.action_log_std(x).exp()
+        # torch act() with the noise the runtime draws
+        expected = policy.rescale_action(mu + std * torch.from_numpy(noise)).numpy()
+
+    sampled = runtime.act(states, deterministic=False)
+    np.testing.assert_allclose(sampled, expected, atol=1e-5)
+    assert (sampled >= low.numpy()).all() and (sampled <= high.numpy()).all()
+    np.testing.assert_allclose(
+        runtime.act(states), policy.rescale_action(mu).numpy(), atol=1e-5
+    )
+
+
+def test_numpy_policy_does_not_import_torch():
+    code = (
+        "import sys, nanoppo.numpy_policy; "
+        "sys.exit(1 if 'torch' in sys.modules else 0)"
+    )
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
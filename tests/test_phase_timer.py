@@ -0,0 +1,81 @@
+import time
+from nanoppo.phase_timer import PhaseTimer, TrainingProfiler
+
+
+def test_phase_timer_summary():
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.phase("env"):
+            time.sleep(0.01)
+    with timer.phase("update"):
+        time.sleep(0.02)
+
+    summary = timer.summary()
+    assert summary["env"]["count"] == 3
+    assert summary["update"]["count"] == 1
+    assert summary["env"]["seconds"] >= 0.03
+    assert summary["update"]["seconds"] >= 0.02
+    assert abs(sum(s["share"] for s in summary.values()) - 1.0) < 1e-6
+    assert "env:" in timer.format()
+
+    timer.reset()
+    assert timer.summary()["env"]["count"] == 0
+
+
+def test_phase_timer_overhead():
+    timer = PhaseTimer()
+    phase = timer.phase("act")
+    n = 10000
+    start = time.perf_counter()
+    for _ in range(n):
+        with phase:
+            pass
+    per_phase = (time.perf_counter() - start) / n
+    # Absolute cost, the share of a training run is checked below
+    assert per_phase < 5e-6
+
+
+def test_phase_timer_overhead_in_training(tmp_path):
+    from nanoppo.train_ppo_agent import train_agent
+
+    timer = PhaseTimer()
+    phase = timer.phase("probe")
+    n = 10000
+    per_phase = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(n):
+            with phase:
+                pass
+        per_phase = min(per_phase, (time.perf_counter() - start) / n)
+
+    timer = PhaseTimer()
+    train_agent(
+        "PointMass1D-v0",
+        max_episodes=3,
+        max_timesteps=200,
+        update_timestep=200,
+        n_latent_var=16,
+        checkpoint_dir=str(tmp_path),
+        device="cpu",
+        phase_timer=timer,
+    )
+    entries = sum(s["count"] for s in timer.summary().values())
+    # The timers take less than 1% of the training time
+    assert entries * per_phase < 0.01 * timer.elapsed()
+
+
+def test_training_profiler_exports_trace(tmp_path):
+    import torch
+
+    timer = PhaseTimer()
+    trace_path = tmp_path / "trace.json"
+    profiler = TrainingProfiler(2, str(trace_path), timer)
+    profiler.start()
+    for _ in range(3):
+        with timer.phase("update"):
+            torch.ones(8) @ torch.ones(8)
+        profiler.step()
+    assert trace_path.exists()
+    assert not timer.profiling
+    assert "update" in trace_path.read_text()
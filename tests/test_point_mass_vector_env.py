@@ -0,0 +1,58 @@
+import gym
+import numpy as np
+import nanoppo
+from nanoppo.envs.point_mass1d import PointMass1DEnv, PointMass1DVectorEnv
+from nanoppo.envs.point_mass2d import PointMass2DEnv, PointMass2DVectorEnv
+
+
+def run_against_single_envs(vector_env, single_envs, action_dim, steps):
+    """Step both with the same actions after copying the vector states over."""
+    vector_env.reset(seed=0)
+    for i, env in enumerate(single_envs):
+        env.reset()
+        env.state = vector_env.states[i].copy()
+    rng = np.random.default_rng(0)
+    for _ in range(steps):
+        actions = rng.uniform(-1, 1, size=(vector_env.num_envs, action_dim)).astype(
+            np.float32
+        )
+        obs, rewards, terminateds, truncateds, infos = vector_env.step(actions)
+        for i, env in enumerate(single_envs):
+            single_obs, reward, done, _, _ = env.step(actions[i])
+            np.testing.assert_allclose(obs[i], single_obs, rtol=1e-5, atol=1e-5)
+            np.testing.assert_allclose(rewards[i], reward, rtol=1e-5, atol=1e-5)
+            assert terminateds[i] == done
+
+
+def test_point_mass1d_vector_matches_single():
+    vector_env = PointMass1DVectorEnv(num_envs=4, max_episode_steps=50)
+    single_envs = [PointMass1DEnv(max_episode_steps=50) for _ in range(4)]
+    run_against_single_envs(vector_env, single_envs, 1, 49)
+
+
+def test_point_mass2d_vector_matches_single():
+    vector_env = PointMass2DVectorEnv(num_envs=4, max_episode_steps=50)
+    single_envs = [PointMass2DEnv(max_episode_steps=50) for _ in range(4)]
+    run_against_single_envs(vector_env, single_envs, 2, 49)
+
+
+def test_vector_env_auto_reset():
+    env = PointMass2DVectorEnv(num_envs=3, max_episode_steps=5)
+    obs, _ = env.reset(seed=1)
+    assert obs.shape == (3, 2)
+    for step in range(5):
+        obs, rewards, terminateds, truncateds, infos = env.step(np.zeros((3, 2)))
+    assert terminateds.all() and not truncateds.any()
+    assert infos["_final_observation"].all()
+    assert infos["final_observation"][0].shape == (2,)
+    # Reset instances start a new episode
+    _, _, terminateds, _, _ = env.step(np.zeros((3, 2)))
+    assert not terminateds.any()
+
+
+def test_vector_env_registration():
+    env = gym.make("PointMass1DVector-v0", num_envs=16)
+    obs, _ = env.reset()
+    assert obs.shape == (16, 2)
+    obs, rewards, terminateds, truncateds, _ = env.step(np.zeros((16, 1)))
+    assert rewards.shape == (16,)
@@ -0,0 +1,40 @@
+import json
+import numpy as np
+from nanoppo.replicate_runner import aggregate_curves, run_replicates
+
+
+def test_aggregate_curves_uneven_lengths():
+    aggregate = aggregate_curves([[1.0, 2.0, 3.0], [3.0, 4.0]])
+    np.testing.assert_allclose(aggregate["mean"], [2.0, 3.0, 3.0])
+    np.testing.assert_array_equal(aggregate["n"], [2, 2, 1])
+    half_width = 1.96 * np.std([1.0, 3.0], ddof=1) / np.sqrt(2)
+    np.testing.assert_allclose(aggregate["ci_high"][0], 2.0 + half_width)
+    # a single seed has no spread
+    assert aggregate["ci_low"][2] == aggregate["ci_high"][2] == 3.0
+
+
+def test_aggregate_curves_window():
+    aggregate = aggregate_curves([[1.0, 3.0, 5.0, 7.0]], window=2)
+    np.testing.assert_allclose(aggregate["mean"], [1.0, 2.0, 4.0, 6.0])
+
+
+def test_run_replicates(tmp_path):
+    results, aggregate = run_replicates(
+        [0, 1],
+        run_dir=str(tmp_path),
+        num_workers=2,
+        window=2,
+        env_name="PointMass1D-v0",
+        max_episodes=3,
+        max_timesteps=20,
+        update_timestep=20,
+        n_latent_var=16,
+    )
+    assert [r["seed"] for r in results] == [0, 1]
+    assert all(len(r["episode_rewards"]) == 3 for r in results)
+    assert results[0]["episode_rewards"] != results[1]["episode_rewards"]
+    assert (tmp_path / "seed_0" / "PointMass1D-v0").is_dir()
+    assert (tmp_path / "curves.csv").exists()
+    summary = json.loads((tmp_path / "summary.json").read_text())
+    assert summary["total_steps"] == 120
+    assert len(summary["seeds"]) == 2
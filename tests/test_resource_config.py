@@ -0,0 +1,96 @@
+import os
+import pytest
+import torch
+from nanoppo.resource_config import ResourceConfig
+from nanoppo.train_ppo_agent import train_agent
+
+
+def test_thread_scopes_switch_and_restore():
+    initial = torch.get_num_threads()
+    resources = ResourceConfig(act_threads=1, learn_threads=2).apply()
+    try:
+        assert torch.get_num_threads() == 1
+        with resources.learning():
+            assert torch.get_num_threads() == 2
+        with resources.acting():
+            assert torch.get_num_threads() == 1
+        assert resources.describe()["learn_threads"] == 2
+    finally:
+        resources.restore()
+    assert torch.get_num_threads() == initial
+
+
+def test_affinity_and_from_config():
+    initial = os.sched_getaffinity(0)
+    resources = ResourceConfig.from_config({"cores": [0], "env_cores": [0]}).apply()
+    try:
+        assert os.sched_getaffinity(0) == {0}
+        # learn_threads defaults to the cores of the process
+        assert resources.describe()["learn_threads"] == 1
+        assert resources.describe()["env_cores"] == [0]
+    finally:
+        resources.restore()
+    assert os.sched_getaffinity(0) == initial
+
+
+def test_train_agent_with_resource_config(tmp_path):
+    initial = torch.get_num_threads()
+    train_agent(
+        "PointMass1D-v0",
+        max_episodes=2,
+        max_timesteps=20,
+        update_timestep=20,
+        n_latent_var=16,
+        checkpoint_dir=str(tmp_path),
+        device="cpu",
+        resource_config=ResourceConfig(act_threads=1, learn_threads=2),
+    )
+    assert torch.get_num_threads() == initial
+
+
+def test_defaults_keep_threads_and_scope_blas_limit():
+    import numpy  # noqa: F401 loads the BLAS library
+    from threadpoolctl import threadpool_info
+
+    def blas_threads():
+        return [info["num_threads"] for info in threadpool_info()]
+
+    initial, initial_blas = torch.get_num_threads(), blas_threads()
+    resources = ResourceConfig().apply()
+    assert torch.get_num_threads() == initial
+    assert resources.describe()["learn_threads"] == initial
+    resources.restore()
+
+    resources = ResourceConfig(env_threads=1).apply()
+    try:
+        # Only env stepping is limited
+        assert blas_threads() == initial_blas
+        with resources.stepping():
+            assert set(blas_threads()) <= {1}
+        assert blas_threads() == initial_blas
+    finally:
+        resources.restore()
+
+
+def test_train_agent_restores_resources_on_error(tmp_path, monkeypatch):
+    from nanoppo.continuous_action_ppo import PPOAgent
+
+    def failing_update(self, *args, **kwargs):
+        raise RuntimeError("update failed")
+
+    monkeypatch.setattr(PPOAgent, "update", failing_update)
+    # The update error handler stops in the debugger
+    monkeypatch.setattr("builtins.breakpoint", lambda: None)
+    initial = torch.get_num_threads()
+    with pytest.raises(RuntimeError, match="update failed"):
+        train_agent(
+            "PointMass1D-v0",
+            max_episodes=2,
+            max_timesteps=20,
+            update_timestep=20,
+            n_latent_var=16,
+            checkpoint_dir=str(tmp_path),
+            device="cpu",
+            resource_config=ResourceConfig(act_threads=1, learn_threads=2),
+        )
+    assert torch.get_num_threads() == initial
@@ -1,6 +1,6 @@
 import numpy as np
 import pytest
-from nanoppo.reward_scaler import RewardScaler  # Change 'your_module' to the name of your module.
+from nanoppo.reward_scaler import RewardScaler, ReturnScaler
 
 
 def test_initialization():
@@ -45,3 +45,36 @@ def test_running_mean(rewards, expected_mean):
     scaler = RewardScaler()
     scaler.update(rewards)
     assert scaler.running_mean == expected_mean
+
+
+def test_batch_update_matches_sequential():
+    rewards = np.random.default_rng(0).normal(3.0, 2.0, size=100)
+    batched = RewardScaler()
+    for batch in np.split(rewards, [10, 11, 60]):
+        batched.update(batch)
+    sequential = RewardScaler()
+    for reward in rewards:
+        sequential.update([reward])
+    assert batched.count == sequential.count == 100
+    assert np.isclose(batched.running_mean, rewards.mean())
+    assert np.isclose(batched.std(), rewards.std(ddof=1))
+    assert np.isclose(sequential.std(), rewards.std(ddof=1))
+
+
+def test_return_scaler_per_env_returns():
+    scaler = ReturnScaler(num_envs=2, gamma=0.5)
+    rewards = np.array([[1.0, 2.0], [1.0, 2.0], [1.0, 2.0]])
+    dones = np.array([[False, True], [False, False], [False, False]])
+    scaled = scaler.scale_rewards(rewards, dones)
+
+    # Env 0 accumulates 1, 1.5, 1.75; env 1 restarts after its first step
+    returns = np.array([1.0, 2.0, 1.5, 2.0, 1.75, 3.0])
+    assert scaler.count == 6
+    assert np.isclose(scaler.std(), returns.std(ddof=1))
+    np.testing.assert_allclose(scaled, rewards / (returns.std(ddof=1) + 1e-8))
+    np.testing.assert_allclose(scaler.returns, [1.75, 3.0])
+
+    # Single-env [steps] rewards keep their shape
+    scaled = ReturnScaler(gamma=0.5).scale_rewards([1.0, -1.0], [True, False])
+    assert scaled.shape == (2,)
+    assert scaled[0] > 0 > scaled[1]
@@ -0,0 +1,204 @@
+import copy
+from unittest import mock
+
+import numpy as np
+import pytest
+import torch
+from nanoppo.policy.categorical_actor_critic import CategoricalActorCritic
+from nanoppo.ppo_agent import PPOAgent
+from nanoppo.reward_shaper import (
+    MountainCarAdvancedRewardShaper,
+    MountainCarDirectionalRewardShaper,
+    MountainCarHeightRewardShaper,
+    MountainCarRewardShaper,
+    TDRewardShaper,
+)
+from nanoppo.rollout_buffer import RolloutBuffer
+
+
+def height(position):
+    return np.sin(3 * position) * 0.45 + 0.55
+
+
+def loop_reshape(shaper, reward, position, velocity):
+    # Per-transition reference of each shaper
+    if isinstance(shaper, MountainCarRewardShaper):
+        return reward + position + abs(velocity)
+    if isinstance(shaper, MountainCarHeightRewardShaper):
+        return reward + height(position)
+    if isinstance(shaper, MountainCarAdvancedRewardShaper):
+        penalty = -0.5 if abs(velocity) < 0.01 else 0
+        return reward + height(position) + abs(velocity) + penalty
+    towards_center = (position < 0 and velocity > 0) or (position > 0 and velocity < 0)
+    direction = abs(velocity) if towards_center else 0
+    return reward + height(position) + direction - abs(0.5 - position)
+
+
+def test_vectorized_shapers_match_loop():
+    rng = np.random.default_rng(0)
+    observations = np.stack(
+        [rng.uniform(-1.2, 0.6, 64), rng.uniform(-0.07, 0.07, 64)], axis=1
+    )
+    observations[:4, 1] = [0.0, 0.005, -0.005, 0.0]
+    observations[4, 0] = 0.0
+    rewards = rng.normal(size=64)
+    for shaper in [
+        MountainCarRewardShaper(),
+        MountainCarHeightRewardShaper(),
+        MountainCarAdvancedRewardShaper(),
+        MountainCarDirectionalRewardShaper(),
+    ]:
+        shaped = shaper.reshape(rewards, observations)
+        assert shaped.shape == (64,)
+        expected = [
+            loop_reshape(shaper, r, *obs) for r, obs in zip(rewards, observations)
+        ]
+        np.testing.assert_allclose(shaped, expected)
+
+
+def test_shape_rewards_of_buffer():
+    buffer = RolloutBuffer(8)
+    states = np.random.randn(5, 2).astype(np.float32)
+    raw = states * 10
+    for t in range(4):
+        buffer.push(
+            states[t], np.zeros(1), 0.0, -1.0, states[t + 1], False, raw[t], raw[t + 1]
+        )
+    shaped = PPOAgent.shape_rewards(MountainCarHeightRewardShaper(), buffer)
+    np.testing.assert_allclose(buffer.get_rewards(), shaped, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(shaped, -1.0 + height(raw[:4, 0]), rtol=1e-5, atol=1e-6)
+
+    # TD shaping reads the buffered (scaled) states
+    value = torch.nn.Linear(2, 1)
+    shaped = PPOAgent.shape_rewards(TDRewardShaper(value, "cpu"), buffer)
+    with torch.no_grad():
+        v = value(torch.from_numpy(states)).squeeze(-1).numpy()
+    np.testing.assert_allclose(
+        shaped,
+        2 * (-1.0 + height(raw[:4, 0])) + 0.99 * v[1:] - v[:4],
+        rtol=1e-5,
+        atol=1e-6,
+    )
+
+
+@pytest.mark.parametrize("rescaling_rewards", [False, True, "return"])
+def test_rollout_pushes_current_state(tmp_path, rescaling_rewards):
+    config = dict(
+        project="test",
+        env_config=None,
+        hidden_size=32,
+        init_type="default",
+        rescaling_rewards=rescaling_rewards,
+        scale_states="default",
+        metrics_log=False,
+        wandb_log=False,
+        checkpoint_interval=-1,
+        checkpoint_dir=str(tmp_path),
+        log_interval=5,
+        sgd_iters=2,
+        gamma=0.99,
+        vf_coef=0.5,
+        entropy_coef=0.001,
+        max_grad_norm=0.5,
+        use_gae=True,
+        tau=0.95,
+        verbose=0,
+        resume_training=False,
+        resume_epoch=0,
+        report_func=None,
+        env_name="MountainCarContinuous-v0",
+        shape_reward=MountainCarHeightRewardShaper,
+        max_timesteps=50,
+        batch_size=64,
+    )
+    optimizer_config = dict(
+        policy_lr=5e-4,
+        value_lr=5e-4,
+        beta1=0.9,
+        beta2=0.999,
+        epsilon=1e-8,
+        weight_decay=0.0,
+        scheduler=None,
+    )
+    agent = PPOAgent(config, optimizer_config, force_cpu=True)
+    agent.train(1)
+    # No update yet: the buffer holds the 50 transitions of the episode
+    states, next_states = agent.rollout_buffer.get_states()
+    assert len(states) == 50
+    np.testing.assert_array_equal(states[1:], next_states[:-1])
+    assert not np.array_equal(states, next_states)
+
+    assert agent.rollout_buffer.get_episode_ends().sum() == 1
+
+    # The batch fills after 14 more steps, is shaped, scaled and trained on
+    agent.train(2)
+    assert len(agent.rollout_buffer) == 100 - 64
+
+
+def test_td_shaper_one_forward_and_reused_values():
+    torch.manual_seed(0)
+    value = torch.nn.Linear(3, 1)
+    calls = []
+    value.register_forward_hook(lambda module, args, out: calls.append(out.shape))
+    shaper = TDRewardShaper(value, "cpu", gamma=0.9)
+    observations = np.random.randn(16, 3).astype(np.float32)
+    next_observations = np.random.randn(16, 3).astype(np.float32)
+    rewards = np.random.randn(16)
+
+    shaped = shaper.reshape(rewards, observations, next_observations)
+    assert calls == [(32, 1)]
+    with torch.no_grad():
+        v = value(torch.from_numpy(observations)).squeeze(-1).numpy()
+        next_v = value(torch.from_numpy(next_observations)).squeeze(-1).numpy()
+    np.testing.assert_allclose(shaped, 2 * rewards + 0.9 * next_v - v, rtol=1e-5)
+
+    calls.clear()
+    values = shaper.values(observations, next_observations)
+    reused = shaper.reshape(rewards, observations, next_observations, *values)
+    assert len(calls) == 1
+    np.testing.assert_array_equal(reused, shaped)
+
+
+def test_minibatch_update_reuses_values():
+    torch.manual_seed(0)
+    policy = CategoricalActorCritic(3, 2, 8)
+    buffer = RolloutBuffer(8)
+    states = np.random.randn(9, 3).astype(np.float32)
+    for t in range(8):
+        buffer.push(states[t], 0, -0.7, 1.0, states[t + 1], False)
+    values = TDRewardShaper(policy.value_layer, "cpu").values(*buffer.get_states())
+
+    gae_inputs = []
+    for reused in [None, values]:
+        with mock.patch(
+            "nanoppo.ppo_agent.compute_gae",
+            side_effect=lambda next_value, rewards, masks, values, gamma, tau: (
+                gae_inputs.append((next_value, values)) or [0.0] * len(rewards)
+            ),
+        ):
+            PPOAgent.minibatch_update(
+                0,
+                policy,
+                policy.value_layer,
+                copy.deepcopy(policy),
+                None,
+                torch.optim.SGD(policy.parameters(), lr=0.0),
+                None,
+                copy.deepcopy(buffer),
+                "cpu",
+                8,
+                1,
+                0.99,
+                0.2,
+                0.5,
+                0.0,
+                0.5,
+                use_gae=True,
+                tau=0.95,
+                wandb_log=False,
+                metrics_recorder=None,
+                values=reused,
+            )
+    (next_value, computed), (reused_next_value, reused_values) = gae_inputs
+    np.testing.assert_allclose(reused_values, computed, rtol=1e-6)
+    assert np.isclose(reused_next_value, next_value)
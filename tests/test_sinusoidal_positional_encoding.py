@@ -0,0 +1,43 @@
+import math
+
+import torch
+from nanoppo.sinusoidal_positional_encoding import SinusoidalPositionalEncoding
+
+
+def reference_encoding(length, d_model):
+    encoding = torch.zeros(length, d_model)
+    position = torch.arange(0, length).unsqueeze(1)
+    div_term = torch.exp(
+        torch.arange(0, d_model, 2).float() * -(math.log(10000.0) / d_model)
+    )
+    div_term = torch.repeat_interleave(div_term, 2, dim=0)
+    encoding[:, 0::2] = torch.sin(position * div_term[: d_model // 2])
+    encoding[:, 1::2] = torch.cos(position * div_term[: d_model // 2])
+    return encoding
+
+
+def test_matches_reference_and_grows():
+    pe = SinusoidalPositionalEncoding(d_model=6)
+    assert torch.equal(pe(torch.zeros(1, 5000, 6))[0], reference_encoding(5000, 6))
+    assert pe.encoding.size(1) >= 5000
+
+    x = torch.randn(2, 5000, 6)
+    # Offsets index the same table
+    assert torch.equal(pe(x[:, :3], offset=10), x[:, :3] + pe.encoding[:, 10:13])
+    offsets = torch.tensor([0, 4100])
+    out = pe(x[:, :1], offset=offsets)
+    assert torch.equal(out[0, 0], x[0, 0] + pe.encoding[0, 0])
+    assert torch.equal(out[1, 0], x[1, 0] + pe.encoding[0, 4100])
+
+
+def test_table_is_shared_buffer():
+    a = SinusoidalPositionalEncoding(d_model=8)
+    b = SinusoidalPositionalEncoding(d_model=8)
+    assert a.encoding.data_ptr() == b.encoding.data_ptr()
+    assert "encoding" not in a.state_dict()
+    assert "encoding" in dict(a.named_buffers())
+
+    a.to(torch.float64)
+    assert a.encoding.dtype == torch.float64
+    x = torch.zeros(1, 4, 8, dtype=torch.float64)
+    assert torch.allclose(a(x)[0].float(), reference_encoding(4, 8), atol=1e-6)
@@ -0,0 +1,110 @@
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+from nanoppo.normalizer import Normalizer
+from nanoppo.reward_scaler import RewardScaler
+from nanoppo.stats_sync import (
+    QueueMoments,
+    SharedMoments,
+    StatsSync,
+    merge_moments,
+    subtract_moments,
+)
+
+
+def moments_of(x):
+    x = np.asarray(x, dtype=np.float64)
+    mean = x.mean(axis=0)
+    return (
+        np.full(mean.shape, len(x), dtype=np.float64),
+        mean,
+        ((x - mean) ** 2).sum(axis=0),
+    )
+
+
+def test_merge_and_subtract_are_exact():
+    x = np.random.default_rng(0).normal(5.0, 3.0, size=(50, 3))
+    merged = merge_moments(moments_of(x[:20]), moments_of(x[20:]))
+    for a, b in zip(merged, moments_of(x)):
+        np.testing.assert_allclose(a, b)
+    rest = subtract_moments(moments_of(x), moments_of(x[:20]))
+    for a, b in zip(rest, moments_of(x[20:])):
+        np.testing.assert_allclose(a, b)
+
+
+def test_normalizer_and_reward_scaler_merge():
+    x = np.random.default_rng(1).normal(2.0, 4.0, size=(40, 2))
+    full, part, other = Normalizer(2), Normalizer(2), Normalizer(2)
+    for row in x:
+        full.observe(row)
+    for row in x[:15]:
+        part.observe(row)
+    for row in x[15:]:
+        other.observe(row)
+    part.merge_moments(other.get_moments())
+    np.testing.assert_allclose(part.mean, full.mean, rtol=1e-5)
+    np.testing.assert_allclose(part.variance, full.variance, rtol=1e-4)
+
+    rewards = x[:, 0]
+    full, part, other = RewardScaler(), RewardScaler(), RewardScaler()
+    full.update(rewards)
+    part.update(rewards[:7])
+    other.update(rewards[7:])
+    part.merge_moments(other.get_moments())
+    assert part.count == 40
+    assert np.isclose(part.running_mean, full.running_mean)
+    assert np.isclose(part.std(), full.std())
+
+
+def test_periodic_sync_matches_all_data():
+    rng = np.random.default_rng(2)
+    shared = SharedMoments(2, shape=(3,))
+    normalizers = [Normalizer(3), Normalizer(3)]
+    syncs = [StatsSync(n, shared, i, interval=5) for i, n in enumerate(normalizers)]
+    reference = Normalizer(3)
+    for step in range(23):
+        for normalizer, sync in zip(normalizers, syncs):
+            x = rng.normal(step, 1.0, size=3)
+            normalizer.observe(x)
+            reference.observe(x)
+            sync.step()
+    for sync in syncs:
+        sync.sync()
+    # The first worker synced before the second published its last samples
+    syncs[0].sync()
+    for normalizer in normalizers:
+        np.testing.assert_allclose(normalizer.n, reference.n)
+        np.testing.assert_allclose(normalizer.mean, reference.mean, rtol=1e-4)
+        np.testing.assert_allclose(normalizer.variance, reference.variance, rtol=1e-3)
+
+
+def observe_rewards(moments, worker_id, rewards):
+    scaler = RewardScaler()
+    sync = StatsSync(scaler, moments, worker_id, pull=False)
+    scaler.update(rewards)
+    sync.step()
+
+
+@pytest.mark.parametrize("transport", [SharedMoments, QueueMoments])
+def test_sync_across_processes(transport):
+    ctx = mp.get_context("spawn")
+    moments = transport(2, ctx=ctx)
+    rewards = np.random.default_rng(3).normal(size=(2, 30))
+    workers = [
+        ctx.Process(target=observe_rewards, args=(moments, i, rewards[i]))
+        for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    learner = RewardScaler()
+    learner.set_moments(moments.gather())
+    reference = RewardScaler()
+    reference.update(rewards.reshape(-1))
+    assert learner.count == 60
+    assert np.isclose(learner.running_mean, reference.running_mean)
+    assert np.isclose(learner.std(), reference.std())
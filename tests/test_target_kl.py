@@ -0,0 +1,87 @@
+import numpy as np
+import torch
+from nanoppo.continuous_action_ppo import PPOAgent
+from nanoppo.metrics_recorder import MetricsRecorder
+from nanoppo.normalizer import Normalizer
+from nanoppo.ppo_agent import PPOAgent as ConfigPPOAgent
+from nanoppo.ppo_utils import approx_kl
+from nanoppo.rollout_buffer import RolloutBuffer
+
+
+def test_approx_kl():
+    assert approx_kl(torch.zeros(10)).item() == 0.0
+    log_ratio = torch.tensor([0.1, -0.2, 0.3])
+    expected = (torch.exp(log_ratio) - 1 - log_ratio).mean()
+    assert torch.isclose(approx_kl(log_ratio), expected)
+    assert approx_kl(log_ratio).item() > 0
+
+
+def make_agent(target_kl):
+    torch.manual_seed(0)
+    return PPOAgent(
+        2,
+        2,
+        32,
+        None,
+        0.01,
+        0.01,
+        (0.9, 0.999),
+        0.99,
+        8,
+        0.2,
+        Normalizer(2),
+        np.array([-1.0, -1.0]),
+        np.array([1.0, 1.0]),
+        target_kl=target_kl,
+    )
+
+
+def test_continuous_update_stops_at_target_kl():
+    states, actions, returns = torch.randn(64, 2), torch.randn(64, 2), torch.randn(64)
+    stats = make_agent(None).update(states, actions, returns, states, torch.zeros(64))
+    assert stats["epochs"] == 8
+    # The first epoch starts at the rollout policy, the second one is past a tiny target
+    stats = make_agent(1e-8).update(states, actions, returns, states, torch.zeros(64))
+    assert stats["epochs"] == 1
+    assert stats["approx_kl"] > 1.5e-8
+
+
+def test_minibatch_update_records_epochs_and_kl():
+    torch.manual_seed(0)
+    policy = make_agent(None).policy
+    value = policy.value_layer
+    optimizer = torch.optim.Adam(policy.parameters(), lr=0.01)
+    recorder = MetricsRecorder()
+    for target_kl in [None, 1e-8]:
+        buffer = RolloutBuffer(32)
+        for _ in range(32):
+            state = np.random.randn(2).astype(np.float32)
+            action = np.random.randn(2).astype(np.float32)
+            with torch.no_grad():
+                log_prob = policy(torch.tensor(state)).log_prob(torch.tensor(action))
+            buffer.push(state, action, log_prob.sum().numpy(), 1.0, state, False)
+        ConfigPPOAgent.minibatch_update(
+            0,
+            policy,
+            value,
+            policy,
+            value,
+            optimizer,
+            None,
+            buffer,
+            "cpu",
+            32,
+            6,
+            0.99,
+            0.2,
+            0.5,
+            0.001,
+            0.5,
+            True,
+            0.95,
+            False,
+            recorder,
+            target_kl=target_kl,
+        )
+    assert recorder.updates["epochs"] == [6, 1]
+    assert recorder.updates["approx_kl"][1] > 1.5e-8
@@ -0,0 +1,134 @@
+import numpy as np
+import torch
+from nanoppo.envs.point_mass1d import PointMass1DVectorEnv
+from nanoppo.envs.point_mass2d import PointMass2DVectorEnv
+from nanoppo.envs.torch_point_mass import TorchPointMass1DEnv, TorchPointMass2DEnv
+from nanoppo.normalizer import Normalizer
+from nanoppo.tensor_normalizer import TensorNormalizer
+from nanoppo.ppo_utils import compute_gae, compute_gae_batched
+from nanoppo.tensor_rollout import train_tensor_agent
+
+
+def run_against_numpy_env(torch_env, numpy_env, action_dim, steps):
+    numpy_env.reset(seed=0)
+    torch_env.reset()
+    torch_env.states = torch.tensor(numpy_env.states)
+    rng = np.random.default_rng(0)
+    for _ in range(steps):
+        actions = rng.uniform(-1, 1, size=(numpy_env.num_envs, action_dim)).astype(
+            np.float32
+        )
+        obs, rewards, terminateds, _, _ = numpy_env.step(actions)
+        torch_obs, torch_rewards, torch_terminateds, _, _ = torch_env.step(
+            torch.tensor(actions)
+        )
+        np.testing.assert_allclose(torch_obs.numpy(), obs, rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(torch_rewards.numpy(), rewards, rtol=1e-5, atol=1e-5)
+        np.testing.assert_array_equal(torch_terminateds.numpy(), terminateds)
+
+
+def test_torch_point_mass1d_matches_numpy():
+    run_against_numpy_env(
+        TorchPointMass1DEnv(4, max_episode_steps=50),
+        PointMass1DVectorEnv(num_envs=4, max_episode_steps=50),
+        1,
+        49,
+    )
+
+
+def test_torch_point_mass2d_matches_numpy():
+    run_against_numpy_env(
+        TorchPointMass2DEnv(4, max_episode_steps=50),
+        PointMass2DVectorEnv(num_envs=4, max_episode_steps=50),
+        2,
+        49,
+    )
+
+
+def test_torch_env_auto_reset():
+    env = TorchPointMass2DEnv(3, max_episode_steps=5)
+    env.reset()
+    env.states = torch.full((3, 2), 8.0)
+    for _ in range(5):
+        obs, _, terminateds, _, final_obs = env.step(torch.ones(3, 2))
+    assert terminateds.all()
+    assert (env.current_steps == 0).all()
+    # final observations were pushed to the boundary, reset ones were not
+    assert torch.allclose(final_obs, torch.ones(3, 2))
+    assert not torch.allclose(obs, final_obs)
+
+
+def test_tensor_normalizer_matches_normalizer():
+    data = np.random.default_rng(0).normal(3.0, 2.0, size=(100, 2)).astype(np.float32)
+    normalizer = Normalizer(2)
+    for x in data:
+        normalizer.observe(x)
+    tensor_normalizer = TensorNormalizer(2)
+    for batch in np.split(data, 4):
+        tensor_normalizer.observe(torch.tensor(batch))
+    np.testing.assert_allclose(
+        tensor_normalizer.mean.numpy(), normalizer.mean, rtol=1e-4
+    )
+    np.testing.assert_allclose(
+        tensor_normalizer.variance.numpy(), normalizer.variance, rtol=1e-4
+    )
+
+
+def test_compute_gae_batched_matches_compute_gae():
+    rng = np.random.default_rng(0)
+    rewards = rng.normal(size=(6, 3)).astype(np.float32)
+    values = rng.normal(size=(6, 3)).astype(np.float32)
+    masks = (rng.uniform(size=(6, 3)) > 0.3).astype(np.float32)
+    next_value = rng.normal(size=3).astype(np.float32)
+    returns = compute_gae_batched(
+        torch.tensor(next_value),
+        torch.tensor(rewards),
+        torch.tensor(masks),
+        torch.tensor(values),
+        0.99,
+        0.95,
+    )
+    for i in range(3):
+        expected = compute_gae(
+            next_value[i],
+            list(rewards[:, i]),
+            list(masks[:, i]),
+            list(values[:, i]),
+            0.99,
+            0.95,
+        )
+        np.testing.assert_allclose(returns[:, i].numpy(), expected, rtol=1e-5)
+
+
+def test_train_tensor_agent():
+    torch.manual_seed(0)
+    ppo, rewards = train_tensor_agent(
+        num_envs=8, num_steps=50, iterations=4, max_episode_steps=50, log_interval=2
+    )
+    assert len(rewards) == 4
+    assert np.all(np.isfinite(rewards))
+
+
+class RandomPolicy:
+    def act(self, states):
+        return torch.rand(len(states), 2) * 2 - 1, torch.zeros(len(states))
+
+    def get_value(self, states):
+        return torch.zeros(len(states), 1)
+
+
+def test_collect_normalizes_next_states():
+    from nanoppo.tensor_rollout import TensorRolloutCollector
+
+    torch.manual_seed(0)
+    env = TorchPointMass2DEnv(4, max_episode_steps=5)
+    normalizer = TensorNormalizer(env.state_dim)
+    collector = TensorRolloutCollector(env, RandomPolicy(), normalizer, num_steps=12)
+    rollout = collector.collect()
+    states, next_states = rollout["states"], rollout["next_states"]
+    # Within an episode the next state is the normalized state of the next step
+    within = rollout["masks"][:-1].bool()
+    assert torch.equal(next_states[:-1][within], states[1:][within])
+    # The final states of episodes are on the same scale
+    assert rollout["episode_ends"].any()
+    assert next_states.abs().max() < 10